@@ -1,16 +1,28 @@
 # Этот код написан на языке Python и представляет класс YouTubeSearch, который используется для выполнения поиска видео и информации о каналах на YouTube.
 
+import asyncio
 import os
+import threading
+import time
 
 import google_auth_oauthlib.flow
 import googleapiclient.discovery
 import googleapiclient.errors
+import httplib2
+from google_auth_httplib2 import AuthorizedHttp
 
 scopes = ["https://www.googleapis.com/auth/youtube.force-ssl"]
 
+# Все данные канала одним запросом channels.list (1 единица квоты на пачку)
+CHANNEL_PARTS = "snippet,statistics,contentDetails"
+# Максимум id в одном запросе channels.list
+CHANNELS_PER_REQUEST = 50
+# Максимум результатов на странице search.list
+RESULTS_PER_PAGE = 50
+
 class YouTubeSearch:
 
-    def __init__(self, client_secrets_file):
+    def __init__(self, client_secrets_file, cache_ttl=3600):
         os.environ["OAUTHLIB_INSECURE_TRANSPORT"] = "1"
 
         self.api_service_name = "youtube"
@@ -31,7 +43,11 @@ class YouTubeSearch:
         self.base_video_url = 'https://www.youtube.com/watch?v='
         self.base_channel_url = 'https://www.youtube.com/channel/'
         self.base_image_url = 'http://img.youtube.com/vi/'
-        self.next_page_token = ''
+        # свой HTTP-транспорт у каждого потока: общий клиент googleapiclient не потокобезопасен
+        self._local = threading.local()
+        # channel_id -> (истекает, item из channels.list)
+        self.cache_ttl = cache_ttl
+        self.channel_cache = {}
         self.authenticate()
 
     def authenticate(self):
@@ -40,113 +56,199 @@ class YouTubeSearch:
         )
 
         # Вместо run_console() используем run_local_server
-        credentials = flow.run_local_server(port=0)  # откроется браузер для авторизации
+        self.credentials = flow.run_local_server(port=0)  # откроется браузер для авторизации
 
         self.youtube = googleapiclient.discovery.build(
             self.api_service_name,
             self.api_version,
-            credentials=credentials
+            credentials=self.credentials
         )
 
-    # Функция для получения списка видео из канала
+    # выполнение запроса на HTTP-транспорте текущего потока: сам запрос строится без
+    # общего состояния, а транспорт не делится между потоками — запросы идут параллельно
+    def _execute(self, request):
+        http = getattr(self._local, 'http', None)
+        if http is None:
+            http = self._local.http = AuthorizedHttp(self.credentials, http=httplib2.Http())
+        return request.execute(http=http)
+
+    # одна страница search.list: (видео страницы, не больше remaining; токен следующей страницы или None)
+    def _fetch_page(self, parse, remaining, page_token, params):
+        request = self.youtube.search().list(
+            maxResults = min(remaining, RESULTS_PER_PAGE),
+            pageToken = page_token,
+            **params
+        )
+        response = self._execute(request)
+        page = tuple(
+            parse(i) for i in response.get('items', []) if i['id']['kind'] == "youtube#video"
+        )[:remaining]
+        return page, response.get('nextPageToken')
+
+    # страницы результатов (синхронно), всего не больше limit; токен страницы живёт
+    # только внутри вызова, поэтому параллельные обходы не мешают друг другу
+    def _pages(self, limit, parse, **params):
+        page_token = None
+        remaining = limit
+        while remaining > 0:
+            page, page_token = self._fetch_page(parse, remaining, page_token, params)
+            remaining -= len(page)
+            yield page
+            if not page_token:
+                return
+
+    # асинхронный обход страниц: пока вызывающий разбирает страницу, следующая уже загружается.
+    # Следующая страница запрашивается, только если она нужна (есть токен и не набрано limit),
+    # но если вызывающий бросит обход, уже отправленный запрос не отменить: cancel() не
+    # останавливает поток, и search.list этой страницы всё равно тратит 100 единиц квоты
+    async def _pages_async(self, limit, parse, **params):
+        def fetch(page_token, remaining):
+            return asyncio.create_task(
+                asyncio.to_thread(self._fetch_page, parse, remaining, page_token, params)
+            )
+
+        remaining = limit
+        prefetch = fetch(None, remaining) if remaining > 0 else None
+        try:
+            while prefetch is not None:
+                page, page_token = await prefetch
+                remaining -= len(page)
+                prefetch = fetch(page_token, remaining) if page_token and remaining > 0 else None
+                yield page
+        finally:
+            # обход бросили на середине — следующая страница уже не нужна (квота за неё
+            # списана, если запрос успел уйти)
+            if prefetch is not None:
+                prefetch.cancel()
+
+    @staticmethod
+    def _channel_video(item):
+        return (item['id']['videoId'], item['snippet']['publishedAt'], item['snippet']['title'])
+
+    @staticmethod
+    def _search_video(item):
+        return (item['id']['videoId'], item['snippet']['title'], item['snippet']['description'])
+
+    def _channel_params(self, date, channel_id):
+        return dict(channelId = channel_id, part = "snippet", order = 'date', publishedAfter = date)
+
+    def _search_params(self, keywords, date):
+        return dict(q = keywords, part = "snippet", type = "video", order = 'relevance', publishedAfter = date)
+
+    # Функция для получения списка видео из канала: ровно count видео (или все, что есть)
     def get_videos_from_channel(self, count=5, date='2024-01-01T17:47:00Z', channel_id=''):
-        results = []
-        self.channel_id = channel_id
+        pages = self._pages(count, self._channel_video, **self._channel_params(date, channel_id))
+        return tuple(video for page in pages for video in page)
 
-        if (count > 50):
-            stage = (count // 50) + 1
-            _count = 50
-        else:
-            stage = 1
-            _count = count
-
-        while stage > 0:
-            stage -= 1
-
-            request = self.youtube.search().list(
-                channelId = self.channel_id,
-                part = "snippet",
-                order = 'date',
-                publishedAfter = date,
-                maxResults = _count,
-                pageToken = self.next_page_token
+    # то же постранично и асинхронно: async for page in yt.iter_videos_from_channel(...)
+    async def iter_videos_from_channel(self, count=5, date='2024-01-01T17:47:00Z', channel_id=''):
+        async for page in self._pages_async(
+            count, self._channel_video, **self._channel_params(date, channel_id)
+        ):
+            yield page
+
+    # метаданные каналов (snippet, statistics, contentDetails) пачками до 50 id с кэшем на cache_ttl секунд;
+    # возвращает {channel_id: item}, для несуществующих каналов — None
+    def get_channels(self, channel_ids):
+        now = time.monotonic()
+        result = {}
+        missing = []
+        for channel_id in dict.fromkeys(channel_ids):
+            cached = self.channel_cache.get(channel_id)
+            if cached and cached[0] > now:
+                result[channel_id] = cached[1]
+            else:
+                missing.append(channel_id)
+
+        for start in range(0, len(missing), CHANNELS_PER_REQUEST):
+            batch = missing[start:start + CHANNELS_PER_REQUEST]
+            request = self.youtube.channels().list(
+                part = CHANNEL_PARTS,
+                id = ','.join(batch),
+                maxResults = len(batch)
             )
-            response = request.execute()
-
-            for i in response['items']:
-                if i['id']['kind'] == "youtube#video":
-                    results.append((i['id']['videoId'], i['snippet']['publishedAt'], i['snippet']['title']))
-                    # print(self.base_video_url + i['id']['videoId'] + '    ' + i['snippet']['publishedAt'] + '    ' + i['snippet']['title'])
-            try:
-                self.next_page_token = response['nextPageToken']
-            except:
-                break
-            _count = _count - 50 * stage
-        self.next_page_token = ''
-        return tuple(results)
-
-    # получение id канала
+            response = self._execute(request)
+            items = {i['id']: i for i in response.get('items', [])}
+            for channel_id in batch:
+                # отсутствующий канал тоже кэшируем, чтобы не спрашивать его снова
+                item = items.get(channel_id)
+                self.channel_cache[channel_id] = (now + self.cache_ttl, item)
+                result[channel_id] = item
+        return result
+
+    # метаданные одного канала (из кэша или одним запросом)
+    def get_channel(self, channel_id):
+        item = self.get_channels([channel_id])[channel_id]
+        if item is None:
+            raise KeyError(f'Канал {channel_id} не найден')
+        return item
+
+    # сброс кэша каналов (всего или отдельных id)
+    def clear_channel_cache(self, channel_ids=None):
+        if channel_ids is None:
+            self.channel_cache.clear()
+        else:
+            for channel_id in channel_ids:
+                self.channel_cache.pop(channel_id, None)
+
+    # получение id канала (заодно кэширует метаданные канала)
     def get_channel_id(self, channel_name):
         request = self.youtube.channels().list(
-            part = "snippet",
+            part = CHANNEL_PARTS,
             forUsername = channel_name
         )
-        response = request.execute()
-        return response['items'][0]['id']
+        response = self._execute(request)
+        item = response['items'][0]
+        self.channel_cache[item['id']] = (time.monotonic() + self.cache_ttl, item)
+        return item['id']
 
     # получение названия канала
     def get_channel_name(self, channel_id):
-        request = self.youtube.channels().list(
-            part = "snippet",
-            id = channel_id
-        )
-        response = request.execute()
-        return response['items'][0]['snippet']['title']
+        return self.get_channel(channel_id)['snippet']['title']
 
     # получение описания канала
     def get_channel_description(self, channel_id):
-        request = self.youtube.channels().list(
-            part = "snippet",
-            id = channel_id
-        )
-        response = request.execute()
-        return response['items'][0]['snippet']['description']
+        return self.get_channel(channel_id)['snippet']['description']
 
     # получение изображения канала
     def get_channel_thumbnail(self, channel_id):
-        request = self.youtube.channels().list(
-            part = "snippet",
-            id = channel_id
-        )
-        response = request.execute()
-        return response['items'][0]['snippet']['thumbnails']['high']['url']
+        return self.get_channel(channel_id)['snippet']['thumbnails']['high']['url']
 
     # получение количества подписчиков
     def get_channel_subscribers(self, channel_id):
-        request = self.youtube.channels().list(
-            part = "statistics",
-            id = channel_id
-        )
-        response = request.execute()
-        return response['items'][0]['statistics']['subscriberCount']
+        return self.get_channel(channel_id)['statistics']['subscriberCount']
 
     # получение количества просмотров
     def get_channel_view_count(self, channel_id):
-        request = self.youtube.channels().list(
-            part = "statistics",
-            id = channel_id
-        )
-        response = request.execute()
-        return response['items'][0]['statistics']['viewCount']
+        return self.get_channel(channel_id)['statistics']['viewCount']
 
     # получение количества видео
     def get_channel_video_count(self, channel_id):
-        request = self.youtube.channels().list(
-            part = "statistics",
-            id = channel_id
-        )
-        response = request.execute()
-        return response['items'][0]['statistics']['videoCount']
+        return self.get_channel(channel_id)['statistics']['videoCount']
+
+    # получение плейлиста загрузок канала
+    def get_channel_uploads_playlist(self, channel_id):
+        return self.get_channel(channel_id)['contentDetails']['relatedPlaylists']['uploads']
+
+    # метаданные сразу многих каналов: {channel_id: {name, description, thumbnail, subscribers, views, videos, uploads}}
+    def enrich_channels(self, channel_ids):
+        enriched = {}
+        for channel_id, item in self.get_channels(channel_ids).items():
+            if item is None:
+                continue
+            snippet = item.get('snippet', {})
+            statistics = item.get('statistics', {})
+            enriched[channel_id] = {
+                'name': snippet.get('title'),
+                'description': snippet.get('description'),
+                'thumbnail': snippet.get('thumbnails', {}).get('high', {}).get('url'),
+                # у скрытого счётчика подписчиков subscriberCount нет
+                'subscribers': statistics.get('subscriberCount'),
+                'views': statistics.get('viewCount'),
+                'videos': statistics.get('videoCount'),
+                'uploads': item.get('contentDetails', {}).get('relatedPlaylists', {}).get('uploads'),
+            }
+        return enriched
 
     # получение ссылки на видео
     def get_video_url(self, video_id):
@@ -156,41 +258,17 @@ class YouTubeSearch:
     def get_channel_url(self, channel_id):
         return self.base_channel_url + channel_id
 
-    # поиск видео
+    # поиск видео: ровно count результатов (или все, что есть)
     def search_videos(self, count=1, keywords='', date='2024-01-01T17:47:00Z'):
-        results = []
+        pages = self._pages(count, self._search_video, **self._search_params(keywords, date))
+        return tuple(video for page in pages for video in page)
 
-        if (count > 50):
-            stage = (count // 50) + 1
-            _count = 50
-        else:
-            stage = 1
-            _count = count
-
-        while stage > 0:
-            stage -= 1
-
-            request = self.youtube.search().list(
-                q = keywords,
-                part = "snippet",
-                type = "video",
-                order = 'relevance',
-                publishedAfter = date,
-                maxResults = _count,
-                pageToken = self.next_page_token
-            )
-            response = request.execute()
-
-            for i in response['items']:
-                if i['id']['kind'] == "youtube#video":
-                    results.append((i['id']['videoId'], i['snippet']['title'], i['snippet']['description']))
-            try:
-                self.next_page_token = response['nextPageToken']
-            except:
-                break
-            _count = _count - 50 * stage
-        self.next_page_token = ''
-        return tuple(results)
+    # то же постранично и асинхронно: async for page in yt.iter_search_videos(...)
+    async def iter_search_videos(self, count=1, keywords='', date='2024-01-01T17:47:00Z'):
+        async for page in self._pages_async(
+            count, self._search_video, **self._search_params(keywords, date)
+        ):
+            yield page
 
     # получение изображения видео
     def get_url_image_from_video(self, video_id, quality):
@@ -0,0 +1,162 @@
+# benchmarks/__main__.py
+"""
+Запуск микробенчмарков и сравнение с базовой линией.
+
+    python -m benchmarks                    # замер + сравнение с baseline.json
+    python -m benchmarks -k tag_validator   # только случаи с подстрокой в имени
+    python -m benchmarks --save             # записать результаты как новую базовую линию
+    python -m benchmarks --threshold 2      # регрессия — медленнее базы в 2 раза
+
+Сравниваются медианы повторов. Случай, вышедший за порог, замеряется ещё
+раз, и регрессией считается, только если повторный замер подтвердил её:
+одиночные выбросы (планировщик, соседние процессы) не роняют прогон.
+
+Код выхода 1, если хотя бы один случай стал медленнее порога. Базовая линия
+зависит от машины: сравнивайте с базой, снятой на том же железе.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+MIN_REPEAT_SECONDS = 0.2  # минимальная длительность одного повтора
+REPEATS = 7
+DEFAULT_THRESHOLD = 1.5
+
+
+def measure(op: Callable[[], object], repeats: int = REPEATS) -> Dict[str, float]:
+    """Время одного вызова op (мкс): минимум и медиана по повторам."""
+    op()  # прогрев: ленивые импорты, кэши
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            op()
+        if time.perf_counter() - started >= MIN_REPEAT_SECONDS:
+            break
+        number *= 2
+
+    timings = []
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeats):
+            started = time.perf_counter()
+            for _ in range(number):
+                op()
+            timings.append((time.perf_counter() - started) / number * 1e6)
+    finally:
+        if gc_enabled:
+            gc.enable()
+    timings.sort()
+    return {"min_us": timings[0], "median_us": timings[len(timings) // 2], "loops": number}
+
+
+def run(selected: Dict[str, Callable]) -> Tuple[Dict[str, Dict], Dict[str, Callable]]:
+    """Замеры случаев и подготовленные операции (для повторного замера)."""
+    results, ops = {}, {}
+    for name, setup in selected.items():
+        try:
+            ops[name] = setup()
+        except ImportError as e:
+            # Например, aiogram не установлен — случай пропускается, а не падает весь набор
+            print(f"  {name:<50} пропущен: {e}")
+            continue
+        results[name] = measure(ops[name])
+        print(f"  {name:<50} {results[name]['median_us']:12.1f} мкс")
+    return results, ops
+
+
+def compare(
+    results: Dict[str, Dict],
+    baseline: Dict[str, Dict],
+    threshold: float,
+    ops: Dict[str, Callable],
+) -> int:
+    regressions = 0
+    print(f"\nСравнение с {os.path.relpath(BASELINE, ROOT)} (порог ×{threshold}):")
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            print(f"  {name:<50} нет в базовой линии")
+            continue
+        ratio = result["median_us"] / base["median_us"]
+        if ratio > threshold:
+            # Подтверждаем повторным замером той же операции: берём лучший из двух
+            retry = measure(ops[name])
+            if retry["median_us"] < result["median_us"]:
+                result = retry
+                ratio = result["median_us"] / base["median_us"]
+        if ratio > threshold:
+            verdict = "❌ РЕГРЕССИЯ"
+            regressions += 1
+        elif ratio < 1 / threshold:
+            verdict = "✅ быстрее"
+        else:
+            verdict = "ок"
+        print(
+            f"  {name:<50} {base['median_us']:10.1f} → {result['median_us']:10.1f} мкс "
+            f"×{ratio:5.2f}  {verdict}"
+        )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Микробенчмарки горячих путей")
+    parser.add_argument("-k", dest="pattern", default="", help="подстрока в имени случая")
+    parser.add_argument("--save", action="store_true", help="сохранить как базовую линию")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args()
+
+    sys.path.insert(0, ROOT)
+    from benchmarks.cases import CASES
+
+    selected = {name: setup for name, setup in CASES.items() if args.pattern in name}
+    print(f"Python {platform.python_version()} ({platform.machine()}), случаев: {len(selected)}")
+    results, ops = run(selected)
+
+    stored = {}
+    if os.path.exists(BASELINE):
+        with open(BASELINE, "r", encoding="utf-8") as f:
+            stored = json.load(f)
+
+    if args.save:
+        # Случаи, которые не запускались (фильтр -k, пропуск), сохраняют прежнюю базу
+        cases = {**stored.get("cases", {}), **results}
+        with open(BASELINE, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "python": platform.python_version(),
+                    "machine": platform.machine(),
+                    "recorded_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                    "cases": {
+                        name: {k: round(v, 2) for k, v in value.items()}
+                        for name, value in sorted(cases.items())
+                    },
+                },
+                f,
+                ensure_ascii=False,
+                indent=2,
+            )
+            f.write("\n")
+        print(f"\nБазовая линия записана: {os.path.relpath(BASELINE, ROOT)}")
+        return
+
+    if not stored:
+        print("\nБазовой линии нет — запустите с --save")
+        return
+
+    if compare(results, stored.get("cases", {}), args.threshold, ops):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
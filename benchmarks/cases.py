@@ -0,0 +1,251 @@
+# benchmarks/cases.py
+"""
+Микробенчмарки горячих путей. Каждый случай — функция setup(), которая
+готовит данные и возвращает вызываемый объект без аргументов; замеряется
+только он.
+
+Случаи регистрируются декоратором @case и запускаются из
+`python -m benchmarks` (см. benchmarks/__main__.py).
+"""
+import os
+import random
+import tempfile
+from datetime import timedelta
+from typing import Callable, Dict
+
+CASES: Dict[str, Callable[[], Callable[[], object]]] = {}
+
+
+def case(name: str):
+    def register(setup):
+        CASES[name] = setup
+        return setup
+
+    return register
+
+
+def _disable_tracing():
+    # Бенчмарк не должен писать трассу на диск (файл растёт, шумит ввод-вывод)
+    import core.tracing
+
+    core.tracing.TRACING_ENABLED = False
+
+
+# ----------- Данные -----------
+
+# Типичный ответ LLM: лишние теги, <br>, сущности, эмодзи, markdown-остатки
+LLM_OUTPUT = (
+    "<p><strong>🎬 «Дюна: Часть третья»</strong> — официальный трейлер!</p>\n"
+    "<p>Дени Вильнёв возвращается на <em>Арракис</em>: Пол Атрейдес &amp; Чани "
+    "встречают последствия священной войны.<br/>Премьера — <b>18 декабря 2026</b>.</p>\n"
+    "<ul><li><b>Жанр:</b> фантастика, драма</li><li><i>В ролях:</i> Тимоти Шаламе, "
+    "Зендея, Роберт Паттинсон</li></ul>\n"
+    "<p>Бюджет &gt; $190 млн, хронометраж ≈ 2 ч 40 мин &#8212; самый масштабный фильм "
+    "трилогии. <a href=\"https://youtu.be/abc\">Смотреть</a> 👇</p>\n"
+    "<!-- подпись --><span class=\"x\">#трейлер #кино</span> & ещё < чуть-чуть текста"
+) * 2
+
+
+def _playlist_item(video_id: str, published_at: str) -> Dict:
+    return {
+        "snippet": {
+            "publishedAt": published_at,
+            "title": f"Official Trailer {video_id}",
+            "description": "Трейлер " * 40,
+            "thumbnails": {
+                "default": {"url": f"https://i.ytimg.com/vi/{video_id}/default.jpg", "width": 120},
+                "high": {"url": f"https://i.ytimg.com/vi/{video_id}/hqdefault.jpg", "width": 480},
+                "maxres": {"url": f"https://i.ytimg.com/vi/{video_id}/maxresdefault.jpg", "width": 1280},
+            },
+            "resourceId": {"videoId": video_id},
+        }
+    }
+
+
+def _post(i: int) -> Dict:
+    return {
+        "videoId": f"vid{i:07d}",
+        "channel_name": f"Канал {i % 50}",
+        "title": f"Трейлер №{i}",
+        "description": "Описание трейлера " * 20,
+        "thumbnail_url": f"https://i.ytimg.com/vi/vid{i:07d}/hqdefault.jpg",
+        "generated_post": "<b>Фильм</b> — <i>жанр</i>. " * 15,
+        "genre": "<b>Фантастика</b>",
+        "status": "pending",
+        "created_at": "2026-10-19T12:00:00+00:00",
+    }
+
+
+# ----------- tag_validator -----------
+
+
+@case("tag_validator.clean_html_for_telegram")
+def bench_clean_html():
+    from core.tag_validator import clean_html_for_telegram
+
+    return lambda: clean_html_for_telegram(LLM_OUTPUT)
+
+
+@case("tag_validator.is_only_allowed_tags")
+def bench_is_only_allowed_tags():
+    from core.tag_validator import clean_html_for_telegram, is_only_allowed_tags
+
+    cleaned = clean_html_for_telegram(LLM_OUTPUT)
+    return lambda: (is_only_allowed_tags(LLM_OUTPUT), is_only_allowed_tags(cleaned))
+
+
+# ----------- ytube_parser -----------
+
+
+@case("ytube_parser.parse_yt_datetime x1000")
+def bench_parse_yt_datetime():
+    from core.yt_parser.ytube_parser import parse_yt_datetime
+
+    values = [f"2026-10-{1 + i % 28:02d}T{i % 24:02d}:{i % 60:02d}:00Z" for i in range(1000)]
+
+    def run():
+        for value in values:
+            parse_yt_datetime(value)
+
+    return run
+
+
+@case("ytube_parser.check_for_new_videos 20ch x 500")
+def bench_check_for_new_videos():
+    """Цикл фильтрации без сети: плейлисты подставляются вместо запросов к API."""
+    _disable_tracing()
+    from core.yt_parser import ytube_parser
+
+    rng = random.Random(42)
+    day = ytube_parser.START_DAY_BEGIN
+    playlists = {}
+    for c in range(20):
+        items = []
+        for v in range(500):
+            # Половина видео — в целевой день, остальные — раньше
+            offset = timedelta(minutes=rng.randrange(24 * 60 * 3)) - timedelta(days=2)
+            published = (day + offset).strftime("%Y-%m-%dT%H:%M:%SZ")
+            items.append(_playlist_item(f"c{c}v{v}", published))
+        playlists[f"UC{c:022d}"] = items
+    deleted = [f"c{c}v{v}" for c in range(20) for v in range(0, 500, 7)]
+
+    class _Credentials:
+        def save_state(self):
+            pass
+
+        def remaining(self):
+            return 0
+
+    parser = ytube_parser.YouTubeParser.__new__(ytube_parser.YouTubeParser)
+    parser.credentials = _Credentials()
+    parser.channels = [{"id": cid, "name": cid} for cid in playlists]
+    parser.deleted_videos = deleted
+    parser._progress = {}
+    parser._load_last_videos = dict
+    parser._get_channel_videos_paged = lambda channel_id: list(playlists[channel_id])
+    # Логи цикла идут в очередь логгера — не замеряем их вывод
+    ytube_parser.logger.disabled = True
+    return parser.check_for_new_videos
+
+
+# ----------- video_storage -----------
+
+
+@case("video_storage.save_json 10k posts")
+def bench_save_json():
+    from core.yt_parser.video_storage import save_json
+
+    posts = [_post(i) for i in range(10_000)]
+    path = os.path.join(tempfile.mkdtemp(prefix="bench_"), "pending_posts.json")
+    return lambda: save_json(path, posts)
+
+
+@case("video_storage.load_json 10k posts")
+def bench_load_json():
+    from core.yt_parser.video_storage import load_json, save_json
+
+    path = os.path.join(tempfile.mkdtemp(prefix="bench_"), "pending_posts.json")
+    save_json(path, [_post(i) for i in range(10_000)])
+    return lambda: load_json(path)
+
+
+@case("video_storage.save_posts 10k posts")
+def bench_save_posts():
+    from core.records import Post
+    from core.yt_parser.video_storage import save_posts
+
+    posts = [Post.from_dict(_post(i)) for i in range(10_000)]
+    path = os.path.join(tempfile.mkdtemp(prefix="bench_"), "pending_posts.json")
+    return lambda: save_posts(posts, path)
+
+
+@case("video_storage.load_posts 10k posts")
+def bench_load_posts():
+    from core.records import Post
+    from core.yt_parser.video_storage import load_posts, save_posts
+
+    path = os.path.join(tempfile.mkdtemp(prefix="bench_"), "pending_posts.json")
+    save_posts([Post.from_dict(_post(i)) for i in range(10_000)], path)
+    return lambda: load_posts(path)
+
+
+# ----------- records -----------
+
+
+@case("records.encode_posts 10k")
+def bench_encode_posts():
+    from core.records import Post, encode_posts
+
+    posts = [Post.from_dict(_post(i)) for i in range(10_000)]
+    return lambda: encode_posts(posts)
+
+
+@case("records.video codec x1000")
+def bench_video_codec():
+    from core.records import Video, decode_video, encode_video
+
+    videos = [
+        Video(f"vid{i:07d}", f"UC{i % 50:022d}", f"Канал {i % 50}", f"Трейлер №{i}", "Описание " * 40)
+        for i in range(1000)
+    ]
+
+    def run():
+        for video in videos:
+            decode_video(encode_video(video))
+
+    return run
+
+
+# ----------- deleted list -----------
+
+
+@case("ytube_parser.load_deleted_list + membership 10k x1000")
+def bench_deleted_membership():
+    """Путь детектора: load_deleted_list() из deleted_videos.json и `vid in deleted_videos`."""
+    from core.yt_parser import ytube_parser
+    from core.yt_parser.video_storage import save_json
+
+    path = os.path.join(tempfile.mkdtemp(prefix="bench_"), "deleted_videos.json")
+    save_json(path, {"deleted": [f"vid{i:07d}" for i in range(10_000)]})
+    ytube_parser.DELETED_VIDS_JSON = path
+    rng = random.Random(7)
+    # Половина — попадания, половина — промахи (новые видео, самый частый случай)
+    probes = [f"vid{rng.randrange(20_000):07d}" for _ in range(1000)]
+
+    parser = ytube_parser.YouTubeParser.__new__(ytube_parser.YouTubeParser)
+
+    def run():
+        parser.deleted_videos = ytube_parser.load_deleted_list()
+        return sum(1 for vid in probes if vid in parser.deleted_videos)
+
+    return run
+
+
+# ----------- bot -----------
+
+
+@case("keyboards.moderation_keyboard")
+def bench_moderation_keyboard():
+    from bot.keyboards import moderation_keyboard
+
+    return lambda: moderation_keyboard(17, 120, "vid0000017")
@@ -0,0 +1,140 @@
+# bot/admin.py
+"""
+Команды профилирования для модераторов (без перезапуска бота):
+
+/profile [сек]     — CPU-профиль за окно (по умолчанию 60 с)
+/memprofile [сек]  — tracemalloc за окно: топ выделений и рост за окно
+/memsnapshot       — снимок памяти сейчас и рост с прошлого снимка
+                     (tracemalloc остаётся включённым до /profile_stop)
+/profile_stop      — досрочно завершить окно и прислать отчёты
+
+Отчёты приходят текстовым документом.
+"""
+import asyncio
+from datetime import datetime
+
+from aiogram import Router, types
+from aiogram.filters import Command, CommandObject
+from aiogram.types import BufferedInputFile
+
+from core.logger import logger
+from core.profiling import MemoryProfiler, SamplingProfiler, clamp_window
+from core.settings import get_config
+
+router = Router()
+config = get_config()
+
+DEFAULT_WINDOW = 60
+
+cpu_profiler = SamplingProfiler()
+memory_profiler = MemoryProfiler()
+# Активные окна профилирования: вид ("cpu" / "memory") -> задача
+_windows: dict = {}
+
+
+def is_admin(message: types.Message) -> bool:
+    """Доступ — как к модерации в /start."""
+    return str(message.from_user.id) in config.moderator_chat_id
+
+
+def _window_seconds(command: CommandObject) -> int | None:
+    if not command.args:
+        return DEFAULT_WINDOW
+    try:
+        return clamp_window(int(command.args.strip()))
+    except ValueError:
+        return None
+
+
+async def send_report(message: types.Message, kind: str, report: str):
+    filename = f"{kind}_profile_{datetime.now():%Y%m%d_%H%M%S}.txt"
+    await message.answer_document(
+        BufferedInputFile(report.encode("utf-8"), filename=filename),
+        caption=f"📊 Отчёт: {kind}",
+    )
+
+
+async def _cpu_window(message: types.Message, seconds: int):
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        # Отчёт отправляем и при досрочной остановке (/profile_stop)
+        report = await asyncio.to_thread(cpu_profiler.stop)
+        _windows.pop("cpu", None)
+        await send_report(message, "cpu", report)
+
+
+async def _memory_window(message: types.Message, seconds: int):
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        report = await asyncio.to_thread(memory_profiler.snapshot_report)
+        memory_profiler.stop()
+        _windows.pop("memory", None)
+        await send_report(message, "memory", report)
+
+
+@router.message(Command("profile"))
+async def cmd_profile(message: types.Message, command: CommandObject):
+    if not is_admin(message):
+        return
+    seconds = _window_seconds(command)
+    if seconds is None:
+        await message.reply("Использование: /profile [секунд]")
+        return
+    if cpu_profiler.running:
+        await message.reply("CPU-профиль уже снимается, /profile_stop — остановить")
+        return
+    cpu_profiler.start()
+    _windows["cpu"] = asyncio.create_task(_cpu_window(message, seconds))
+    logger.info("📊 CPU-профилирование на %s с (запросил %s)", seconds, message.from_user.id)
+    await message.reply(f"📊 CPU-профиль снимается {seconds} с...")
+
+
+@router.message(Command("memprofile"))
+async def cmd_memprofile(message: types.Message, command: CommandObject):
+    if not is_admin(message):
+        return
+    seconds = _window_seconds(command)
+    if seconds is None:
+        await message.reply("Использование: /memprofile [секунд]")
+        return
+    if "memory" in _windows:
+        await message.reply("Профиль памяти уже снимается, /profile_stop — остановить")
+        return
+    # Первый снимок (start) — тяжёлая операция, не в event loop
+    await asyncio.to_thread(memory_profiler.start)
+    _windows["memory"] = asyncio.create_task(_memory_window(message, seconds))
+    logger.info("📊 tracemalloc на %s с (запросил %s)", seconds, message.from_user.id)
+    await message.reply(f"📊 Выделения памяти отслеживаются {seconds} с...")
+
+
+@router.message(Command("memsnapshot"))
+async def cmd_memsnapshot(message: types.Message):
+    if not is_admin(message):
+        return
+    if not memory_profiler.running:
+        await asyncio.to_thread(memory_profiler.start)
+        await message.reply(
+            "📊 tracemalloc включён, первый снимок сделан. "
+            "Повторите /memsnapshot позже, чтобы увидеть рост."
+        )
+        return
+    report = await asyncio.to_thread(memory_profiler.snapshot_report)
+    await send_report(message, "memory", report)
+
+
+@router.message(Command("profile_stop"))
+async def cmd_profile_stop(message: types.Message):
+    if not is_admin(message):
+        return
+    tasks = list(_windows.values())
+    if not tasks and not memory_profiler.running:
+        await message.reply("Профилирование не запущено")
+        return
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    # tracemalloc, включённый через /memsnapshot
+    memory_profiler.stop()
+    await message.reply("⏹ Профилирование остановлено")
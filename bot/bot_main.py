@@ -2,19 +2,33 @@ from aiogram import Bot, Dispatcher
 from aiogram.fsm.storage.memory import MemoryStorage
 
 from core.logger import logger
-from config import Config
+from core.settings import get_config
 from bot.handlers import router
+from bot.admin import router as admin_router
 
 
 # Загрузка конфигурации
-config = Config()
+config = get_config()
+
+# Другой сервер Bot API (локальный telegram-bot-api или заглушка из simulation/)
+TELEGRAM_API_URL = getattr(config, "telegram_api_url", "")
 
 # Создаем бот и диспетчер
-bot = Bot(token=config.bot_token)
+if TELEGRAM_API_URL:
+    from aiogram.client.session.aiohttp import AiohttpSession
+    from aiogram.client.telegram import TelegramAPIServer
+
+    bot = Bot(
+        token=config.bot_token,
+        session=AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_URL)),
+    )
+else:
+    bot = Bot(token=config.bot_token)
 storage = MemoryStorage()
 dp = Dispatcher(storage=storage)
 
 # Регистрация роутеров
 dp.include_router(router)
+dp.include_router(admin_router)
 
 logger.info("Бот и диспетчер инициализированы")
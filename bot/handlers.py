@@ -1,19 +1,42 @@
 import asyncio
+import html
 
-from typing import List, Dict
+from typing import List, Dict, Tuple
 from aiogram import Router, types, Bot
 from aiogram.filters import Command
 
 from bot.keyboards import ModerationAction, moderation_keyboard, moderate_keyboard
-from core.yt_parser.video_storage import load_json, save_json
-from core.llm.chatgpt import generate_post
+from bot.photos import forget_photo, post_photo, remember_photo
+from bot.send_queue import send_queue
+from bot.jobs import job_runner
+from bot.streaming import DraftStreamer
+from core.yt_parser.video_storage import (
+    load_json,
+    load_posts,
+    save_json,
+    save_posts,
+    update_posts,
+)
+from core.records import STATUS_APPROVED, STATUS_PENDING, STATUS_UNAVAILABLE, Post
+from core.llm.chatgpt import generate_post, stream_gpt_response, is_valid_response
 from core.llm.prompts import generate_post_prompt
+from core.llm.retry import REGEN_POLICY, call_with_retry, llm_deadline
 from core.logger import logger
-from core.tag_validator import is_only_allowed_tags, clean_html_for_telegram
-from config import Config
+from core.metrics import TAG_VALIDATION_FAILURES
+from core.tracing import mark, span
+from core.tag_validator import (
+    CAPTION_LIMIT,
+    CAPTION_TAGS,
+    is_only_allowed_tags,
+    is_valid_telegram_html,
+    clean_html_for_telegram,
+    sanitize_caption,
+    visible_length,
+)
+from core.settings import get_config
 
 router = Router()
-config = Config()
+config = get_config()
 
 PENDING_POSTS_JSON = config.pending_posts_json
 # Попытаемся взять путь к файлу удалённых ID из конфига, иначе — дефолт
@@ -21,8 +44,11 @@ DELETED_VIDEOS_JSON = getattr(config, "deleted_videos_json", "deleted_videos.jso
 # Путь к файлу с маппингом жанр -> канал (username или id)
 CHANNELS_JSON = getattr(config, "channels_json", None)
 
-# Максимум попыток регенерации чтобы убрать запрещённые теги
-MAX_REGEN_ATTEMPTS = 5
+# Лимиты частей подписи (видимых символов); остальное место — тексту поста
+TITLE_LIMIT = 128
+GENRE_LIMIT = 64
+ALT_SOURCES_LIMIT = 320
+ALT_SOURCE_NAME_LIMIT = 48
 
 
 # -------------------- вспомогательные функции --------------------
@@ -37,7 +63,8 @@ async def ensure_deleted_file_format():
             or not isinstance(data["deleted"], list)
         ):
             logger.warning(
-                f"{DELETED_VIDEOS_JSON} в неверном формате — сбрасываем в {{'deleted': []}}"
+                "%s в неверном формате — сбрасываем в {'deleted': []}",
+                DELETED_VIDEOS_JSON,
             )
             # ASYNC I/O
             await asyncio.to_thread(save_json, DELETED_VIDEOS_JSON, {"deleted": []})
@@ -71,59 +98,117 @@ async def add_deleted_video(video_id: str):
         data["deleted"] = deleted
         # ASYNC I/O
         await asyncio.to_thread(save_json, DELETED_VIDEOS_JSON, data)
-        logger.info(f"Video {video_id} добавлен в {DELETED_VIDEOS_JSON}")
+        logger.info("Video %s добавлен в %s", video_id, DELETED_VIDEOS_JSON)
 
 
-async def ensure_post_has_only_allowed_tags(post: Dict) -> None:
+async def ensure_post_has_only_allowed_tags(post: Post) -> None:
     """
-    Проверка-с циклом: регенерируем post['generated_post'] пока не останутся только <b> и <i>
-    Если после MAX_REGEN_ATTEMPTS всё ещё есть некорректные теги — вырезаем их.
+    Проверка-с циклом: регенерируем post.generated_post пока не останутся только <b> и <i>
+    Если после REGEN_POLICY.max_attempts всё ещё есть некорректные теги — вырезаем их.
     Меняет post in-place.
     """
-    text = post.get("generated_post", "") or ""
-    if is_only_allowed_tags(text):
+    if is_only_allowed_tags(post.generated_post):
         return
 
-    title = post.get("title", "")
-    description = post.get("description", "")
+    prompt = generate_post_prompt(post.title, post.description)
 
-    for attempt in range(1, MAX_REGEN_ATTEMPTS + 1):
-        try:
-            logger.info(
-                f"Попытка регенерации ({attempt}/{MAX_REGEN_ATTEMPTS}) для видео {post.get('videoId')}"
-            )
-            prompt = generate_post_prompt(title, description)
-            new_text = await generate_post(prompt)
-            if not new_text:
-                logger.warning(
-                    f"Пустой ответ от LLM при регенерации (попытка {attempt})"
-                )
-                continue
-
-            post["generated_post"] = new_text
-            if is_only_allowed_tags(new_text):
-                logger.info(f"Успешно очищено от лишних тегов на попытке {attempt}")
-                return
-        except Exception as e:
-            logger.error(f"Ошибка регенерации на попытке {attempt}: {e}")
+    logger.info("Регенерация поста для видео %s", post.video_id)
+    with llm_deadline():
+        new_text = await call_with_retry(
+            lambda: generate_post(prompt),
+            policy=REGEN_POLICY,
+            is_valid=lambda t: bool(t) and is_only_allowed_tags(t),
+            description=f"Регенерация поста {post.video_id}",
+        )
+    if new_text:
+        post.generated_post = new_text
+        logger.info("Успешно очищено от лишних тегов")
+        return
 
     # Если до сих пор есть запрещённые теги — вырезаем их
-    cleaned = clean_html_for_telegram(post.get("generated_post", ""))
-    post["generated_post"] = cleaned
+    post.generated_post = clean_html_for_telegram(post.generated_post)
     logger.warning(
-        f"После {MAX_REGEN_ATTEMPTS} попыток — удалены все запрещённые теги для видео {post.get('videoId')}"
+        "После %s попыток — удалены все запрещённые теги для видео %s",
+        REGEN_POLICY.max_attempts,
+        post.video_id,
     )
 
 
+def format_alt_sources(post: Post, limit: int = ALT_SOURCES_LIMIT) -> str:
+    """
+    Строка со ссылками на дубликаты видео с других каналов (для модератора).
+    Не длиннее limit видимых символов: не поместившиеся — «… и ещё N».
+    """
+    alt_sources = post.alt_sources
+    if not alt_sources:
+        return ""
+    prefix = "\n<b>Другие источники:</b> "
+    # Место под «… и ещё N» держим всегда: заранее не известно, поместятся ли все
+    used = visible_length(prefix) + visible_length(f" … и ещё {len(alt_sources)}")
+    links = []
+    for source in alt_sources:
+        name = source.get("channel_name") or source.get("videoId", "")
+        link = (
+            f"<a href='https://youtu.be/{html.escape(source.get('videoId', ''))}'>"
+            f"{sanitize_caption(html.escape(name), ALT_SOURCE_NAME_LIMIT) or '?'}</a>"
+        )
+        size = visible_length(link) + (2 if links else 0)  # ", " между ссылками
+        if used + size > limit:
+            break
+        links.append(link)
+        used += size
+    text = prefix + ", ".join(links)
+    omitted = len(alt_sources) - len(links)
+    if omitted:
+        text += f"{' ' if links else ''}… и ещё {omitted}"
+    return text
+
+
+def build_post_caption(post: Post, with_sources: bool = False) -> str:
+    """
+    Подпись к фото поста: канал, текст, жанр и ссылка на видео.
+    Название канала, жанр и список источников обрезаются до своих лимитов,
+    текст поста — до оставшегося места, так что вся подпись укладывается
+    в лимит Telegram (CAPTION_LIMIT).
+    """
+    title = post.channel_name or post.title or "Без названия"
+    header = f"<b>{sanitize_caption(html.escape(title, quote=False), TITLE_LIMIT)}</b>\n\n"
+    if with_sources and post.status == STATUS_UNAVAILABLE:
+        header = f"⚠️ <b>Видео недоступно на YouTube</b>\n{header}"
+    footer = (
+        f"\n\n<b>Жанр:</b> {sanitize_caption(post.genre or 'Неизвестно', GENRE_LIMIT)}\n"
+        f"<a href='https://youtu.be/{html.escape(post.video_id)}'>🎬 Смотреть видео</a>"
+    )
+    if with_sources:
+        footer += format_alt_sources(post)
+
+    budget = CAPTION_LIMIT - visible_length(header) - visible_length(footer)
+    body = sanitize_caption(
+        post.generated_post or "Нет текста поста", max(budget, 1)
+    )
+    caption = f"{header}{body}{footer}"
+    if is_valid_telegram_html(caption, CAPTION_LIMIT, CAPTION_TAGS):
+        return caption
+
+    # Сюда попадать не должны (см. python -m fuzz), но модерацию и публикацию
+    # это ронять не должно: отдаём очищенную подпись без ссылок, а в крайнем
+    # случае — простой текст
+    TAG_VALIDATION_FAILURES.inc(check="caption")
+    logger.error(
+        "Подпись поста %s не прошла проверку разметки, отправляю очищенную: %r",
+        post.video_id,
+        caption,
+    )
+    fallback = sanitize_caption(caption, CAPTION_LIMIT)
+    if is_valid_telegram_html(fallback, CAPTION_LIMIT):
+        return fallback
+    return html.escape(f"{title[:TITLE_LIMIT]}\nhttps://youtu.be/{post.video_id}", quote=False)
+
+
 # ------------------ Отображение поста -------------------
 async def show_post(bot: Bot, chat_id: int, index: int):
     """Показывает пост для модерации по индексу"""
-    posts = await asyncio.to_thread(load_json, PENDING_POSTS_JSON)
-    if not isinstance(posts, list):
-        logger.warning(
-            f"{PENDING_POSTS_JSON} ожидается список, но получен другой тип — сбрасываем."
-        )
-        posts = []
+    posts = await asyncio.to_thread(load_posts, PENDING_POSTS_JSON)
 
     if not posts or index >= len(posts):
         await bot.send_message(chat_id, "Больше постов для модерации нет ✅")
@@ -131,63 +216,79 @@ async def show_post(bot: Bot, chat_id: int, index: int):
 
     post = posts[index]
 
-    caption = (
-        f"<b>{post.get('channel_name', post.get('title', 'Без названия'))}</b>\n\n"
-        f"{post.get('generated_post', 'Нет текста поста')}\n\n"
-        f"<b>Жанр:</b> {post.get('genre', 'Неизвестно')}\n"
-        f"<a href='https://youtu.be/{post.get('videoId', '')}'>🎬 Смотреть видео</a>"
-    )
+    caption = build_post_caption(post, with_sources=True)
 
     # Сохраняем часть данных отдельно (если нужно для публикации)
     # но не используем глобальные переменные без необходимости
 
     try:
-        await bot.send_photo(
+        message = await bot.send_photo(
             chat_id=chat_id,
-            photo=post.get("thumbnail_url", ""),
+            photo=post_photo(post.video_id, post.thumbnail_url),
             caption=caption,
             parse_mode="HTML",
-            reply_markup=moderation_keyboard(index, len(posts)),
+            reply_markup=moderation_keyboard(index, len(posts), post.video_id),
         )
+        await remember_photo(post.video_id, message)
     except Exception as e:
-        logger.error(f"Ошибка при отправке поста '{post.get('title')}': {e}")
+        logger.error("Ошибка при отправке поста '%s': %s", post.title, e)
         # fallback — отправляем текст
         await bot.send_message(
             chat_id,
             f"⚠️ Не удалось отправить фото. Вот сам пост:\n\n{caption}",
             parse_mode="HTML",
-            reply_markup=moderation_keyboard(index, len(posts)),
+            reply_markup=moderation_keyboard(index, len(posts), post.video_id),
         )
 
 
-# ------------------ Callback Handler -------------------
-@router.callback_query(ModerationAction.filter())
-async def handle_callback(query: types.CallbackQuery, callback_data: ModerationAction):
-    """Обработка действий модератора"""
-    bot: Bot = query.bot
-    posts = await asyncio.to_thread(load_json, PENDING_POSTS_JSON)
-    if not isinstance(posts, list):
-        posts = []
+# ------------------ Фоновые задачи модерации -------------------
+async def edit_moderation_message(message: types.Message, text: str):
+    """Меняет подпись сообщения модерации (или текст, если это не фото)."""
+    try:
+        await message.edit_caption(caption=text, reply_markup=None)
+    except Exception:
+        # Если это было не фото (например, сообщение об ошибке), редактируем текст
+        try:
+            await message.edit_text(text=text, reply_markup=None)
+        except Exception as e:
+            logger.warning("Не удалось обновить сообщение модерации: %s", e)
 
-    index = callback_data.post_index
-    chat_id = query.message.chat.id
 
-    if index >= len(posts):
-        await query.answer("Пост не найден ❌", show_alert=True)
-        return
+async def update_pending_post(video_id: str, changes: Dict) -> Tuple[int, int] | None:
+    """
+    Применяет changes к посту с данным videoId в pending_posts.json.
+    Ищем по videoId, а не по индексу: пока шла задача, список мог измениться.
+    Возвращает (текущий индекс поста, всего постов) или None, если поста уже нет.
+    """
 
-    post = posts[index]
+    def apply(posts: List[Post]):
+        for index, post in enumerate(posts):
+            if post.video_id == video_id:
+                post.update(changes)
+                return index, len(posts)
+        return None
+
+    # Генератор может дописывать посты из другого процесса — меняем под блокировкой
+    return await asyncio.to_thread(update_posts, apply, PENDING_POSTS_JSON)
+
+
+async def approve_post_job(message: types.Message, chat_id: int, post: Post):
+    """Проверка тегов (возможно, с регенерацией) и постановка поста в очередь публикации."""
+    with span("publish.approve", video_id=post.video_id):
+        title = post.title or "Без названия"
+        await edit_moderation_message(message, f"⏳ Проверка и публикация: '{title}'...")
 
-    # --- Одобрение ---
-    if callback_data.action == "approve":
         # Перед публикацией убедимся, что в посте нет запрещённых тегов:
         try:
             await ensure_post_has_only_allowed_tags(post)
         except Exception as e:
-            logger.error(f"Ошибка при проверке тегов перед публикацией: {e}")
+            logger.error("Ошибка при проверке тегов перед публикацией: %s", e)
 
-        post["status"] = "approved"
-        await query.answer("✅ Пост одобрен")
+        post.status = STATUS_APPROVED
+        await update_pending_post(
+            post.video_id,
+            {"generated_post": post.generated_post, "status": STATUS_APPROVED},
+        )
 
         target_channel = config.channel_id
         if not target_channel:
@@ -196,75 +297,179 @@ async def handle_callback(query: types.CallbackQuery, callback_data: ModerationA
             )
             target_channel = chat_id
 
+        # Публикация уходит в очередь отправки с учётом лимитов Telegram
         try:
-            await bot.send_photo(
-                chat_id=target_channel,
-                photo=post.get("thumbnail_url", ""),
-                caption=f"<b>{post.get('channel_name', '')}</b>\n\n{post.get('generated_post', '')}\n\n"
-                f"<b>Жанр:</b> {post.get('genre', 'Неизвестно')}\n"
-                f"<a href='https://youtu.be/{post.get('videoId', '')}'>🎬 Смотреть видео</a>",
-                parse_mode="HTML",
+            await send_queue.enqueue_photo(
+                target_channel,
+                post,
+                build_post_caption(post),
+                report_chat_id=chat_id,
             )
-            logger.info(f"Пост '{post.get('title')}' опубликован в {target_channel}")
         except Exception as e:
-            logger.error(
-                f"Ошибка публикации поста '{post.get('title')}' в {target_channel}: {e}"
-            )
-            await bot.send_message(chat_id, f"⚠️ Ошибка публикации: {e}")
+            logger.error("Ошибка постановки поста '%s' в очередь публикации: %s", title, e)
+            await edit_moderation_message(message, f"⚠️ Ошибка публикации '{title}': {e}")
+            return
 
-        await asyncio.to_thread(save_json, PENDING_POSTS_JSON, posts)
+        await edit_moderation_message(message, f"✅ Одобрено: '{title}'")
 
-        try:
-            await query.message.edit_caption(
-                caption=f"✅ Одобрено: '{post.get('title', 'Без названия')}'",
-                reply_markup=None,
+
+async def stream_post_draft(prompt: str, streamer: DraftStreamer) -> str:
+    """
+    Потоковая генерация поста: фрагменты сразу показываются модератору.
+    Если поток оборвался или ответ некорректен — обычная генерация с повторами.
+    """
+    text = ""
+    try:
+        with llm_deadline():
+            async for chunk in stream_gpt_response(prompt):
+                text += chunk
+                await streamer.update(text)
+    except Exception as e:
+        logger.warning("Потоковая генерация прервана: %s", e)
+
+    text = text.strip()
+    if is_valid_response(text):
+        return text
+    logger.info("Потоковый ответ некорректен, повторяем генерацию без потока")
+    return await generate_post(prompt)
+
+
+async def revise_post_job(bot: Bot, message: types.Message, chat_id: int, post: Post):
+    """
+    Генерирует новый вариант поста, показывая черновик прямо в сообщении
+    модерации, и в конце заменяет его итоговым очищенным постом.
+    """
+    title = post.title or "Без названия"
+    streamer = DraftStreamer(
+        message, header=f"♻️ <b>Новый вариант:</b> {html.escape(title, quote=False)}\n\n"
+    )
+    await streamer.update("")
+    try:
+        prompt = generate_post_prompt(post.title, post.description)
+        new_text = await stream_post_draft(prompt, streamer)
+        post.generated_post = new_text or post.generated_post
+        post.status = STATUS_PENDING
+
+        # Применяем проверку тегов после регенерации
+        await ensure_post_has_only_allowed_tags(post)
+    except Exception as e:
+        logger.error("Ошибка при регенерации поста '%s': %s", title, e)
+        await edit_moderation_message(message, f"⚠️ Ошибка генерации поста: {e}")
+        return
+
+    position = await update_pending_post(
+        post.video_id,
+        {"generated_post": post.generated_post, "status": STATUS_PENDING},
+    )
+    if position is None:
+        # Пост успели удалить, пока шла генерация
+        await edit_moderation_message(message, f"Пост '{title}' уже удалён.")
+        return
+
+    # Итоговый вариант заменяет черновик вместе с кнопками модерации
+    index, total = position
+    finished = await streamer.finish(
+        build_post_caption(post, with_sources=True),
+        reply_markup=moderation_keyboard(index, total, post.video_id),
+    )
+    if not finished:
+        await show_post(bot, chat_id, index)
+
+
+# ------------------ Callback Handler -------------------
+def resolve_post_index(posts: List[Post], callback_data: ModerationAction) -> int | None:
+    """
+    Текущий индекс поста, на кнопку которого нажали: по videoId (пока кнопки
+    были на экране, посты могли удалить), по индексу — только для поста без videoId.
+    """
+    if callback_data.video_id:
+        for index, post in enumerate(posts):
+            if post.video_id == callback_data.video_id:
+                return index
+        return None
+    if callback_data.post_index < len(posts) and not posts[callback_data.post_index].video_id:
+        return callback_data.post_index
+    return None
+
+
+@router.callback_query(ModerationAction.filter())
+async def handle_callback(query: types.CallbackQuery, callback_data: ModerationAction):
+    """Обработка действий модератора"""
+    bot: Bot = query.bot
+    posts = await asyncio.to_thread(load_posts, PENDING_POSTS_JSON)
+
+    index = resolve_post_index(posts, callback_data)
+    chat_id = query.message.chat.id
+
+    if index is None:
+        await query.answer("Пост не найден ❌", show_alert=True)
+        return
+
+    post = posts[index]
+    mark(f"moderation.{callback_data.action}", post.video_id, chat_id=chat_id)
+
+    # Долгие действия (LLM, публикация) выполняются фоновыми задачами:
+    # отвечаем на callback сразу, а прогресс показываем в сообщении модерации
+    job_key = f"post:{post.video_id or index}"
+
+    # --- Одобрение ---
+    if callback_data.action == "approve":
+        if post.status == STATUS_UNAVAILABLE:
+            await query.answer(
+                "🚫 Видео удалено или скрыто на YouTube — публиковать нечего",
+                show_alert=True,
             )
-        except Exception:
-            # Если это было не фото (например, сообщение об ошибке), редактируем текст
-            await query.message.edit_text(
-                text=f"✅ Одобрено: '{post.get('title', 'Без названия')}'",
-                reply_markup=None,
+            return
+        if not job_runner.submit(
+            job_key, lambda: approve_post_job(query.message, chat_id, post)
+        ):
+            await query.answer(
+                "⏳ Пост уже обрабатывается или бот занят, попробуйте позже",
+                show_alert=True,
             )
-
+            return
+        await query.answer("✅ Пост одобрен, публикую...")
         await show_post(bot, chat_id, index + 1)
-
         return
 
     # --- Перегенерация ---
     elif callback_data.action == "revise":
-        await query.answer("♻️ Генерируется новый вариант...")
-        try:
-            prompt = generate_post_prompt(
-                post.get("title", ""), post.get("description", "")
+        if not job_runner.submit(
+            job_key, lambda: revise_post_job(bot, query.message, chat_id, post)
+        ):
+            await query.answer(
+                "⏳ Пост уже обрабатывается или бот занят, попробуйте позже",
+                show_alert=True,
             )
-            new_text = await generate_post(prompt)
-            post["generated_post"] = new_text or post.get("generated_post", "")
-            post["status"] = "pending"
-
-            # Применяем проверку тегов после регенерации
-            await ensure_post_has_only_allowed_tags(post)
-            await query.message.reply("Новый вариант сгенерирован и проверен.")
-        except Exception as e:
-            logger.error(f"Ошибка при регенерации поста '{post.get('title')}': {e}")
-            await bot.send_message(chat_id, f"⚠️ Ошибка генерации поста: {e}")
+            return
+        await query.answer("♻️ Генерируется новый вариант...")
+        return
 
     # --- Удаление ---
     elif callback_data.action == "delete":
         # Добавляем videoId в список удалённых, чтобы никогда не возвращаться к нему
-        vid = post.get("videoId")
+        vid = post.video_id
         if vid:
             try:
                 await add_deleted_video(vid)
             except Exception as e:
-                logger.error(f"Не удалось пометить видео {vid} как удалённое: {e}")
+                logger.error("Не удалось пометить видео %s как удалённое: %s", vid, e)
+
+        # Удаляем сам пост из списка (по videoId: список мог измениться)
+        def remove(current: List[Post]):
+            current[:] = [p for p in current if p.video_id != vid]
+            return current
 
-        # Удаляем сам пост из списка
         try:
-            posts.pop(index)
-            await asyncio.to_thread(save_json, PENDING_POSTS_JSON, posts)
+            if vid:
+                posts = await asyncio.to_thread(update_posts, remove, PENDING_POSTS_JSON)
+            else:
+                posts.pop(index)
+                await asyncio.to_thread(save_posts, posts, PENDING_POSTS_JSON)
             await query.answer("🗑 Пост удалён")
+            await forget_photo(vid)
         except Exception as e:
-            logger.error(f"Ошибка при удалении поста index={index}: {e}")
+            logger.error("Ошибка при удалении поста index=%s: %s", index, e)
             await query.answer("⚠️ Не удалось удалить пост", show_alert=True)
             return
 
@@ -280,8 +485,6 @@ async def handle_callback(query: types.CallbackQuery, callback_data: ModerationA
         await query.answer("⏭ Следующий пост")
         index += 1
 
-    # Сохраняем изменения (approve/revise/next)
-    await asyncio.to_thread(save_json, PENDING_POSTS_JSON, posts)
     # Показываем (возможно обновлённый) пост
     await show_post(bot, chat_id, index)
 
@@ -291,11 +494,9 @@ async def handle_callback(query: types.CallbackQuery, callback_data: ModerationA
 async def cmd_moderate(message: types.Message):
     """Запуск модерации"""
     bot: Bot = message.bot
-    posts = await asyncio.to_thread(load_json, PENDING_POSTS_JSON)
-    if not isinstance(posts, list):
-        posts = []
+    posts = await asyncio.to_thread(load_posts, PENDING_POSTS_JSON)
 
-    pending_indices = [i for i, p in enumerate(posts) if p.get("status") == "pending"]
+    pending_indices = [i for i, p in enumerate(posts) if p.status == STATUS_PENDING]
     if not pending_indices:
         await message.reply("Нет постов для модерации ✅")
         return
@@ -0,0 +1,75 @@
+import asyncio
+from typing import Awaitable, Callable, Dict
+
+from core.logger import logger
+from core.settings import get_config
+
+config = get_config()
+JOBS_MAX_CONCURRENT = int(getattr(config, "jobs_max_concurrent", 2))
+JOBS_MAX_PENDING = int(getattr(config, "jobs_max_pending", 20))
+
+
+class JobRunner:
+    """
+    Фоновые задачи для медленных действий модерации (регенерация, публикация).
+
+    - одна задача на ключ (например, "approve:<videoId>"): повторные клики
+      по той же кнопке не создают новую работу;
+    - одновременно выполняется не больше max_concurrent задач;
+    - всего (с ожидающими) не больше max_pending, остальные отклоняются.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = JOBS_MAX_CONCURRENT,
+        max_pending: int = JOBS_MAX_PENDING,
+    ):
+        self.max_pending = max_pending
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._jobs: Dict[str, asyncio.Task] = {}
+
+    def is_running(self, key: str) -> bool:
+        return key in self._jobs
+
+    def __len__(self) -> int:
+        return len(self._jobs)
+
+    def submit(self, key: str, job: Callable[[], Awaitable]) -> bool:
+        """
+        Запускает job() в фоне. Возвращает False, если задача с таким ключом
+        уже выполняется или очередь задач переполнена.
+        """
+        if key in self._jobs:
+            return False
+        if len(self._jobs) >= self.max_pending:
+            logger.warning("Очередь фоновых задач переполнена, задача %s отклонена", key)
+            return False
+
+        task = asyncio.create_task(self._run(key, job))
+        self._jobs[key] = task
+        return True
+
+    async def _run(self, key: str, job: Callable[[], Awaitable]):
+        try:
+            async with self._semaphore:
+                logger.info("▶️ Фоновая задача %s запущена", key)
+                await job()
+                logger.info("⏹ Фоновая задача %s завершена", key)
+        except asyncio.CancelledError:
+            logger.info("Фоновая задача %s отменена", key)
+            raise
+        except Exception as e:
+            logger.error("Ошибка фоновой задачи %s: %s", key, e, exc_info=True)
+        finally:
+            self._jobs.pop(key, None)
+
+    async def shutdown(self):
+        """Отменяет все задачи и ждёт их завершения."""
+        tasks = list(self._jobs.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+# Общий экземпляр на процесс
+job_runner = JobRunner()
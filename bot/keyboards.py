@@ -8,53 +8,58 @@ class ModerationAction(CallbackData, prefix="mod"):
     """
     CallbackData для кнопок модерации.
     action: "approve" | "revise" | "next" | "delete" | "finish"
-    post_index: индекс поста в pending_posts.json
+    post_index: индекс показанного поста в pending_posts.json на момент показа
+    video_id: videoId показанного поста — по нему пост ищется при нажатии:
+        пока кнопки на экране, посты могут удалить и индексы сдвинутся
     """
 
     action: str
     post_index: int
+    video_id: str = ""
 
 
-def moderation_keyboard(index: int, total_posts: int) -> InlineKeyboardMarkup:
+def moderation_keyboard(index: int, total_posts: int, video_id: str = "") -> InlineKeyboardMarkup:
     """
     Создает Inline-кнопки для модерации одного поста.
     :param index: индекс текущего поста (начиная с 0)
     :param total_posts: общее количество постов в очереди
+    :param video_id: videoId текущего поста
     :return: InlineKeyboardMarkup
     """
     builder = InlineKeyboardBuilder()
 
+    def action(name: str) -> str:
+        return ModerationAction(action=name, post_index=index, video_id=video_id).pack()
+
     builder.row(
         InlineKeyboardButton(
             text="✅ Одобрить",
-            callback_data=ModerationAction(action="approve", post_index=index).pack(),
+            callback_data=action("approve"),
         ),
         InlineKeyboardButton(
             text="🔄 Предложить варианты",
-            callback_data=ModerationAction(action="revise", post_index=index).pack(),
+            callback_data=action("revise"),
         ),
     )
 
     # --- Динамическая строка навигации ---
     if index < total_posts - 1:
-        # Если есть следующий пост, показываем "Следующий"
+        # Если есть следующий пост, показываем "Следующий" (сдвиг — в обработчике)
         next_button = InlineKeyboardButton(
             text="⏭ Следующий",
-            callback_data=ModerationAction(
-                action="next", post_index=index + 1
-            ).pack(),  # <--- Используем index + 1
+            callback_data=action("next"),
         )
     else:
         # Если это последний пост, показываем "Завершить" или "В начало"
         next_button = InlineKeyboardButton(
             text="🏁 Завершить модерацию",
-            callback_data=ModerationAction(action="finish", post_index=index).pack(),
+            callback_data=action("finish"),
         )
 
     builder.row(
         InlineKeyboardButton(
             text="🗑 Удалить",
-            callback_data=ModerationAction(action="delete", post_index=index).pack(),
+            callback_data=action("delete"),
         ),
         next_button,  # Используем динамическую кнопку
     )
@@ -0,0 +1,29 @@
+from aiogram import types
+from aiogram.types import FSInputFile
+
+from core.thumbnails import thumbnail_cache
+
+
+def post_photo(video_id: str, thumbnail_url: str):
+    """
+    Фото для send_photo: file_id от прошлой отправки, заранее скачанный
+    файл или (если превью ещё не загружено) ссылка на YouTube.
+    """
+    file_id = thumbnail_cache.get_file_id(video_id)
+    if file_id:
+        return file_id
+    path = thumbnail_cache.local_path(video_id)
+    if path:
+        return FSInputFile(path)
+    return thumbnail_url
+
+
+async def remember_photo(video_id: str, message: types.Message):
+    """Сохраняет file_id отправленного фото для повторного использования."""
+    if message and message.photo:
+        await thumbnail_cache.remember_file_id(video_id, message.photo[-1].file_id)
+
+
+async def forget_photo(video_id: str):
+    """Забывает превью поста, который больше не будет отправляться."""
+    await thumbnail_cache.forget(video_id)
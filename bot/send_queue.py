@@ -0,0 +1,320 @@
+import asyncio
+import json
+import time
+from typing import Collection, Dict, List, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter
+
+from bot.photos import forget_photo, post_photo
+from core.logger import logger
+from core.records import Post
+from core.metrics import PUBLISH_TOTAL, registry
+from core.tracing import span
+from core.rate_limit import TokenBucket
+from core.sqlite_utils import init_db, sqlite_transaction
+from core.settings import get_config
+
+config = get_config()
+SEND_QUEUE_DB = getattr(config, "send_queue_db", "data/send_queue.sqlite3")
+SEND_QUEUE_MAX_ATTEMPTS = int(getattr(config, "send_queue_max_attempts", 5))
+# Лимиты Telegram: ~30 сообщений/с на бота и ~20 сообщений/мин в одну группу/канал
+TELEGRAM_GLOBAL_RATE = float(getattr(config, "telegram_global_rate", 25))
+TELEGRAM_CHAT_RATE_PER_MINUTE = float(
+    getattr(config, "telegram_chat_rate_per_minute", 20)
+)
+
+SEND_BATCH_SIZE = 50
+IDLE_DELAY = 60  # как часто просыпаться, если очередь пуста
+
+PENDING = "pending"
+FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbound (
+    id              INTEGER PRIMARY KEY AUTOINCREMENT,
+    chat_id         TEXT NOT NULL,
+    payload         TEXT NOT NULL,
+    status          TEXT NOT NULL,
+    attempts        INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    last_error      TEXT,
+    created_at      REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS outbound_ready ON outbound (status, next_attempt_at, id);
+"""
+
+
+class SendQueue:
+    """
+    Очередь исходящих сообщений Telegram с сохранением в SQLite.
+
+    Обработчики ставят сообщение в очередь и сразу возвращаются, а фоновый
+    run() отправляет их с учётом общего лимита и лимита на чат, соблюдает
+    retry_after из ответа 429 и повторяет неудачные отправки.
+    """
+
+    def __init__(self, path: str = SEND_QUEUE_DB):
+        self.path = path
+        self._global_bucket = TokenBucket(TELEGRAM_GLOBAL_RATE, TELEGRAM_GLOBAL_RATE)
+        self._chat_buckets: Dict[str, TokenBucket] = {}
+        self._wakeup = asyncio.Event()
+        init_db(self.path, _SCHEMA)
+
+    # ----------- Producer -----------
+
+    async def enqueue_photo(
+        self,
+        chat_id,
+        post: Post,
+        caption: str,
+        report_chat_id=None,
+    ) -> int:
+        """Ставит публикацию поста (фото + подпись) в очередь. Возвращает глубину очереди."""
+        payload = {
+            "method": "photo",
+            "chat_id": chat_id,
+            "caption": caption,
+            "parse_mode": "HTML",
+            "post": {
+                "videoId": post.video_id,
+                "title": post.title,
+                "thumbnail_url": post.thumbnail_url,
+            },
+            "report_chat_id": report_chat_id,
+        }
+        return await self._enqueue(chat_id, payload)
+
+    async def enqueue_message(self, chat_id, text: str, parse_mode: str | None = None) -> int:
+        payload = {
+            "method": "message",
+            "chat_id": chat_id,
+            "text": text,
+            "parse_mode": parse_mode,
+        }
+        return await self._enqueue(chat_id, payload)
+
+    async def _enqueue(self, chat_id, payload: Dict) -> int:
+        depth = await asyncio.to_thread(self._insert, str(chat_id), payload)
+        self._wakeup.set()
+        logger.info(
+            "📤 Сообщение для %s в очереди отправки (всего: %s)", chat_id, depth,
+            extra={"chat_id": chat_id},
+        )
+        return depth
+
+    # ----------- Storage -----------
+
+    def _insert(self, chat_id: str, payload: Dict) -> int:
+        now = time.time()
+        with sqlite_transaction(self.path) as db:
+            db.execute(
+                "INSERT INTO outbound (chat_id, payload, status, next_attempt_at, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (chat_id, json.dumps(payload, ensure_ascii=False), PENDING, now, now),
+            )
+            return db.execute(
+                "SELECT COUNT(*) FROM outbound WHERE status = ?", (PENDING,)
+            ).fetchone()[0]
+
+    def _due(self, limit: int, exclude: Collection[str] = ()) -> List[Tuple[int, str, Dict]]:
+        """
+        Самое старое готовое сообщение каждого чата, кроме чатов из exclude.
+        За проход в чат всё равно уходит не больше одного сообщения (bucket на
+        1 токен), поэтому очередь одного чата не вытесняет из пачки остальные.
+        """
+        skip = f"AND chat_id NOT IN ({','.join('?' * len(exclude))}) " if exclude else ""
+        with sqlite_transaction(self.path) as db:
+            rows = db.execute(
+                "SELECT o.id, o.chat_id, o.payload FROM outbound AS o JOIN ("
+                "  SELECT MIN(id) AS id FROM outbound"
+                f"  WHERE status = ? AND next_attempt_at <= ? {skip}GROUP BY chat_id"
+                ") AS head ON o.id = head.id ORDER BY o.id LIMIT ?",
+                (PENDING, time.time(), *exclude, limit),
+            ).fetchall()
+        return [(row_id, chat_id, json.loads(payload)) for row_id, chat_id, payload in rows]
+
+    def _next_delay(self, exclude: Collection[str] = ()) -> float:
+        skip = f" AND chat_id NOT IN ({','.join('?' * len(exclude))})" if exclude else ""
+        with sqlite_transaction(self.path) as db:
+            row = db.execute(
+                f"SELECT MIN(next_attempt_at) FROM outbound WHERE status = ?{skip}",
+                (PENDING, *exclude),
+            ).fetchone()
+        if row[0] is None:
+            return IDLE_DELAY
+        return min(IDLE_DELAY, max(0.0, row[0] - time.time()))
+
+    def _delete(self, row_id: int):
+        with sqlite_transaction(self.path) as db:
+            db.execute("DELETE FROM outbound WHERE id = ?", (row_id,))
+
+    def _postpone_chat(self, chat_id: str, seconds: float):
+        """Откладывает все сообщения чата (после 429), сохраняя их порядок."""
+        with sqlite_transaction(self.path) as db:
+            db.execute(
+                "UPDATE outbound SET next_attempt_at = MAX(next_attempt_at, ?) "
+                "WHERE chat_id = ? AND status = ?",
+                (time.time() + seconds, chat_id, PENDING),
+            )
+
+    def _fail(self, row_id: int, error: str) -> bool:
+        """Учитывает неудачную попытку. True — попытки исчерпаны."""
+        with sqlite_transaction(self.path) as db:
+            attempts = db.execute(
+                "SELECT attempts FROM outbound WHERE id = ?", (row_id,)
+            ).fetchone()[0] + 1
+            final = attempts >= SEND_QUEUE_MAX_ATTEMPTS
+            db.execute(
+                "UPDATE outbound SET attempts = ?, status = ?, next_attempt_at = ?, "
+                "last_error = ? WHERE id = ?",
+                (
+                    attempts,
+                    FAILED if final else PENDING,
+                    time.time() + min(600, 5 * 2 ** attempts),
+                    error[:1000],
+                    row_id,
+                ),
+            )
+        return final
+
+    def depth(self) -> int:
+        """Сколько сообщений ожидает отправки."""
+        with sqlite_transaction(self.path) as db:
+            return db.execute(
+                "SELECT COUNT(*) FROM outbound WHERE status = ?", (PENDING,)
+            ).fetchone()[0]
+
+    def status_counts(self) -> Dict[str, int]:
+        """Число сообщений по статусам (для метрик)."""
+        with sqlite_transaction(self.path) as db:
+            rows = db.execute("SELECT status, COUNT(*) FROM outbound GROUP BY status")
+            return {status: count for status, count in rows}
+
+    # ----------- Consumer -----------
+
+    def _chat_bucket(self, chat_id: str) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            rate = TELEGRAM_CHAT_RATE_PER_MINUTE / 60.0
+            bucket = self._chat_buckets[chat_id] = TokenBucket(rate, 1)
+        return bucket
+
+    async def run(self, bot: Bot):
+        """Фоновый цикл отправки."""
+        depth = await asyncio.to_thread(self.depth)
+        logger.info("📮 Очередь отправки запущена (в очереди: %s)", depth)
+        while True:
+            self._wakeup.clear()
+            try:
+                delay = await self._drain(bot)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Ошибка в очереди отправки: %s", e, exc_info=True)
+                delay = 5
+            if delay <= 0:
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _drain(self, bot: Bot) -> float:
+        """Отправляет готовые сообщения. Возвращает, сколько ждать до следующего прохода."""
+        # Чаты, исчерпавшие лимит или на паузе после 429, в выборку не попадают
+        waits = {
+            chat_id: wait
+            for chat_id, bucket in self._chat_buckets.items()
+            if (wait := bucket.wait_time()) > 0
+        }
+        blocked = tuple(waits)
+        items = await asyncio.to_thread(self._due, SEND_BATCH_SIZE, blocked)
+        if not items:
+            next_delay = await asyncio.to_thread(self._next_delay, blocked)
+            return min([next_delay, *waits.values()])
+
+        sent = False
+        next_delay = float(IDLE_DELAY)
+        for row_id, chat_id, payload in items:
+            bucket = self._chat_bucket(chat_id)
+            if not bucket.try_acquire():
+                next_delay = min(next_delay, bucket.wait_time())
+                continue
+            await self._global_bucket.acquire()
+            sent = await self._send(bot, row_id, chat_id, payload) or sent
+        return 0 if sent else next_delay
+
+    async def _send(self, bot: Bot, row_id: int, chat_id: str, payload: Dict) -> bool:
+        video_id = payload.get("post", {}).get("videoId")
+        try:
+            with span(f"publish.send_{payload['method']}", video_id=video_id, chat_id=chat_id):
+                if payload["method"] == "photo":
+                    await bot.send_photo(
+                        chat_id=payload["chat_id"],
+                        photo=post_photo(video_id, payload["post"].get("thumbnail_url", "")),
+                        caption=payload["caption"],
+                        parse_mode=payload.get("parse_mode"),
+                    )
+                else:
+                    await bot.send_message(
+                        chat_id=payload["chat_id"],
+                        text=payload["text"],
+                        parse_mode=payload.get("parse_mode"),
+                    )
+        except TelegramRetryAfter as e:
+            logger.warning(
+                "Flood control для %s: повтор через %s с", chat_id, e.retry_after,
+                extra={"chat_id": chat_id},
+            )
+            PUBLISH_TOTAL.inc(method=payload["method"], result="retry_after")
+            self._chat_bucket(chat_id).pause(e.retry_after)
+            await asyncio.to_thread(self._postpone_chat, chat_id, e.retry_after)
+            return False
+        except Exception as e:
+            final = await asyncio.to_thread(self._fail, row_id, str(e))
+            PUBLISH_TOTAL.inc(method=payload["method"], result="failed" if final else "error")
+            title = payload.get("post", {}).get("title", "")
+            logger.error(
+                "Ошибка отправки '%s' в %s: %s", title, chat_id, e,
+                extra={"chat_id": chat_id, "video_id": video_id},
+            )
+            if final:
+                await self._report_failure(payload, e)
+            return False
+
+        await asyncio.to_thread(self._delete, row_id)
+        PUBLISH_TOTAL.inc(method=payload["method"], result="ok")
+        if payload["method"] == "photo":
+            # Пост опубликован — превью и file_id больше не понадобятся
+            await forget_photo(video_id)
+            logger.info(
+                "Пост '%s' опубликован в %s",
+                payload["post"].get("title"),
+                payload["chat_id"],
+                extra={"chat_id": chat_id, "video_id": payload["post"].get("videoId")},
+            )
+        return True
+
+    async def _report_failure(self, payload: Dict, error: Exception):
+        report_chat_id = payload.get("report_chat_id")
+        if not report_chat_id:
+            return
+        title = payload.get("post", {}).get("title", "")
+        await self.enqueue_message(
+            report_chat_id, f"⚠️ Ошибка публикации '{title}': {error}"
+        )
+
+
+# Общий экземпляр на процесс
+send_queue = SendQueue()
+
+registry.gauge(
+    "send_queue_messages",
+    "Сообщения в очереди отправки по статусам",
+    labels=("status",),
+    collect=lambda: {
+        (status,): count
+        for status, count in {PENDING: 0, FAILED: 0, **send_queue.status_counts()}.items()
+    },
+)
@@ -0,0 +1,78 @@
+import asyncio
+import time
+
+from aiogram import types
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+
+from core.logger import logger
+from core.tag_validator import CAPTION_LIMIT, MESSAGE_LIMIT, sanitize_html, visible_length
+from core.settings import get_config
+
+config = get_config()
+# Telegram ограничивает частоту правок сообщений, поэтому черновик обновляем не чаще
+STREAM_EDIT_INTERVAL = float(getattr(config, "stream_edit_interval", 1.5))
+
+CURSOR = " ▌"
+
+
+class DraftStreamer:
+    """
+    Показывает черновик, который генерирует LLM, прямо в сообщении модерации.
+
+    update() вызывается на каждый полученный фрагмент, но правит сообщение
+    не чаще STREAM_EDIT_INTERVAL и только если текст изменился. Частичный
+    HTML прогоняется через sanitize_html, поэтому каждая правка — корректная
+    разметка в пределах лимита подписи/сообщения.
+    """
+
+    def __init__(self, message: types.Message, header: str = ""):
+        self.message = message
+        self.header = header
+        self.limit = CAPTION_LIMIT if message.photo else MESSAGE_LIMIT
+        self._last_edit = 0.0
+        self._last_text = None
+        self._blocked_until = 0.0
+
+    async def update(self, text: str):
+        """Троттлинг-правка черновика по мере поступления токенов."""
+        now = time.monotonic()
+        if now - self._last_edit < STREAM_EDIT_INTERVAL or now < self._blocked_until:
+            return
+        budget = self.limit - visible_length(self.header) - len(CURSOR)
+        draft = sanitize_html(text, max_length=max(budget, 1))
+        await self._edit(f"{self.header}{draft}{CURSOR}")
+
+    async def _edit(self, rendered: str, reply_markup=None) -> bool:
+        if rendered == self._last_text and reply_markup is None:
+            return True
+
+        self._last_edit = time.monotonic()
+        try:
+            if self.message.photo:
+                await self.message.edit_caption(
+                    caption=rendered, parse_mode="HTML", reply_markup=reply_markup
+                )
+            else:
+                await self.message.edit_text(
+                    text=rendered, parse_mode="HTML", reply_markup=reply_markup
+                )
+        except TelegramRetryAfter as e:
+            self._blocked_until = time.monotonic() + e.retry_after
+            logger.debug("Правка черновика отложена на %s с", e.retry_after)
+            return False
+        except TelegramBadRequest as e:
+            # "message is not modified" и подобное — черновик просто не обновился
+            logger.debug("Не удалось обновить черновик: %s", e)
+            return False
+        self._last_text = rendered
+        return True
+
+    async def finish(self, rendered: str, reply_markup=None) -> bool:
+        """
+        Заменяет черновик итоговым текстом (готовый HTML в пределах лимита).
+        Возвращает False, если сообщение обновить не удалось.
+        """
+        wait = self._blocked_until - time.monotonic()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return await self._edit(rendered, reply_markup=reply_markup)
@@ -1,15 +1,58 @@
 # core/llm/chatgpt.py
 import asyncio
 import re
-from g4f.client import Client
-import g4f
+import threading
+from functools import lru_cache
+from typing import TYPE_CHECKING, AsyncIterator, Callable, Iterator
 from core.logger import logger
+from core.llm.retry import (
+    REQUEST_POLICY,
+    call_with_retry,
+    provider_limiter,
+    time_left,
+    within_deadline,
+)
+from core.tracing import span
+from core.settings import get_config
 
-FALLBACK_PROVIDERS = [
-    (g4f.models.gpt_4_1_mini, g4f.Provider.OIVSCodeSer0501),
-    (g4f.models.gemini_2_5_pro, g4f.Provider.OIVSCodeSer0501),
-    (g4f.models.gemini_2_5_flash, g4f.Provider.OIVSCodeSer0501),
-]
+# g4f тяжёлый — импортируем при первом запросе к LLM, а не при старте
+if TYPE_CHECKING:
+    from g4f.client import Client
+
+
+config = get_config()
+# Сколько ждать очередной фрагмент потокового ответа, прежде чем бросить поток (сек)
+LLM_STREAM_CHUNK_TIMEOUT = float(getattr(config, "llm_stream_chunk_timeout", 30))
+
+
+# Подмена провайдера LLM (нагрузочная симуляция): backend(prompt) -> фрагменты ответа.
+# Вызывается в рабочем потоке, как и синхронный поток g4f.
+_backend: Callable[[str], Iterator[str]] | None = None
+
+
+def set_llm_backend(backend: Callable[[str], Iterator[str]] | None):
+    """Направляет все запросы к LLM в backend вместо g4f (None — вернуть g4f)."""
+    global _backend
+    _backend = backend
+
+
+@lru_cache(maxsize=None)
+def fallback_providers():
+    import g4f
+
+    return [
+        (g4f.models.gpt_4_1_mini, g4f.Provider.OIVSCodeSer0501),
+        (g4f.models.gemini_2_5_pro, g4f.Provider.OIVSCodeSer0501),
+        (g4f.models.gemini_2_5_flash, g4f.Provider.OIVSCodeSer0501),
+    ]
+
+
+def _new_client() -> "Client":
+    if _backend is not None:
+        return None
+    from g4f.client import Client
+
+    return Client()
 
 
 def is_russian_text(text: str) -> bool:
@@ -17,47 +60,116 @@ def is_russian_text(text: str) -> bool:
     return not re.search(r"[\u4e00-\u9fff]", text)
 
 
-async def get_gpt_response(client: Client, prompt: str) -> str:
+def _iter_chunks(client: "Client", prompt: str, model, provider) -> Iterator[str]:
+    """Синхронный потоковый запрос к g4f: отдаёт фрагменты ответа по мере получения."""
+    if _backend is not None:
+        yield from _backend(prompt)
+        return
+    response = client.chat.completions.create(
+        model=model,
+        provider=provider,
+        messages=[{"role": "user", "content": prompt}],
+        stream=True,
+    )
+    for message in response:
+        if message.choices and message.choices[0].delta:
+            content = message.choices[0].delta.content
+            if content:
+                yield content
+
+
+def _complete(client: "Client", prompt: str, model, provider) -> str:
+    """Синхронный потоковый запрос к g4f; собирает ответ целиком."""
+    with span("llm.attempt", provider=_provider_name(provider)) as attrs:
+        text = "".join(_iter_chunks(client, prompt, model, provider)).strip()
+        attrs["chars"] = len(text)
+    return text
+
+
+def _default_model():
+    if _backend is not None:
+        return None, _backend
+    return fallback_providers()[0]
+
+
+def _provider_name(provider) -> str:
+    return getattr(provider, "__name__", str(provider))
+
+
+def is_valid_response(text: str) -> bool:
+    """Непустой ответ без китайских иероглифов."""
+    return bool(text) and is_russian_text(text)
+
+
+async def get_gpt_response(client: "Client", prompt: str) -> str:
     """
     Асинхронно отправляет текст в GPT и проверяет, содержит ли он только русские буквы.
-    Делает до 20 попыток.
+    Повторы, задержки и лимит запросов — по общей политике из core.llm.retry.
     """
-    max_attempts = 20
-    for attempt in range(1, max_attempts + 1):
-        try:
-            logger.info(f"Запрос к GPT, попытка {attempt}...")
-            response = client.chat.completions.create(
-                model=g4f.models.gpt_4_1_mini,
-                provider=g4f.Provider.OIVSCodeSer0501,
-                messages=[{"role": "user", "content": prompt}],
-                stream=True,
-            )
-
-            result_text = ""
-            for message in response:
-                if message.choices and message.choices[0].delta:
-                    content = message.choices[0].delta.content
-                    if content:
-                        result_text += content
-
-            result_text = result_text.strip()
-            if is_russian_text(result_text):
-                logger.info("Ответ GPT содержит только русские буквы.")
-                return result_text
-            else:
-                logger.warning(
-                    "Ответ GPT содержит нерусские символы, повторяем запрос..."
-                )
-                await asyncio.sleep(5)
+    model, provider = _default_model()
+    with span("llm.request", provider=_provider_name(provider)) as attrs:
+        result = await call_with_retry(
+            lambda: asyncio.to_thread(_complete, client, prompt, model, provider),
+            policy=REQUEST_POLICY,
+            is_valid=is_valid_response,
+            provider=_provider_name(provider),
+            description="Запрос к GPT",
+        )
+        attrs["ok"] = result is not None
+    if result is None:
+        logger.error("Не удалось получить корректный ответ от GPT.")
+        return ""
+    return result
 
-        except Exception as e:
-            logger.error(f"Ошибка при запросе к GPT: {e}")
-            await asyncio.sleep(5)
 
-    logger.error(
-        "Не удалось получить корректный ответ от GPT после нескольких попыток."
-    )
-    return ""
+async def stream_gpt_response(prompt: str) -> AsyncIterator[str]:
+    """
+    Одна попытка потокового запроса: отдаёт фрагменты ответа по мере их
+    поступления от провайдера. Синхронный поток g4f читается в отдельном
+    потоке, чтобы не блокировать event loop. Каждый фрагмент ждём не дольше
+    LLM_STREAM_CHUNK_TIMEOUT и дедлайна (TimeoutError). Повторов нет — при
+    ошибке или некорректном ответе вызывающий код переходит на generate_post().
+    """
+    model, provider = _default_model()
+    with span("llm.stream_wait", provider=_provider_name(provider)):
+        await within_deadline(provider_limiter(_provider_name(provider)).acquire())
+
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    stop = threading.Event()
+    finished = object()
+
+    def reader():
+        try:
+            for chunk in _iter_chunks(_new_client(), prompt, model, provider):
+                if stop.is_set():
+                    break
+                loop.call_soon_threadsafe(queue.put_nowait, chunk)
+        except Exception as e:
+            loop.call_soon_threadsafe(queue.put_nowait, e)
+        finally:
+            loop.call_soon_threadsafe(queue.put_nowait, finished)
+
+    loop.run_in_executor(None, reader)
+    try:
+        while True:
+            # Зависший провайдер не должен держать задачу модерации вечно
+            timeout = LLM_STREAM_CHUNK_TIMEOUT
+            left = time_left()
+            if left is not None:
+                timeout = min(timeout, max(0.0, left))
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                raise TimeoutError(f"нет данных от провайдера {timeout:.1f} с") from None
+            if item is finished:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        # Потребитель мог прерваться раньше — просим поток остановиться
+        stop.set()
 
 
 async def generate_text_with_gpt(prompt: str) -> str:
@@ -69,7 +181,7 @@ async def generate_text_with_gpt(prompt: str) -> str:
         logger.warning("Передан пустой текст для генерации GPT.")
         return ""
 
-    client = Client()
+    client = _new_client()
     words = prompt.split()
     chunks = [" ".join(words[i : i + 1000]) for i in range(0, len(words), 1000)]
 
@@ -79,27 +191,26 @@ async def generate_text_with_gpt(prompt: str) -> str:
     return "\n".join(filter(None, results)).strip()
 
 
-async def generate_post(prompt: str, retries: int = 3) -> str:
-    """Генерация Telegram-поста через g4f с повторными попытками"""
-    for attempt in range(1, retries + 1):
-        try:
-            response = await generate_text_with_gpt(prompt)
-            if response:
-                return response
-        except Exception as e:
-            logger.error(f"Ошибка генерации поста (попытка {attempt}): {e}")
-        await asyncio.sleep(2)
-    return "Ошибка генерации поста."
-
-
-async def generate_genre(prompt: str, retries: int = 3) -> str:
-    """Определение жанра фильма через g4f с повторными попытками"""
-    for attempt in range(1, retries + 1):
-        try:
-            genre = await generate_text_with_gpt(prompt)
-            if genre:
-                return genre.strip()
-        except Exception as e:
-            logger.error(f"Ошибка определения жанра (попытка {attempt}): {e}")
-        await asyncio.sleep(1)
-    return "Unknown"
+async def generate_post(prompt: str) -> str | None:
+    """
+    Генерация Telegram-поста через g4f (повторы — внутри get_gpt_response).
+    None, если провайдер не ответил: заглушка вместо текста ушла бы на модерацию.
+    """
+    try:
+        response = await generate_text_with_gpt(prompt)
+        if response:
+            return response
+    except Exception as e:
+        logger.error("Ошибка генерации поста: %s", e)
+    return None
+
+
+async def generate_genre(prompt: str) -> str | None:
+    """Определение жанра фильма через g4f; None, если провайдер не ответил."""
+    try:
+        genre = await generate_text_with_gpt(prompt)
+        if genre and genre.strip():
+            return genre.strip()
+    except Exception as e:
+        logger.error("Ошибка определения жанра: %s", e)
+    return None
@@ -0,0 +1,179 @@
+# core/llm/retry.py
+"""
+Единая политика повторов для обращений к LLM.
+
+- экспоненциальная задержка с полным джиттером (не бьём упавший провайдер синхронно);
+- общий дедлайн на обработку одного видео (contextvar, действует на все вложенные вызовы);
+- общий на процесс token bucket для каждого провайдера.
+"""
+import asyncio
+import contextvars
+import random
+import time
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Optional
+
+from core.logger import logger
+from core.metrics import LLM_ATTEMPTS, LLM_REQUEST_SECONDS
+from core.rate_limit import get_bucket
+from core.settings import get_config
+
+config = get_config()
+LLM_MAX_ATTEMPTS = int(getattr(config, "max_retries", 3))
+LLM_BACKOFF_BASE = float(getattr(config, "llm_backoff_base", 2.0))
+LLM_BACKOFF_MAX = float(getattr(config, "llm_backoff_max", 60.0))
+LLM_REGEN_ATTEMPTS = int(getattr(config, "llm_regen_attempts", 3))
+LLM_VIDEO_DEADLINE = float(getattr(config, "llm_video_deadline", 300))
+LLM_RATE_PER_MINUTE = float(getattr(config, "llm_rate_per_minute", 20))
+LLM_BURST = float(getattr(config, "llm_burst", 3))
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar(
+    "llm_deadline", default=None
+)
+
+
+class RetryPolicy:
+    """Параметры повторов: число попыток и экспоненциальная задержка с джиттером."""
+
+    def __init__(
+        self,
+        max_attempts: int = LLM_MAX_ATTEMPTS,
+        base_delay: float = LLM_BACKOFF_BASE,
+        max_delay: float = LLM_BACKOFF_MAX,
+        multiplier: float = 2.0,
+    ):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+
+    def backoff(self, attempt: int) -> float:
+        """Задержка после неудачной попытки attempt (full jitter)."""
+        ceiling = min(self.max_delay, self.base_delay * self.multiplier ** (attempt - 1))
+        return random.uniform(0, ceiling)
+
+
+# Повторы одного запроса к провайдеру (ошибки сети, иероглифы в ответе)
+REQUEST_POLICY = RetryPolicy()
+# Перегенерация, пока в ответе есть запрещённые теги
+REGEN_POLICY = RetryPolicy(max_attempts=LLM_REGEN_ATTEMPTS, base_delay=1.0)
+
+
+@contextmanager
+def llm_deadline(seconds: float = LLM_VIDEO_DEADLINE):
+    """
+    Общий дедлайн на все LLM-вызовы внутри блока.
+    Вложенный дедлайн не может продлить внешний.
+    """
+    deadline = time.monotonic() + seconds
+    outer = _deadline.get()
+    if outer is not None:
+        deadline = min(deadline, outer)
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def time_left() -> Optional[float]:
+    """Сколько секунд осталось до дедлайна (None — дедлайна нет)."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def within_deadline(awaitable: Awaitable) -> Awaitable:
+    """Ограничивает ожидание оставшимся до дедлайна временем (если дедлайн задан)."""
+    left = time_left()
+    if left is None:
+        return awaitable
+    return asyncio.wait_for(awaitable, max(0.0, left))
+
+
+def provider_limiter(provider: str):
+    """Общий на процесс token bucket для провайдера."""
+    return get_bucket(f"llm:{provider}", LLM_RATE_PER_MINUTE / 60.0, LLM_BURST)
+
+
+async def call_with_retry(
+    func: Callable[[], Awaitable],
+    policy: RetryPolicy = REQUEST_POLICY,
+    is_valid: Callable[[object], bool] | None = None,
+    provider: str | None = None,
+    description: str = "LLM",
+):
+    """
+    Вызывает func() до policy.max_attempts раз.
+
+    Попытка успешна, если не было исключения и is_valid(result) (если задан).
+    Перед каждой попыткой берётся токен лимитера провайдера. Ожидание токена и
+    сама попытка ограничены дедлайном: зависший провайдер не держит видео
+    дольше него, такая попытка считается неудачной.
+    Возвращает результат или None, если попытки или время кончились.
+    Длительность каждой попытки и число попыток на вызов попадают в метрики.
+    """
+    label = provider or description
+    for attempt in range(1, policy.max_attempts + 1):
+        left = time_left()
+        if left is not None and left <= 0:
+            logger.warning("%s: дедлайн истёк, попытка %s отменена", description, attempt)
+            LLM_ATTEMPTS.observe(attempt - 1, provider=label, outcome="deadline")
+            return None
+
+        started = time.perf_counter()
+        try:
+            if provider:
+                await within_deadline(provider_limiter(provider).acquire())
+                started = time.perf_counter()
+            result = await within_deadline(func())
+            if is_valid is None or is_valid(result):
+                LLM_REQUEST_SECONDS.observe(
+                    time.perf_counter() - started, provider=label, outcome="ok"
+                )
+                LLM_ATTEMPTS.observe(attempt, provider=label, outcome="ok")
+                return result
+            LLM_REQUEST_SECONDS.observe(
+                time.perf_counter() - started, provider=label, outcome="invalid"
+            )
+            logger.warning(
+                "%s: некорректный ответ (попытка %s/%s)",
+                description,
+                attempt,
+                policy.max_attempts,
+            )
+        except asyncio.TimeoutError:
+            LLM_REQUEST_SECONDS.observe(
+                time.perf_counter() - started, provider=label, outcome="timeout"
+            )
+            logger.warning(
+                "%s: попытка %d/%d прервана по дедлайну",
+                description,
+                attempt,
+                policy.max_attempts,
+            )
+        except Exception as e:
+            LLM_REQUEST_SECONDS.observe(
+                time.perf_counter() - started, provider=label, outcome="error"
+            )
+            logger.error(
+                "%s: ошибка (попытка %s/%s): %s",
+                description,
+                attempt,
+                policy.max_attempts,
+                e,
+            )
+
+        if attempt == policy.max_attempts:
+            break
+
+        delay = policy.backoff(attempt)
+        left = time_left()
+        if left is not None and left <= delay:
+            logger.warning("%s: не хватает времени до дедлайна на повтор", description)
+            LLM_ATTEMPTS.observe(attempt, provider=label, outcome="deadline")
+            return None
+        await asyncio.sleep(delay)
+
+    logger.error("%s: попытки исчерпаны (%s)", description, policy.max_attempts)
+    LLM_ATTEMPTS.observe(policy.max_attempts, provider=label, outcome="exhausted")
+    return None
@@ -1,18 +1,120 @@
+import atexit
+import json
 import logging
 import os
-from config import Config
+import queue
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from core.settings import get_config
+
+
+class RotatingLogFileHandler(RotatingFileHandler):
+    """
+    Ротация по размеру (max_bytes) и по времени (rotate_seconds) — что
+    наступит раньше. Хранится backup_count старых файлов: .1, .2, ...
+    """
+
+    def __init__(
+        self, filename: str, max_bytes: int, backup_count: int, rotate_seconds: float
+    ):
+        super().__init__(
+            filename,
+            maxBytes=max_bytes,
+            backupCount=backup_count,
+            encoding="utf-8",
+            delay=True,
+        )
+        self.rotate_seconds = rotate_seconds
+        self._rollover_at = time.time() + rotate_seconds
+
+    def shouldRollover(self, record) -> bool:
+        if self.rotate_seconds and time.time() >= self._rollover_at:
+            # Пустой файл по времени не ротируем
+            if os.path.exists(self.baseFilename) and os.path.getsize(self.baseFilename):
+                return True
+            self._rollover_at = time.time() + self.rotate_seconds
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        super().doRollover()
+        self._rollover_at = time.time() + self.rotate_seconds
+
+    def switch_file(self, filename: str):
+        """Переключает запись на другой файл (следующая запись откроет его)."""
+        self.acquire()
+        try:
+            if self.stream:
+                self.stream.close()
+                self.stream = None
+            self.baseFilename = os.path.abspath(filename)
+            self._rollover_at = time.time() + self.rotate_seconds
+        finally:
+            self.release()
+
+
+def log_file_for(log_file: str, role: str) -> str:
+    """
+    Файл лога процесса с этой ролью: у каждой роли свой файл
+    (release_tracker.bot.log), потому что ротация одного файла несколькими
+    процессами перезаписывает чужие записи. Роль all пишет в LOG_FILE.
+    """
+    if not role or role == "all":
+        return log_file
+    base, ext = os.path.splitext(log_file)
+    return f"{base}.{role}{ext or '.log'}"
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """Одна JSON-запись на строку; video_id/channel_id берутся из extra."""
+
+    EXTRA_FIELDS = ("video_id", "channel_id", "chat_id")
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for field in self.EXTRA_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """
+    Кладёт запись в очередь как есть: подстановка %-аргументов, форматирование
+    и запись на диск выполняются в потоке QueueListener, а не в event loop.
+    (Аргументы логирования не должны изменяться после вызова logger.*.)
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
 
 
 class Logger:
     """
     Класс-обертка для логирования в проекте Release Tracker.
     Поддерживает единое форматирование, вывод в файл и консоль.
+
+    Вызовы logger.* только кладут запись в очередь; файл и консоль
+    обслуживает фоновый QueueListener.
     """
 
     # Параметры из конфигурации
-    config = Config()
+    config = get_config()
     LOG_FILE = config.log_file
+    # Роль процесса (main.py --role) уточняется в set_role()
+    APP_ROLE = getattr(config, "app_role", "all")
     LOG_LEVEL = config.log_level.upper()
+    LOG_FORMAT = getattr(config, "log_format", "text").lower()  # text | json
+    LOG_MAX_BYTES = int(getattr(config, "log_max_bytes", 10 * 1024 * 1024))
+    LOG_BACKUP_COUNT = int(getattr(config, "log_backup_count", 5))
+    LOG_ROTATE_HOURS = float(getattr(config, "log_rotate_hours", 24))
 
     _instance = None  # Singleton
 
@@ -28,8 +130,10 @@ class Logger:
             return
         self._initialized = True
 
+        log_file = log_file_for(self.LOG_FILE, self.APP_ROLE)
+
         # Проверяем, что папка для логов существует
-        log_dir = os.path.dirname(self.LOG_FILE)
+        log_dir = os.path.dirname(log_file)
         if log_dir and not os.path.exists(log_dir):
             os.makedirs(log_dir, exist_ok=True)
 
@@ -39,18 +143,33 @@ class Logger:
             datefmt="%Y-%m-%d %H:%M:%S"
         )
 
-        # Настройка обработчиков
-        file_handler = logging.FileHandler(self.LOG_FILE, encoding="utf-8")
-        file_handler.setFormatter(formatter)
+        # Настройка обработчиков (работают в потоке QueueListener)
+        file_handler = RotatingLogFileHandler(
+            log_file,
+            max_bytes=self.LOG_MAX_BYTES,
+            backup_count=self.LOG_BACKUP_COUNT,
+            rotate_seconds=self.LOG_ROTATE_HOURS * 3600,
+        )
+        file_handler.setFormatter(
+            JsonLinesFormatter() if self.LOG_FORMAT == "json" else formatter
+        )
+        self.file_handler = file_handler
 
         stream_handler = logging.StreamHandler()
         stream_handler.setFormatter(formatter)
 
+        log_queue = queue.SimpleQueue()
+        self.listener = QueueListener(
+            log_queue, file_handler, stream_handler, respect_handler_level=True
+        )
+        self.listener.start()
+        self._listening = True
+        atexit.register(self.shutdown)
+
         # Настройка корневого логгера
         self.logger = logging.getLogger("ReleaseTracker")
         self.logger.setLevel(getattr(logging, self.LOG_LEVEL, logging.INFO))
-        self.logger.addHandler(file_handler)
-        self.logger.addHandler(stream_handler)
+        self.logger.addHandler(_DeferredQueueHandler(log_queue))
         self.logger.propagate = False  # не дублировать логи
 
         self.logger.info("Логгер инициализирован ✅")
@@ -66,7 +185,20 @@ class Logger:
         Позволяет динамически менять уровень логирования.
         """
         self.logger.setLevel(getattr(logging, level.upper(), logging.INFO))
-        self.logger.info(f"Уровень логирования изменен на {level.upper()}")
+        self.logger.info("Уровень логирования изменен на %s", level.upper())
+
+    def set_role(self, role: str):
+        """Роль из командной строки: дальше пишем в файл этой роли."""
+        log_file = log_file_for(self.LOG_FILE, role)
+        if os.path.abspath(log_file) != self.file_handler.baseFilename:
+            self.file_handler.switch_file(log_file)
+            self.logger.info("Лог процесса с ролью %s: %s", role, log_file)
+
+    def shutdown(self):
+        """Дописывает оставшиеся в очереди записи (при завершении процесса)."""
+        if self._listening:
+            self._listening = False
+            self.listener.stop()
 
 
 # Экземпляр Singleton
@@ -0,0 +1,156 @@
+# core/loop_watchdog.py
+"""
+Сторож event loop: замеряет задержку цикла событий и ловит блокирующие вызовы.
+
+- корутина-пульс просыпается каждые LOOP_WATCHDOG_INTERVAL секунд и считает,
+  насколько позже запланированного она проснулась (lag); значения идут в
+  гистограмму и в процентили p50/p90/p99 за последние ~10 минут (/metrics);
+- отдельный поток проверяет, давно ли был пульс; если дольше
+  LOOP_LAG_THRESHOLD_MS — loop чем-то заблокирован, и поток снимает стек
+  потока event loop через sys._current_frames(). Первый стек пишется в лог
+  сразу, а после разблокировки — длительность и самый частый стек.
+"""
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, deque
+
+from core.logger import logger
+from core.metrics import registry
+from core.settings import get_config
+
+config = get_config()
+LOOP_WATCHDOG_ENABLED = getattr(config, "loop_watchdog_enabled", True)
+LOOP_WATCHDOG_INTERVAL = float(getattr(config, "loop_watchdog_interval", 0.5))
+LOOP_LAG_THRESHOLD_MS = float(getattr(config, "loop_lag_threshold_ms", 250))
+LOOP_STACK_DEPTH = 20  # кадров стека в логе
+
+LAG_WINDOW = 1200  # замеров для процентилей (~10 минут при интервале 0.5 с)
+QUANTILES = (0.5, 0.9, 0.99)
+
+LOOP_LAG_SECONDS = registry.histogram(
+    "event_loop_lag_seconds",
+    "Задержка пробуждения event loop относительно расписания",
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+LOOP_STALLS = registry.counter(
+    "event_loop_stalls_total", "Блокировки event loop дольше порога"
+)
+
+
+def _percentile(sorted_values, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(q * len(sorted_values)))
+    return sorted_values[index]
+
+
+class LoopWatchdog:
+    """Замер задержки event loop и стеки блокирующего кода."""
+
+    def __init__(
+        self,
+        interval: float = LOOP_WATCHDOG_INTERVAL,
+        threshold: float = LOOP_LAG_THRESHOLD_MS / 1000,
+    ):
+        self.interval = interval
+        self.threshold = threshold
+        self._lags: deque = deque(maxlen=LAG_WINDOW)
+        self._last_beat = time.monotonic()
+        self._loop_thread_id: int | None = None
+        self._task: asyncio.Task | None = None
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+        registry.gauge(
+            "event_loop_lag_quantile_seconds",
+            "Процентили задержки event loop за последние замеры",
+            labels=("quantile",),
+            collect=self._quantiles,
+        )
+
+    # ----------- Пульс (в event loop) -----------
+
+    async def _heartbeat(self):
+        self._loop_thread_id = threading.get_ident()
+        while True:
+            expected = time.monotonic() + self.interval
+            self._last_beat = time.monotonic()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.monotonic() - expected)
+            self._last_beat = time.monotonic()
+            self._lags.append(lag)
+            LOOP_LAG_SECONDS.observe(lag)
+
+    def _quantiles(self):
+        values = sorted(self._lags)
+        result = {(str(q),): _percentile(values, q) for q in QUANTILES}
+        result[("1",)] = values[-1] if values else 0.0
+        return result
+
+    # ----------- Сторож (отдельный поток) -----------
+
+    def _loop_stack(self) -> str:
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return "<стек недоступен>"
+        return "".join(traceback.format_stack(frame, limit=LOOP_STACK_DEPTH))
+
+    def _watch(self):
+        stall_started = None
+        samples: Counter = Counter()
+        while not self._stop.wait(self.threshold / 2):
+            if self._loop_thread_id is None:
+                continue
+            blocked_for = time.monotonic() - self._last_beat - self.interval
+            if blocked_for > self.threshold:
+                stack = self._loop_stack()
+                samples[stack] += 1
+                if stall_started is None:
+                    stall_started = self._last_beat + self.interval
+                    logger.warning(
+                        "🐢 Event loop заблокирован уже %.0f мс, стек:\n%s",
+                        blocked_for * 1000,
+                        stack,
+                    )
+            elif stall_started is not None:
+                duration = time.monotonic() - stall_started
+                LOOP_STALLS.inc()
+                stack, hits = samples.most_common(1)[0]
+                logger.warning(
+                    "🐢 Event loop был заблокирован %.0f мс (снимков стека: %s), "
+                    "чаще всего:\n%s",
+                    duration * 1000,
+                    sum(samples.values()),
+                    stack,
+                )
+                stall_started = None
+                samples.clear()
+
+    # ----------- Запуск -----------
+
+    def start(self):
+        """Запускает пульс в текущем event loop и поток-сторож."""
+        if not LOOP_WATCHDOG_ENABLED or self._task is not None:
+            return
+        self._last_beat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+        logger.info(
+            "🐢 Сторож event loop: порог %.0f мс, пульс каждые %s с",
+            self.threshold * 1000,
+            self.interval,
+        )
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._stop.set()
+
+
+# Общий экземпляр на процесс
+loop_watchdog = LoopWatchdog()
@@ -0,0 +1,351 @@
+# core/metrics.py
+"""
+Метрики в текстовом формате Prometheus и проверки здоровья по HTTP.
+
+Без внешних зависимостей: Counter, Gauge и Histogram с метками хранятся в
+памяти процесса, а небольшой aiohttp-сервер отдаёт:
+
+- /metrics — все метрики (формат text/plain; version=0.0.4);
+- /healthz — liveness: процесс жив и event loop отвечает;
+- /readyz  — readiness: все зарегистрированные проверки проходят.
+"""
+import asyncio
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Tuple
+
+from core.logger import logger
+from core.settings import get_config
+
+config = get_config()
+METRICS_HOST = getattr(config, "metrics_host", "127.0.0.1")
+METRICS_PORT = int(getattr(config, "metrics_port", 9108))  # 0 — не запускать сервер
+# Смещение порта для роли процесса (main.py --role): роли на одной машине не делят порт
+METRICS_PORT_OFFSETS = {"all": 0, "bot": 1, "detector": 2, "generator": 3}
+
+# Границы гистограмм по умолчанию (секунды)
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()  # метрики обновляются и из потоков to_thread
+
+    def _key(self, labels: Dict) -> Tuple:
+        return tuple(labels.get(name, "") for name in self.label_names)
+
+    def render(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+            *self._samples(),
+        ]
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+            for key, value in items
+        ]
+
+
+class Gauge(_Metric):
+    """Значение задаётся через set() или вычисляется при каждом запросе /metrics."""
+
+    kind = "gauge"
+
+    def __init__(self, *args, collect: Callable[[], Dict[Tuple, float]] | None = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple, float] = {}
+        self._collect = collect
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = float(value)
+
+    def _samples(self) -> List[str]:
+        values = dict(self._values)
+        if self._collect is not None:
+            try:
+                values.update(self._collect())
+            except Exception as e:
+                logger.warning("Метрика %s не собрана: %s", self.name, e)
+        return [
+            f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+            for key, value in values.items()
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, *args, buckets=DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # labels -> [счётчики по корзинам, сумма, количество]
+        self._values: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Замеряет длительность блока with (в секундах)."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = [(key, (list(s[0]), s[1], s[2])) for key, s in self._values.items()]
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                labels = _format_labels(self.label_names, key, le)
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        # Повторная регистрация (например, при перезагрузке модуля) отдаёт существующую
+        return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, documentation: str, labels=()) -> Counter:
+        return self.register(Counter(name, documentation, labels))
+
+    def gauge(self, name: str, documentation: str, labels=(), collect=None) -> Gauge:
+        return self.register(Gauge(name, documentation, labels, collect=collect))
+
+    def histogram(self, name: str, documentation: str, labels=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labels, buckets=buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# ----------- Метрики приложения -----------
+
+YOUTUBE_API_SECONDS = registry.histogram(
+    "youtube_api_request_seconds",
+    "Длительность запросов к YouTube Data API",
+    labels=("method", "outcome"),
+    buckets=(0.1, 0.25, 0.5, 1, 2, 5, 10, 30),
+)
+LLM_REQUEST_SECONDS = registry.histogram(
+    "llm_request_seconds",
+    "Длительность одной попытки запроса к LLM",
+    labels=("provider", "outcome"),
+)
+LLM_ATTEMPTS = registry.histogram(
+    "llm_attempts",
+    "Сколько попыток понадобилось на один вызов LLM",
+    labels=("provider", "outcome"),
+    buckets=(1, 2, 3, 4, 5, 8),
+)
+TAG_VALIDATION_FAILURES = registry.counter(
+    "tag_validation_failures_total",
+    "Тексты, не прошедшие проверку разметки Telegram",
+    labels=("check",),
+)
+PUBLISH_TOTAL = registry.counter(
+    "publish_total",
+    "Отправки из очереди исходящих сообщений",
+    labels=("method", "result"),
+)
+CYCLE_SECONDS = registry.histogram(
+    "checker_cycle_seconds",
+    "Длительность цикла проверки каналов и генерации",
+    labels=("stage",),
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600),
+)
+LIVENESS_CHECKS_TOTAL = registry.counter(
+    "liveness_checks_total",
+    "Проверки доступности видео постов на модерации",
+    labels=("result",),
+)
+PROCESS_START_TIME = registry.gauge(
+    "process_start_time_seconds", "Время запуска процесса (unix time)"
+)
+PROCESS_START_TIME.set(time.time())
+
+
+# ----------- Health -----------
+
+_readiness_checks: Dict[str, Callable[[], bool]] = {}
+
+
+def register_readiness_check(name: str, check: Callable[[], bool]):
+    """check() -> bool вызывается при каждом запросе /readyz."""
+    _readiness_checks[name] = check
+
+
+def readiness() -> Dict[str, bool]:
+    result = {}
+    for name, check in list(_readiness_checks.items()):
+        try:
+            result[name] = bool(check())
+        except Exception:
+            result[name] = False
+    return result
+
+
+# ----------- HTTP -----------
+
+
+def metrics_port_for(role: str) -> int:
+    """
+    Порт сервера метрик процесса с этой ролью: METRICS_PORT_<ROLE>, если
+    задан, иначе METRICS_PORT + смещение роли. 0 — сервер не запускается.
+    """
+    explicit = getattr(config, f"metrics_port_{role}", "")
+    if explicit not in (None, ""):
+        return int(explicit)
+    if not METRICS_PORT:
+        return 0
+    return METRICS_PORT + METRICS_PORT_OFFSETS.get(role, 0)
+
+
+class MetricsServer:
+    """Небольшой aiohttp-сервер для /metrics, /healthz и /readyz."""
+
+    def __init__(self, host: str = METRICS_HOST, port: int = METRICS_PORT):
+        self.host = host
+        self.port = port
+        self._runner = None
+
+    async def start(self):
+        if not self.port:
+            return
+        try:
+            from aiohttp import web
+        except ImportError:
+            logger.warning("aiohttp не установлен — сервер метрик не запущен")
+            return
+
+        app = web.Application()
+        app.router.add_get("/metrics", self._metrics)
+        app.router.add_get("/healthz", self._healthz)
+        app.router.add_get("/readyz", self._readyz)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        try:
+            await web.TCPSite(self._runner, self.host, self.port).start()
+        except OSError as e:
+            # Например, порт занят другим процессом на этой машине — работаем без метрик
+            logger.error(
+                "Не удалось запустить сервер метрик на %s:%s: %s",
+                self.host,
+                self.port,
+                e,
+            )
+            await self._runner.cleanup()
+            self._runner = None
+            return
+        logger.info("📈 Метрики: http://%s:%s/metrics", self.host, self.port)
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _metrics(self, request):
+        from aiohttp import web
+
+        # Gauge с collect() могут читать SQLite — не в event loop
+        body = await asyncio.to_thread(registry.render)
+        return web.Response(
+            body=body.encode("utf-8"),
+            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+        )
+
+    async def _healthz(self, request):
+        from aiohttp import web
+
+        return web.json_response({"status": "ok"})
+
+    async def _readyz(self, request):
+        from aiohttp import web
+
+        checks = await asyncio.to_thread(readiness)
+        ready = all(checks.values())
+        return web.json_response(
+            {"status": "ok" if ready else "unavailable", "checks": checks},
+            status=200 if ready else 503,
+        )
+
+
+# Общий экземпляр на процесс
+metrics_server = MetricsServer()
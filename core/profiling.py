@@ -0,0 +1,224 @@
+# core/profiling.py
+"""
+Профилирование работающего процесса без перезапуска.
+
+- SamplingProfiler — семплирующий профилировщик CPU: отдельный поток раз в
+  PROFILE_SAMPLE_MS снимает стеки всех потоков через sys._current_frames().
+  Накладные расходы не зависят от числа вызовов функций, поэтому его можно
+  включать в проде. Отчёт: самые частые функции (собственное и общее время)
+  и свёрнутые стеки в формате flamegraph.pl / speedscope;
+- MemoryProfiler — снимки tracemalloc: топ мест выделения памяти и рост
+  с предыдущего снимка.
+"""
+import linecache
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+from typing import List
+
+from core.settings import get_config
+
+config = get_config()
+PROFILE_SAMPLE_MS = float(getattr(config, "profile_sample_ms", 10))
+PROFILE_MAX_SECONDS = int(getattr(config, "profile_max_seconds", 600))
+TRACEMALLOC_FRAMES = int(getattr(config, "tracemalloc_frames", 25))
+
+TOP_FUNCTIONS = 40
+TOP_STACKS = 200
+TOP_ALLOCATIONS = 40
+
+# Ожидание в селекторе event loop и в очередях — это простой, а не работа
+_IDLE_FUNCTIONS = {"select", "poll", "epoll", "wait", "_worker", "get", "sleep"}
+
+
+def _frame_label(code) -> str:
+    filename = code.co_filename
+    # Путь относительно проекта / site-packages — короче и читаемее
+    for prefix in sys.path:
+        if prefix and filename.startswith(prefix):
+            filename = filename[len(prefix):].lstrip(os.sep)
+            break
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Семплирующий профилировщик CPU для всех потоков процесса."""
+
+    def __init__(self, interval: float = PROFILE_SAMPLE_MS / 1000):
+        self.interval = interval
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+        self._started_at = 0.0
+        self._samples = 0
+        self._self: Counter = Counter()
+        self._total: Counter = Counter()
+        self._stacks: Counter = Counter()
+        self._threads: Counter = Counter()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self._started_at = time.monotonic()
+        self._samples = 0
+        for counter in (self._self, self._total, self._stacks, self._threads):
+            counter.clear()
+        self._thread = threading.Thread(target=self._run, name="cpu-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> str:
+        """Останавливает семплирование и возвращает текстовый отчёт."""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        return self.report()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                self._sample(names.get(thread_id, str(thread_id)), frame)
+            self._samples += 1
+
+    def _sample(self, thread_name: str, frame):
+        stack: List[str] = []
+        while frame is not None:
+            stack.append(_frame_label(frame.f_code))
+            frame = frame.f_back
+        if not stack:
+            return
+        self._threads[thread_name] += 1
+        self._self[stack[0]] += 1
+        for label in set(stack):
+            self._total[label] += 1
+        self._stacks[";".join([thread_name, *reversed(stack)])] += 1
+
+    def report(self) -> str:
+        elapsed = time.monotonic() - self._started_at if self._started_at else 0.0
+        lines = [
+            f"CPU-профиль (семплирование каждые {self.interval * 1000:.0f} мс)",
+            f"Снят: {datetime.now():%Y-%m-%d %H:%M:%S}, окно {elapsed:.0f} с, "
+            f"проходов: {self._samples}",
+            "",
+            "Потоки (доля снимков):",
+        ]
+        total_thread_samples = sum(self._threads.values()) or 1
+        for name, count in self._threads.most_common():
+            lines.append(f"  {count / total_thread_samples:6.1%}  {name}")
+
+        def table(title: str, counter: Counter):
+            lines.extend(["", title])
+            busy = [
+                (label, count)
+                for label, count in counter.most_common()
+                if label.split(" ", 1)[0] not in _IDLE_FUNCTIONS
+            ]
+            for label, count in busy[:TOP_FUNCTIONS]:
+                lines.append(f"  {count:7d}  {count / max(1, self._samples):6.1%}  {label}")
+
+        table("Собственное время (функция наверху стека, без ожидания):", self._self)
+        table("Общее время (функция где-либо в стеке):", self._total)
+
+        lines.extend(["", "Свёрнутые стеки (flamegraph.pl / speedscope):"])
+        for stack, count in self._stacks.most_common(TOP_STACKS):
+            lines.append(f"{stack} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_size(size: float) -> str:
+    for unit in ("Б", "КиБ", "МиБ"):
+        if abs(size) < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} ГиБ"
+
+
+class MemoryProfiler:
+    """Снимки tracemalloc и рост памяти между ними."""
+
+    def __init__(self, frames: int = TRACEMALLOC_FRAMES):
+        self.frames = frames
+        self._previous: tracemalloc.Snapshot | None = None
+        self._previous_at: datetime | None = None
+        self._started_here = False
+
+    @property
+    def running(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self._started_here = True
+            # Снимки до перезапуска трассировки несравнимы с новыми
+            self._previous = None
+        if self._previous is None:
+            self._take()
+
+    def stop(self):
+        """Выключает tracemalloc, если его включали мы (снимок для сравнения остаётся)."""
+        if self._started_here and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self._started_here = False
+
+    def _take(self) -> tracemalloc.Snapshot:
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            (
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, linecache.__file__),
+            )
+        )
+        self._previous, self._previous_at = snapshot, datetime.now()
+        return snapshot
+
+    def snapshot_report(self) -> str:
+        """Снимок: топ мест выделения и рост с предыдущего снимка."""
+        if not tracemalloc.is_tracing():
+            return "tracemalloc выключен\n"
+        previous, previous_at = self._previous, self._previous_at
+        snapshot = self._take()
+        current, peak = tracemalloc.get_traced_memory()
+        lines = [
+            f"Память (tracemalloc, {self.frames} кадров на выделение)",
+            f"Снимок: {datetime.now():%Y-%m-%d %H:%M:%S}; сейчас {_format_size(current)}, "
+            f"пик {_format_size(peak)}",
+            "",
+            "Больше всего памяти (по строкам):",
+        ]
+        for stat in snapshot.statistics("lineno")[:TOP_ALLOCATIONS]:
+            frame = stat.traceback[0]
+            lines.append(
+                f"  {_format_size(stat.size):>12}  {stat.count:8d} блоков  "
+                f"{frame.filename}:{frame.lineno}"
+            )
+
+        if previous is not None:
+            lines.extend(["", f"Рост с предыдущего снимка ({previous_at:%H:%M:%S}):"])
+            growth = [
+                s for s in snapshot.compare_to(previous, "traceback") if s.size_diff > 0
+            ][:TOP_ALLOCATIONS // 2]
+            for stat in growth:
+                lines.append(
+                    f"  {'+' + _format_size(stat.size_diff):>13}  "
+                    f"{stat.count_diff:+8d} блоков  (всего {_format_size(stat.size)})"
+                )
+                for line in stat.traceback.format(limit=8, most_recent_first=True):
+                    lines.append(f"      {line}")
+        return "\n".join(lines) + "\n"
+
+
+def clamp_window(seconds: int) -> int:
+    return max(1, min(PROFILE_MAX_SECONDS, seconds))
+
@@ -0,0 +1,82 @@
+# core/rate_limit.py
+"""
+Асинхронный token bucket и реестр общих лимитеров на процесс.
+"""
+import asyncio
+import time
+from typing import Dict
+
+
+class TokenBucket:
+    """
+    Классический token bucket: rate токенов в секунду, не больше capacity.
+    acquire() ждёт, пока токенов станет достаточно. Ожидающие обслуживаются
+    по очереди (FIFO), поэтому поток запросов не превышает rate.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        if rate <= 0 or capacity <= 0:
+            raise ValueError("rate и capacity должны быть положительными")
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        if now < self._paused_until:
+            self._updated = now
+            return
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+    def pause(self, seconds: float):
+        """Обнуляет bucket и не выдаёт токены seconds секунд (например, retry_after)."""
+        self._tokens = 0.0
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._updated = time.monotonic()
+
+    def wait_time(self, tokens: float = 1.0) -> float:
+        """Сколько секунд ждать, пока станет доступно tokens токенов."""
+        self._refill()
+        pause_left = max(0.0, self._paused_until - time.monotonic())
+        deficit = max(0.0, tokens - self._tokens)
+        return pause_left + deficit / self.rate
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        """Забирает токены без ожидания; False, если их недостаточно."""
+        self._refill()
+        if self._tokens >= tokens:
+            self._tokens -= tokens
+            return True
+        return False
+
+    @property
+    def available(self) -> float:
+        self._refill()
+        return self._tokens
+
+    async def acquire(self, tokens: float = 1.0):
+        """Забирает tokens токенов, при необходимости ожидая их накопления."""
+        if tokens > self.capacity:
+            raise ValueError("Запрошено больше токенов, чем вмещает bucket")
+        async with self._lock:
+            while True:
+                if self.try_acquire(tokens):
+                    return
+                await asyncio.sleep(self.wait_time(tokens))
+
+
+_buckets: Dict[str, TokenBucket] = {}
+
+
+def get_bucket(name: str, rate: float, capacity: float) -> TokenBucket:
+    """Общий на процесс bucket по имени (например, по провайдеру LLM)."""
+    bucket = _buckets.get(name)
+    if bucket is None:
+        bucket = _buckets[name] = TokenBucket(rate, capacity)
+    return bucket
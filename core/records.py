@@ -0,0 +1,224 @@
+# core/records.py
+"""
+Типизированные записи конвейера: Video (найдено парсером, лежит в очереди
+генерации) и Post (пост в pending_posts.json).
+
+Классы со __slots__ вместо словарей: экземпляр занимает в разы меньше
+памяти, опечатка в имени поля — ошибка, а не тихий новый ключ.
+
+Кодек: компактный JSON (без отступов и пробелов — encoder на C) с версией
+схемы. Файл постов хранит строки, а не словари:
+{"version": 1, "fields": ["videoId", ...], "posts": [[...], ...]} — имена
+ключей не повторяются в каждом посте, а json.loads списков и Post(*row)
+вдвое быстрее словарей. Старый формат (список словарей) читается как
+версия 0. Поля, которых нет в классе, сохраняются в extra и не теряются.
+
+Задача очереди (Video) — словарь с полем version (VIDEO_SCHEMA_VERSION);
+payload без него записан до версионирования и читается как версия 0.
+"""
+import json
+import sys
+from dataclasses import dataclass
+from typing import Dict, Iterable, List
+
+SCHEMA_VERSION = 1
+VIDEO_SCHEMA_VERSION = 1
+
+STATUS_PENDING = "pending"
+STATUS_APPROVED = "approved"
+# Видео стало приватным или удалено (см. core/yt_parser/liveness.py)
+STATUS_UNAVAILABLE = "unavailable"
+
+_dumps = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+
+
+@dataclass(slots=True)
+class Video:
+    video_id: str
+    channel_id: str
+    channel_name: str
+    title: str
+    description: str = ""
+    thumbnail: str = ""
+    published_at: str = ""
+
+    @property
+    def url(self) -> str:
+        return f"https://www.youtube.com/watch?v={self.video_id}"
+
+    def to_dict(self) -> Dict:
+        return {
+            "video_id": self.video_id,
+            "channel_id": self.channel_id,
+            "channel_name": self.channel_name,
+            "title": self.title,
+            "description": self.description,
+            "thumbnail": self.thumbnail,
+            "published_at": self.published_at,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Video":
+        return cls(
+            video_id=data["video_id"],
+            channel_id=data.get("channel_id", ""),
+            channel_name=data.get("channel_name", ""),
+            title=data.get("title", ""),
+            description=data.get("description") or "",
+            thumbnail=data.get("thumbnail") or "",
+            published_at=data.get("published_at") or "",
+        )
+
+
+# Колонки файла постов (ключи хранения) в порядке полей Post
+POST_FIELDS = (
+    "videoId",
+    "channel_name",
+    "title",
+    "description",
+    "thumbnail_url",
+    "generated_post",
+    "genre",
+    "status",
+    "created_at",
+    "checked_at",
+    "alt_sources",
+    "extra",
+)
+_STORED_KEYS = frozenset(POST_FIELDS) - {"extra"}
+_intern = sys.intern
+
+
+@dataclass(slots=True)
+class Post:
+    video_id: str
+    channel_name: str = ""
+    title: str = ""
+    description: str = ""
+    thumbnail_url: str = ""
+    generated_post: str = ""
+    genre: str = ""
+    status: str = STATUS_PENDING
+    created_at: str = ""
+    # Последняя проверка доступности видео на YouTube (см. core/yt_parser/liveness.py)
+    checked_at: str = ""
+    # Дубликаты с других каналов: {"videoId", "channel_name", "url"}.
+    # None вместо пустых контейнеров: у большинства постов их нет, а пустой
+    # список и словарь на каждый пост съели бы выигрыш от __slots__
+    alt_sources: List[Dict] | None = None
+    # Неизвестные этой версии поля — пишутся обратно как есть
+    extra: Dict | None = None
+
+    def to_row(self) -> List:
+        return [
+            self.video_id,
+            self.channel_name,
+            self.title,
+            self.description,
+            self.thumbnail_url,
+            self.generated_post,
+            self.genre,
+            self.status,
+            self.created_at,
+            self.checked_at,
+            self.alt_sources or None,
+            self.extra or None,
+        ]
+
+    @classmethod
+    def from_rows(cls, rows: List[List]) -> List["Post"]:
+        """
+        Посты из строк в порядке POST_FIELDS: строка распаковывается прямо
+        в конструктор, без промежуточного словаря на пост.
+        """
+        # Повторяющиеся значения (канал, жанр, статус) — одна строка на все посты
+        return [
+            cls(
+                video_id, _intern(channel_name), title, description, thumbnail_url,
+                generated_post, _intern(genre), _intern(status), created_at, checked_at,
+                alt_sources or None, extra or None,
+            )
+            for (
+                video_id, channel_name, title, description, thumbnail_url,
+                generated_post, genre, status, created_at, checked_at, alt_sources, extra,
+            ) in rows
+        ]
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Post":
+        """Пост из словаря с ключами хранения (файл версии 0)."""
+        get = data.get
+        alt_sources = get("alt_sources")
+        unknown = data.keys() - _STORED_KEYS
+        return cls(
+            get("videoId") or "",
+            _intern(get("channel_name") or ""),
+            get("title") or "",
+            get("description") or "",
+            get("thumbnail_url") or "",
+            get("generated_post") or "",
+            _intern(get("genre") or ""),
+            _intern(get("status") or STATUS_PENDING),
+            get("created_at") or "",
+            get("checked_at") or "",
+            alt_sources if isinstance(alt_sources, list) and alt_sources else None,
+            {key: data[key] for key in unknown} if unknown else None,
+        )
+
+    def update(self, changes: Dict):
+        """Применяет изменения вида {атрибут: значение}."""
+        for name, value in changes.items():
+            setattr(self, name, value)
+
+
+def encode_posts(posts: Iterable[Post]) -> str:
+    return _dumps(
+        {"version": SCHEMA_VERSION, "fields": POST_FIELDS, "posts": [p.to_row() for p in posts]}
+    )
+
+
+def _row_as_dict(fields: List[str], row: List) -> Dict:
+    data = dict(zip(fields, row))
+    data.update(data.pop("extra", None) or {})
+    return data
+
+
+def decode_posts(data) -> List[Post]:
+    """
+    Посты из разобранного JSON. Бросает ValueError для неизвестного формата
+    и для версии новее SCHEMA_VERSION (файл записан более новым кодом).
+    """
+    if isinstance(data, list):  # версия 0: список словарей с отступами
+        return [Post.from_dict(item) for item in data if isinstance(item, dict)]
+    if isinstance(data, dict) and not data:  # файла ещё нет (load_json вернул {})
+        return []
+    if not isinstance(data, dict) or not isinstance(data.get("posts"), list):
+        raise ValueError("Ожидается список постов или {'version', 'fields', 'posts'}")
+    version = data.get("version")
+    if not isinstance(version, int) or version > SCHEMA_VERSION:
+        raise ValueError(f"Неподдерживаемая версия схемы постов: {version!r}")
+    fields = data.get("fields")
+    if not isinstance(fields, list):
+        raise ValueError("В файле постов нет списка fields")
+    if fields == list(POST_FIELDS):
+        return Post.from_rows(data["posts"])
+    # Другой набор или порядок колонок — сопоставляем по именам
+    return [Post.from_dict(_row_as_dict(fields, row)) for row in data["posts"]]
+
+
+def encode_video(video: Video) -> str:
+    return _dumps({"version": VIDEO_SCHEMA_VERSION, **video.to_dict()})
+
+
+def decode_video(payload: str) -> Video:
+    """
+    Video из payload очереди. ValueError — для битого payload и для версии
+    новее VIDEO_SCHEMA_VERSION (задачу поставил более новый код).
+    """
+    data = json.loads(payload)
+    if not isinstance(data, dict) or "video_id" not in data:
+        raise ValueError("Ожидается словарь видео с video_id")
+    version = data.get("version", 0)
+    if not isinstance(version, int) or version > VIDEO_SCHEMA_VERSION:
+        raise ValueError(f"Неподдерживаемая версия схемы видео: {version!r}")
+    return Video.from_dict(data)
@@ -0,0 +1,275 @@
+# core/settings.py
+"""
+Единая точка получения настроек: Config() создаётся (и .env читается)
+один раз на процесс, все модули используют общий экземпляр.
+
+ConfigWatcher следит за .env и channels.json и применяет изменения без
+перезапуска: новые значения сначала проверяются, затем текущий Config
+подменяется целиком (одним присваиванием), а подписчики получают
+уведомление. Значения, которые модули прочитали при импорте, меняются
+только после перезапуска — об этом пишется в лог.
+"""
+import asyncio
+import importlib.util
+import json
+import os
+import sys
+from typing import Callable, Dict, List, Tuple
+
+import config as config_module
+
+ENV_FILE = ".env"
+CONFIG_POLL_SECONDS = 5.0
+# Ключи, которые применяются на лету; остальные требуют перезапуска
+HOT_RELOAD_KEYS = {"check_interval_hours", "log_level", "channels_json"}
+# Что делать с постом, видео которого исчезло с YouTube (см. core/yt_parser/liveness.py)
+LIVENESS_ACTIONS = ("mark", "remove")
+
+_current = None
+
+
+def get_config() -> "config_module.Config":
+    global _current
+    if _current is None:
+        _current = config_module.Config()
+    return _current
+
+
+def _logger():
+    # core.logger сам читает настройки отсюда — импортируем лениво
+    from core.logger import logger
+
+    return logger
+
+
+def _public_values(cfg) -> Dict:
+    values = {}
+    for name in dir(cfg):
+        if name.startswith("_"):
+            continue
+        value = getattr(cfg, name, None)
+        if not callable(value):
+            values[name] = value
+    return values
+
+
+def validate_config(cfg):
+    """Бросает ValueError, если новые настройки нельзя применять."""
+    try:
+        interval = float(cfg.check_interval_hours)
+    except (TypeError, ValueError, AttributeError):
+        raise ValueError("CHECK_INTERVAL_HOURS должен быть числом")
+    if interval <= 0:
+        raise ValueError("CHECK_INTERVAL_HOURS должен быть больше нуля")
+    for key in ("bot_token", "channels_json", "pending_posts_json"):
+        if not getattr(cfg, key, None):
+            raise ValueError(f"{key.upper()} не задан")
+    action = getattr(cfg, "liveness_action", "mark")
+    if action not in LIVENESS_ACTIONS:
+        raise ValueError(f"LIVENESS_ACTION должен быть одним из {LIVENESS_ACTIONS}, а не {action!r}")
+
+
+def validate_channels(data) -> List[Dict]:
+    """Бросает ValueError, если channels.json имеет неверный формат."""
+    if not isinstance(data, list):
+        raise ValueError("channels.json должен содержать список каналов")
+    seen = set()
+    for channel in data:
+        if not isinstance(channel, dict):
+            raise ValueError(f"Канал должен быть объектом: {channel!r}")
+        channel_id, name = channel.get("id"), channel.get("name")
+        if not isinstance(channel_id, str) or not channel_id:
+            raise ValueError(f"У канала нет id: {channel!r}")
+        if not isinstance(name, str):
+            raise ValueError(f"У канала {channel_id} нет name")
+        if channel_id in seen:
+            raise ValueError(f"Канал {channel_id} указан дважды")
+        seen.add(channel_id)
+    return data
+
+
+def diff_channels(old: List[Dict], new: List[Dict]) -> Tuple[List[Dict], List[Dict]]:
+    """(добавленные, удалённые) каналы по id."""
+    old_ids = {c["id"] for c in old}
+    new_ids = {c["id"] for c in new}
+    added = [c for c in new if c["id"] not in old_ids]
+    removed = [c for c in old if c["id"] not in new_ids]
+    return added, removed
+
+
+class ConfigWatcher:
+    """
+    Опрашивает mtime .env и channels.json и применяет изменения на лету.
+
+    subscribe_config(callback(old, new)) — вызывается после подмены Config;
+    subscribe_channels(callback(channels, added, removed)) — после изменения
+    списка каналов.
+    """
+
+    def __init__(self, env_file: str = ENV_FILE, poll_seconds: float = CONFIG_POLL_SECONDS):
+        self.env_file = env_file
+        self.poll_seconds = poll_seconds
+        self._mtimes: Dict[str, float] = {}
+        self._channels: List[Dict] | None = None
+        self._config_callbacks: List[Callable] = []
+        self._channel_callbacks: List[Callable] = []
+
+    def subscribe_config(self, callback: Callable):
+        self._config_callbacks.append(callback)
+
+    def subscribe_channels(self, callback: Callable):
+        self._channel_callbacks.append(callback)
+
+    def _changed(self, path: str) -> bool:
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            return False
+        previous = self._mtimes.get(path)
+        self._mtimes[path] = mtime
+        return previous is not None and mtime != previous
+
+    def load_channels(self) -> List[Dict]:
+        """Текущий проверенный список каналов (читается при первом обращении)."""
+        if self._channels is None:
+            path = get_config().channels_json
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self._channels = validate_channels(json.load(f))
+            except FileNotFoundError:
+                _logger().error("Channels JSON not found: %s", path)
+                self._channels = []
+            self._changed(path)
+        return self._channels
+
+    # ----------- Reload -----------
+
+    def _candidate_config(self):
+        """
+        Config из нового .env в свежем экземпляре модуля config (текущий модуль
+        не трогаем). Значения .env попадают в os.environ только если Config
+        прошёл проверку; иначе окружение возвращается как было.
+        """
+        global config_module
+        from dotenv import dotenv_values
+
+        values = {k: v for k, v in dotenv_values(self.env_file).items() if v is not None}
+        saved = {key: os.environ.get(key) for key in values}
+        os.environ.update(values)
+        try:
+            spec = importlib.util.find_spec(config_module.__name__)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            candidate = module.Config()
+            validate_config(candidate)
+        except BaseException:
+            for key, value in saved.items():
+                if value is None:
+                    os.environ.pop(key, None)
+                else:
+                    os.environ[key] = value
+            raise
+        # Проверенный модуль заменяет прежний: import config дальше видит новые значения
+        sys.modules[module.__name__] = config_module = module
+        return candidate
+
+    def reload_config(self) -> bool:
+        """Перечитывает .env; при ошибке проверки остаётся старый Config."""
+        global _current
+        logger = _logger()
+        try:
+            new = self._candidate_config()
+        except ImportError:
+            logger.warning("python-dotenv не установлен — .env не перечитывается")
+            return False
+        except Exception as e:
+            logger.error("⚙️ Новые настройки из %s отклонены: %s", self.env_file, e)
+            return False
+
+        old = get_config()
+        old_values, new_values = _public_values(old), _public_values(new)
+        changed = {
+            key
+            for key in old_values.keys() | new_values.keys()
+            if old_values.get(key) != new_values.get(key)
+        }
+        if not changed:
+            return False
+
+        _current = new
+        logger.info("⚙️ Настройки обновлены: %s", ', '.join(sorted(k.upper() for k in changed)))
+        needs_restart = changed - HOT_RELOAD_KEYS
+        if needs_restart:
+            logger.warning(
+                "⚙️ Применятся после перезапуска: %s",
+                ', '.join(sorted(k.upper() for k in needs_restart)),
+            )
+        if "log_level" in changed:
+            from core.logger import Logger
+
+            Logger().set_level(str(new.log_level))
+        self._notify(self._config_callbacks, old, new)
+        if "channels_json" in changed:
+            self.reload_channels()
+        return True
+
+    def reload_channels(self) -> bool:
+        """Перечитывает channels.json и сообщает подписчикам о разнице."""
+        logger = _logger()
+        path = get_config().channels_json
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                channels = validate_channels(json.load(f))
+        except Exception as e:
+            logger.error("⚙️ Изменения %s отклонены: %s", path, e)
+            return False
+
+        old = self._channels or []
+        added, removed = diff_channels(old, channels)
+        renamed = old != channels and not added and not removed
+        if not (added or removed or renamed):
+            return False
+
+        self._channels = channels
+        logger.info(
+            "⚙️ Каналы обновлены: +%s, -%s, всего %s",
+            len(added),
+            len(removed),
+            len(channels),
+        )
+        self._notify(self._channel_callbacks, channels, added, removed)
+        return True
+
+    @staticmethod
+    def _notify(callbacks: List[Callable], *args):
+        for callback in callbacks:
+            try:
+                callback(*args)
+            except Exception as e:
+                _logger().error("Ошибка применения новых настроек: %s", e, exc_info=True)
+
+    def poll(self):
+        """
+        Одна проверка файлов. Выполняется в event loop (stat и чтение двух
+        небольших файлов), поэтому подписчики вызываются в его потоке.
+        """
+        if self._changed(self.env_file):
+            self.reload_config()
+        if self._changed(get_config().channels_json):
+            self.reload_channels()
+
+    async def run(self):
+        """Фоновый цикл наблюдения за файлами."""
+        # Запоминаем исходные mtime, чтобы не перезагружать всё при старте
+        self._changed(self.env_file)
+        self._changed(get_config().channels_json)
+        while True:
+            await asyncio.sleep(self.poll_seconds)
+            try:
+                self.poll()
+            except Exception as e:
+                _logger().error("Ошибка наблюдения за настройками: %s", e, exc_info=True)
+
+
+# Общий экземпляр на процесс
+config_watcher = ConfigWatcher()
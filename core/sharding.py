@@ -0,0 +1,197 @@
+# core/sharding.py
+"""
+Распределение каналов между несколькими процессами-детекторами.
+
+Каналы раскладываются по фиксированному числу шардов (SHARD_COUNT), а шарды —
+по живым воркерам через consistent hashing: при появлении или падении воркера
+переезжает только часть шардов. Владение шардом подтверждается арендой (lease)
+в общей SQLite-базе: воркер берёт шард, только если аренда свободна или
+истекла, и отпускает его, когда кольцо назначило шард другому. Поэтому один
+канал в один момент проверяет не больше одного воркера, а шарды упавшего
+воркера забираются живыми после истечения аренды.
+"""
+import bisect
+import hashlib
+import os
+import socket
+import time
+from typing import Dict, Iterable, Set
+
+from core.logger import logger
+from core.sqlite_utils import init_db, sqlite_transaction
+from core.settings import get_config
+
+config = get_config()
+DETECTOR_SHARDING = getattr(config, "detector_sharding", False)
+SHARD_DB = getattr(config, "shard_db", "data/shards.sqlite3")
+SHARD_COUNT = int(getattr(config, "shard_count", 64))
+SHARD_LEASE_SECONDS = float(getattr(config, "shard_lease_seconds", 120))
+WORKER_ID = getattr(config, "worker_id", "") or f"{socket.gethostname()}-{os.getpid()}"
+
+VIRTUAL_NODES = 64  # точек на кольце для каждого воркера
+# Владелец этого шарда выполняет задачи, нужные в одном экземпляре на все детекторы
+LEADER_SHARD = 0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS workers (
+    worker_id    TEXT PRIMARY KEY,
+    heartbeat_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS shard_leases (
+    shard       INTEGER PRIMARY KEY,
+    owner       TEXT NOT NULL,
+    lease_until REAL NOT NULL
+);
+"""
+
+
+def _hash(key: str) -> int:
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+def shard_of(channel_id: str, shard_count: int = SHARD_COUNT) -> int:
+    """Шард канала. Не зависит от набора воркеров."""
+    return _hash(channel_id) % shard_count
+
+
+class HashRing:
+    """Кольцо consistent hashing с виртуальными узлами."""
+
+    def __init__(self, nodes: Iterable[str], vnodes: int = VIRTUAL_NODES):
+        points = sorted(
+            (_hash(f"{node}#{i}"), node) for node in set(nodes) for i in range(vnodes)
+        )
+        self._keys = [key for key, _ in points]
+        self._nodes = [node for _, node in points]
+
+    def owner(self, key: str) -> str | None:
+        if not self._keys:
+            return None
+        index = bisect.bisect(self._keys, _hash(key)) % len(self._keys)
+        return self._nodes[index]
+
+
+class ShardCoordinator:
+    """Аренда шардов каналов одним воркером-детектором."""
+
+    def __init__(
+        self,
+        worker_id: str = WORKER_ID,
+        path: str = SHARD_DB,
+        shard_count: int = SHARD_COUNT,
+        lease_seconds: float = SHARD_LEASE_SECONDS,
+    ):
+        self.worker_id = worker_id
+        self.path = path
+        self.shard_count = shard_count
+        self.lease_seconds = lease_seconds
+        # shard -> до какого момента (time.time()) аренда точно наша
+        self._leases: Dict[int, float] = {}
+        init_db(self.path, _SCHEMA)
+
+    def _transaction(self):
+        return sqlite_transaction(self.path)
+
+    @property
+    def owned_shards(self) -> Set[int]:
+        now = time.time()
+        return {shard for shard, until in self._leases.items() if until > now}
+
+    def refresh(self) -> Set[int]:
+        """
+        Heartbeat + ребалансировка: регистрирует воркер, строит кольцо из живых
+        воркеров, берёт/продлевает назначенные шарды и отпускает чужие.
+        Возвращает шарды, которыми воркер владеет.
+        """
+        now = time.time()
+        lease_until = now + self.lease_seconds
+        with self._transaction() as db:
+            db.execute(
+                "INSERT INTO workers (worker_id, heartbeat_at) VALUES (?, ?) "
+                "ON CONFLICT(worker_id) DO UPDATE SET heartbeat_at = excluded.heartbeat_at",
+                (self.worker_id, now),
+            )
+            db.execute(
+                "DELETE FROM workers WHERE heartbeat_at < ?", (now - self.lease_seconds,)
+            )
+            workers = [row[0] for row in db.execute("SELECT worker_id FROM workers")]
+            ring = HashRing(workers)
+
+            leases = {
+                shard: (owner, until)
+                for shard, owner, until in db.execute(
+                    "SELECT shard, owner, lease_until FROM shard_leases"
+                )
+            }
+
+            owned: Dict[int, float] = {}
+            for shard in range(self.shard_count):
+                owner, until = leases.get(shard, (None, 0.0))
+                wanted = ring.owner(str(shard)) == self.worker_id
+                if owner == self.worker_id and not wanted:
+                    # Кольцо отдало шард другому воркеру — освобождаем аренду
+                    db.execute(
+                        "DELETE FROM shard_leases WHERE shard = ? AND owner = ?",
+                        (shard, self.worker_id),
+                    )
+                elif wanted and (owner in (None, self.worker_id) or until <= now):
+                    db.execute(
+                        "INSERT INTO shard_leases (shard, owner, lease_until) VALUES (?, ?, ?) "
+                        "ON CONFLICT(shard) DO UPDATE SET owner = excluded.owner, "
+                        "lease_until = excluded.lease_until",
+                        (shard, self.worker_id, lease_until),
+                    )
+                    owned[shard] = lease_until
+
+        gained = owned.keys() - self.owned_shards
+        lost = self.owned_shards - owned.keys()
+        self._leases = owned
+        if gained or lost:
+            logger.info(
+                "🧭 Шарды воркера %s: %s/%s (+%s, -%s), живых воркеров: %s",
+                self.worker_id,
+                len(owned),
+                self.shard_count,
+                len(gained),
+                len(lost),
+                len(workers),
+            )
+        return set(owned)
+
+    def holds(self, channel_id: str) -> bool:
+        """
+        Можно ли сейчас проверять канал. Аренда продлевается, если прошла
+        половина срока; если её успели отдать другому — False.
+        """
+        shard = shard_of(channel_id, self.shard_count)
+        until = self._leases.get(shard)
+        now = time.time()
+        if until is None or until <= now:
+            return False
+        if until - now > self.lease_seconds / 2:
+            return True
+
+        new_until = now + self.lease_seconds
+        with self._transaction() as db:
+            cursor = db.execute(
+                "UPDATE shard_leases SET lease_until = ? WHERE shard = ? AND owner = ?",
+                (new_until, shard, self.worker_id),
+            )
+        if cursor.rowcount:
+            self._leases[shard] = new_until
+            return True
+        self._leases.pop(shard, None)
+        return False
+
+    def is_leader(self) -> bool:
+        """Держит ли воркер аренду LEADER_SHARD (обновляется в refresh)."""
+        return LEADER_SHARD in self.owned_shards
+
+    def leave(self):
+        """Корректный выход: шарды сразу становятся доступны другим воркерам."""
+        with self._transaction() as db:
+            db.execute("DELETE FROM shard_leases WHERE owner = ?", (self.worker_id,))
+            db.execute("DELETE FROM workers WHERE worker_id = ?", (self.worker_id,))
+        self._leases = {}
+        logger.info("🧭 Воркер %s освободил свои шарды", self.worker_id)
@@ -0,0 +1,34 @@
+# core/sqlite_utils.py
+"""Общие помощники для локальных SQLite-хранилищ (очереди задач и сообщений)."""
+import os
+import sqlite3
+from contextlib import contextmanager
+
+
+def init_db(path: str, schema: str):
+    """Создаёт файл базы (и папку) и применяет схему. Включает WAL."""
+    db_dir = os.path.dirname(path)
+    if db_dir:
+        os.makedirs(db_dir, exist_ok=True)
+    db = sqlite3.connect(path, timeout=30)
+    try:
+        db.execute("PRAGMA journal_mode=WAL")
+        db.executescript(schema)
+    finally:
+        db.close()
+
+
+@contextmanager
+def sqlite_transaction(path: str):
+    """Короткое соединение на одну транзакцию (безопасно из разных потоков и процессов)."""
+    db = sqlite3.connect(path, timeout=30, isolation_level=None)
+    try:
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+    finally:
+        db.close()
@@ -1,30 +1,236 @@
+import html
 import re
+from functools import lru_cache
+
+from core.metrics import TAG_VALIDATION_FAILURES
 
 ALLOWED_TAGS = {"b", "i"}  # только эти теги разрешены
+TAG_ALIASES = {"strong": "b", "em": "i"}  # синонимы, которые Telegram понимает так же
+LINK_TAG = "a"
+CAPTION_TAGS = ALLOWED_TAGS | {LINK_TAG}  # подписи бота: ещё и ссылки <a href='...'>
+CAPTION_LIMIT = 1024  # лимит подписи к фото в Telegram (после разбора разметки)
+MESSAGE_LIMIT = 4096  # лимит текстового сообщения
+ELLIPSIS = "…"
 
+# Единый токенизатор: тег | комментарий | сущность | одиночный спецсимвол.
+# Всё, что между совпадениями, — обычный текст без '<', '>' и '&'.
+_TOKEN_RE = re.compile(
+    r"<(?P<close>/?)\s*(?P<name>[a-zA-Z][a-zA-Z0-9]*)(?P<attrs>[^<>]*)>"
+    r"|(?P<comment><!--.*?(?:-->|$))"
+    r"|&(?P<entity>#[0-9]{1,7}|#[xX][0-9a-fA-F]{1,6}|[a-zA-Z][a-zA-Z0-9]{1,31});"
+    r"|(?P<stray>[<>&])",
+    re.DOTALL,
+)
+# Единственный допустимый атрибут — href у открывающего <a>
+_HREF_ATTR_RE = re.compile(r"""\s+href=(?:'[^'<>]*'|"[^"<>]*")\s*""")
+_SPACES_AROUND_NEWLINE_RE = re.compile(r"[^\S\n]*\n[^\S\n]*")
+_TELEGRAM_ENTITIES = {"lt", "gt", "amp", "quot"}
+_ESCAPES = {"<": "&lt;", ">": "&gt;", "&": "&amp;"}
 
-def clean_html_for_telegram(text: str) -> str:
+
+def _utf16_len(text: str) -> int:
+    """Telegram считает длину в UTF-16 code units (эмодзи = 2)."""
+    if text.isascii():
+        return len(text)
+    return len(text.encode("utf-16-le")) // 2
+
+
+def _normalize_spaces(chunk: str) -> str:
+    """Убирает пробелы вокруг переносов строк."""
+    if "\n" not in chunk:
+        return chunk
+    return _SPACES_AROUND_NEWLINE_RE.sub("\n", chunk)
+
+
+def _cut_utf16(text: str, budget: int) -> str:
+    """Обрезает text так, чтобы длина в UTF-16 не превышала budget."""
+    used = 0
+    for pos, ch in enumerate(text):
+        used += 2 if ord(ch) > 0xFFFF else 1
+        if used > budget:
+            return text[:pos]
+    return text
+
+
+def _entity_text(entity: str) -> str:
+    """Декодированное значение сущности или '' если она некорректна."""
+    decoded = html.unescape(f"&{entity};")
+    if decoded == f"&{entity};":
+        return ""
+    return decoded
+
+
+@lru_cache(maxsize=256)
+def _entity_parts(entity: str) -> tuple:
+    """(видимый текст, безопасная запись) для сущности из исходного текста."""
+    decoded = _entity_text(entity) or f"&{entity};"
+    return decoded, html.escape(decoded, quote=False)
+
+
+def sanitize_html(
+    text: str, max_length: int | None = None, allowed_tags=ALLOWED_TAGS
+) -> str:
+    """
+    Однопроходная очистка HTML для Telegram.
+
+    - <br> превращается в перенос строки, неразрешённые теги и комментарии удаляются;
+    - атрибуты у разрешённых тегов отбрасываются, strong/em приводятся к b/i;
+    - незакрытые теги закрываются, лишние закрывающие — удаляются;
+    - одиночные '<', '>', '&' экранируются, сущности раскрываются и экранируются заново;
+    - при max_length видимый текст обрезается с '…' (длина в UTF-16).
+
+    Результат всегда корректная HTML-разметка Telegram.
+    """
     if not text:
         return ""
 
-    # Заменяем все варианты <br>, <br/> на перенос строки
-    text = re.sub(r"<\s*br\s*/?\s*>", "\n", text, flags=re.IGNORECASE)
+    out = []
+    stack = []  # открытые разрешённые теги
+    length = 0  # видимая длина результата
+    budget = None if max_length is None else max_length - len(ELLIPSIS)
+
+    def emit_text(chunk: str, escaped: str | None = None) -> bool:
+        """Добавляет видимый текст; возвращает False, если лимит исчерпан."""
+        nonlocal length
+        if budget is None:
+            out.append(chunk if escaped is None else escaped)
+            return True
+        size = _utf16_len(chunk)
+        if length + size > budget:
+            if escaped is None:
+                chunk = _cut_utf16(chunk, budget - length).rstrip()
+                out.append(chunk)
+            out.append(ELLIPSIS)
+            return False
+        out.append(chunk if escaped is None else escaped)
+        length += size
+        return True
 
-    # Удаляем все теги кроме <b> и <i>
-    text = re.sub(
-        r"</?(?!\s*(?:b|i)\b)[a-zA-Z0-9]+[^>]*>", "", text, flags=re.IGNORECASE
-    )
+    pos = 0
+    for match in _TOKEN_RE.finditer(text):
+        start = match.start()
+        if start > pos and not emit_text(_normalize_spaces(text[pos:start])):
+            break
+        pos = match.end()
+        kind = match.lastgroup
 
-    # Убираем лишние пробелы вокруг переносов строк
-    text = re.sub(r"\n\s+", "\n", text)
-    text = re.sub(r"\s+\n", "\n", text)
+        if kind == "attrs":
+            name = match.group("name").lower()
+            if name == "br":
+                if not emit_text("\n"):
+                    break
+                continue
+            name = TAG_ALIASES.get(name, name)
+            if name not in allowed_tags:
+                continue
+            if not match.group("close"):
+                stack.append(name)
+                out.append(f"<{name}>")
+            elif name in stack:
+                # Закрываем всё, что было открыто внутри, и сам тег
+                while stack:
+                    opened = stack.pop()
+                    out.append(f"</{opened}>")
+                    if opened == name:
+                        break
+        elif kind == "entity":
+            if not emit_text(*_entity_parts(match.group("entity"))):
+                break
+        elif kind == "stray":
+            stray = match.group("stray")
+            if not emit_text(stray, escaped=_ESCAPES[stray]):
+                break
+        # комментарии просто пропускаем
+    else:
+        if pos < len(text):
+            emit_text(_normalize_spaces(text[pos:]))
 
-    return text
+    while stack:
+        out.append(f"</{stack.pop()}>")
+
+    return "".join(out)
+
+
+def clean_html_for_telegram(text: str) -> str:
+    """Оставляет только <b> и <i>, исправляя разметку (без ограничения длины)."""
+    return sanitize_html(text)
+
+
+def sanitize_caption(text: str, max_length: int = CAPTION_LIMIT) -> str:
+    """Корректная подпись Telegram не длиннее max_length видимых символов."""
+    return sanitize_html(text, max_length=max_length)
+
+
+def visible_length(text: str) -> int:
+    """Длина текста после разбора HTML-разметки (как её считает Telegram)."""
+    length = 0
+    pos = 0
+    for match in _TOKEN_RE.finditer(text or ""):
+        length += _utf16_len(text[pos : match.start()])
+        pos = match.end()
+        if match.group("entity"):
+            length += _utf16_len(_entity_text(match.group("entity")) or "&")
+        elif match.group("stray"):
+            length += 1
+        elif (match.group("name") or "").lower() == "br":
+            length += 1
+    return length + _utf16_len((text or "")[pos:])
 
 
 def is_only_allowed_tags(text: str) -> bool:
-    tags = re.findall(r"<\s*/?\s*([a-zA-Z0-9]+)[^>]*>", text)
-    for t in tags:
-        if t.lower() not in ALLOWED_TAGS:
+    """Проверяет, что в тексте встречаются только разрешённые теги (<b>, <i>)."""
+    for match in _TOKEN_RE.finditer(text or ""):
+        name = match.group("name")
+        if name and name.lower() not in ALLOWED_TAGS:
+            TAG_VALIDATION_FAILURES.inc(check="disallowed_tag")
             return False
     return True
+
+
+def is_valid_telegram_html(
+    text: str, max_length: int | None = None, allowed_tags=ALLOWED_TAGS
+) -> bool:
+    """
+    Строгая проверка: только разрешённые теги без атрибутов (кроме href у
+    <a>, если он разрешён), все теги сбалансированы, нет одиночных '<'/'&',
+    длина в пределах max_length.
+    """
+    stack = []
+    length = 0
+    pos = 0
+    text = text or ""
+    for match in _TOKEN_RE.finditer(text):
+        length += _utf16_len(text[pos : match.start()])
+        pos = match.end()
+        name = match.group("name")
+        if name:
+            attrs = match.group("attrs")
+            is_link = name == LINK_TAG and not match.group("close") and _HREF_ATTR_RE.fullmatch(attrs)
+            if name not in allowed_tags or (attrs.strip() and not is_link):
+                TAG_VALIDATION_FAILURES.inc(check="disallowed_tag")
+                return False
+            if not match.group("close"):
+                stack.append(name)
+            elif not stack or stack.pop() != name:
+                TAG_VALIDATION_FAILURES.inc(check="unbalanced")
+                return False
+            continue
+        entity = match.group("entity")
+        if entity and (entity.lower() in _TELEGRAM_ENTITIES or entity.startswith("#")):
+            decoded = _entity_text(entity)
+            if not decoded:
+                TAG_VALIDATION_FAILURES.inc(check="entity")
+                return False
+            length += _utf16_len(decoded)
+            continue
+        # Одиночные '<', '>', '&', комментарии и неизвестные сущности недопустимы
+        TAG_VALIDATION_FAILURES.inc(check="stray")
+        return False
+    length += _utf16_len(text[pos:])
+    if stack:
+        TAG_VALIDATION_FAILURES.inc(check="unbalanced")
+        return False
+    if max_length is not None and length > max_length:
+        TAG_VALIDATION_FAILURES.inc(check="length")
+        return False
+    return True
@@ -0,0 +1,235 @@
+# core/thumbnails.py
+"""
+Превью видео для Telegram.
+
+- выбирает лучшее доступное разрешение превью YouTube;
+- заранее (при постановке видео в очередь) параллельно скачивает превью
+  и сжимает их под лимиты Telegram в пуле процессов;
+- запоминает file_id, который Telegram вернул после первой отправки,
+  чтобы следующие отправки не загружали картинку заново;
+- забывает превью и file_id, когда пост опубликован, удалён модератором
+  или его видео пропало с YouTube (ThumbnailCache.forget).
+
+Pillow — необязательная зависимость: без неё файл сохраняется как есть,
+если он укладывается в лимит размера.
+"""
+import asyncio
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List
+
+import aiohttp
+
+from core.logger import logger
+from core.records import Video
+from core.yt_parser.video_storage import load_json, save_json, update_json
+from core.settings import get_config
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow не установлен — сжатие отключено
+    Image = None
+
+config = get_config()
+THUMBNAILS_DIR = getattr(config, "thumbnails_dir", "data/thumbnails")
+THUMBNAIL_FILE_IDS_JSON = getattr(
+    config, "thumbnail_file_ids_json", "data/thumbnail_file_ids.json"
+)
+THUMBNAIL_CONCURRENCY = int(getattr(config, "thumbnail_concurrency", 8))
+THUMBNAIL_WORKERS = int(getattr(config, "thumbnail_workers", 2))
+THUMBNAIL_MAX_SIDE = int(getattr(config, "thumbnail_max_side", 1280))
+
+# Порядок предпочтения размеров из snippet.thumbnails
+THUMBNAIL_QUALITY_ORDER = ("maxres", "standard", "high", "medium", "default")
+
+# Лимиты Telegram для send_photo
+TELEGRAM_PHOTO_MAX_BYTES = 10 * 1024 * 1024
+TELEGRAM_PHOTO_MAX_DIMENSIONS_SUM = 10000
+
+
+def pick_best_thumbnail(thumbnails: Dict) -> str:
+    """URL превью наилучшего доступного качества ('' если превью нет)."""
+    for quality in THUMBNAIL_QUALITY_ORDER:
+        url = (thumbnails.get(quality) or {}).get("url")
+        if url:
+            return url
+    return ""
+
+
+def compress_for_telegram(data: bytes, max_side: int = THUMBNAIL_MAX_SIDE) -> bytes | None:
+    """
+    Приводит картинку к лимитам Telegram: JPEG, сторона не больше max_side,
+    размер не больше 10 МБ. Выполняется в пуле процессов.
+    """
+    if Image is None:
+        return data if len(data) <= TELEGRAM_PHOTO_MAX_BYTES else None
+
+    image = Image.open(io.BytesIO(data))
+    image = image.convert("RGB")
+    max_side = min(max_side, TELEGRAM_PHOTO_MAX_DIMENSIONS_SUM // 2)
+    image.thumbnail((max_side, max_side))
+
+    for quality in (90, 80, 70, 60, 50):
+        buffer = io.BytesIO()
+        image.save(buffer, format="JPEG", quality=quality, optimize=True)
+        if buffer.tell() <= TELEGRAM_PHOTO_MAX_BYTES:
+            return buffer.getvalue()
+    return None
+
+
+class ThumbnailCache:
+    """Локальные копии превью и file_id, полученные от Telegram."""
+
+    def __init__(
+        self,
+        directory: str = THUMBNAILS_DIR,
+        file_ids_path: str = THUMBNAIL_FILE_IDS_JSON,
+    ):
+        self.directory = directory
+        self.file_ids_path = file_ids_path
+        self._file_ids: Dict[str, str] | None = None
+        self._pool: ProcessPoolExecutor | None = None
+        self._tasks = set()
+
+    # ----------- file_id -----------
+
+    @property
+    def file_ids(self) -> Dict[str, str]:
+        if self._file_ids is None:
+            data = load_json(self.file_ids_path)
+            self._file_ids = data if isinstance(data, dict) else {}
+        return self._file_ids
+
+    def get_file_id(self, video_id: str) -> str | None:
+        return self.file_ids.get(video_id)
+
+    async def remember_file_id(self, video_id: str, file_id: str):
+        """Запоминает file_id; локальная копия больше не нужна."""
+        if not video_id or not file_id or self.file_ids.get(video_id) == file_id:
+            return
+        self.file_ids[video_id] = file_id
+        await asyncio.to_thread(save_json, self.file_ids_path, dict(self.file_ids))
+
+        path = self.local_path(video_id)
+        if path:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    async def forget(self, *video_ids: str):
+        """
+        Удаляет локальные копии и file_id: пост больше не будет отправляться
+        (опубликован, удалён или видео недоступно).
+        """
+        video_ids = [v for v in video_ids if v]
+        if not video_ids:
+            return
+        for video_id in video_ids:
+            path = self.local_path(video_id)
+            if path:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+        def drop(file_ids: Dict[str, str]):
+            for video_id in video_ids:
+                file_ids.pop(video_id, None)
+
+        if self._file_ids is not None:
+            for video_id in video_ids:
+                self._file_ids.pop(video_id, None)
+        if os.path.exists(self.file_ids_path):
+            # Карту могли дополнить другие процессы — правим файл под блокировкой
+            await asyncio.to_thread(update_json, self.file_ids_path, drop)
+
+    # ----------- Local files -----------
+
+    def _path(self, video_id: str) -> str:
+        return os.path.join(self.directory, f"{video_id}.jpg")
+
+    def local_path(self, video_id: str) -> str | None:
+        path = self._path(video_id)
+        return path if os.path.exists(path) else None
+
+    # ----------- Prefetch -----------
+
+    def schedule_prefetch(self, videos: List[Video]):
+        """Запускает prefetch в фоне, не задерживая вызывающий код."""
+        task = asyncio.create_task(self.prefetch(videos))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def prefetch(self, videos: List[Video]) -> int:
+        """
+        Параллельно скачивает и сжимает превью видео (поле thumbnail).
+        Возвращает число сохранённых файлов.
+        """
+        todo = [
+            v
+            for v in videos
+            if v.thumbnail
+            and not self.get_file_id(v.video_id)
+            and not self.local_path(v.video_id)
+        ]
+        if not todo:
+            return 0
+
+        os.makedirs(self.directory, exist_ok=True)
+        semaphore = asyncio.Semaphore(THUMBNAIL_CONCURRENCY)
+        timeout = aiohttp.ClientTimeout(total=30)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            results = await asyncio.gather(
+                *(self._fetch_one(session, semaphore, v) for v in todo)
+            )
+        saved = sum(results)
+        logger.info("🖼 Превью загружено: %s/%s", saved, len(todo))
+        return saved
+
+    async def _fetch_one(self, session, semaphore, video: Video) -> bool:
+        video_id, url = video.video_id, video.thumbnail
+        try:
+            async with semaphore:
+                async with session.get(url) as response:
+                    response.raise_for_status()
+                    data = await response.read()
+
+            if Image is None:
+                compressed = compress_for_telegram(data)
+            else:
+                loop = asyncio.get_running_loop()
+                compressed = await loop.run_in_executor(
+                    self._get_pool(), compress_for_telegram, data
+                )
+            if not compressed:
+                logger.warning("Превью %s не укладывается в лимиты Telegram", video_id)
+                return False
+
+            await asyncio.to_thread(self._write, video_id, compressed)
+            return True
+        except Exception as e:
+            logger.warning("Не удалось загрузить превью %s (%s): %s", video_id, url, e)
+            return False
+
+    def _write(self, video_id: str, data: bytes):
+        path = self._path(video_id)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=THUMBNAIL_WORKERS)
+        return self._pool
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+# Общий экземпляр на процесс
+thumbnail_cache = ThumbnailCache()
@@ -0,0 +1,327 @@
+# core/tracing.py
+"""
+Трассировка конвейера по видео: поиск → генерация → модерация → публикация.
+
+span(name, video_id=...) замеряет этап; video_id и номер цикла передаются
+вложенным этапам через contextvars (в том числе в asyncio.to_thread и в
+задачи, созданные внутри этапа). События пишутся фоновым потоком в
+TRACE_FILE в формате Chrome Trace Event (JSON-массив, дописывается по мере
+работы) — файл открывается в chrome://tracing или https://ui.perfetto.dev,
+у каждого видео своя дорожка.
+
+Самые медленные этапы по циклам:
+
+    python -m core.tracing                 # последние 5 циклов
+    python -m core.tracing --cycles 20 --top 10
+    python -m core.tracing --video <videoId>   # весь путь одного видео
+"""
+import argparse
+import atexit
+import contextvars
+import hashlib
+import itertools
+import json
+import os
+import queue
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, List
+
+from core.logger import logger
+from core.settings import get_config
+from core.yt_parser.video_storage import file_lock
+
+config = get_config()
+TRACING_ENABLED = getattr(config, "tracing_enabled", True)
+TRACE_FILE = getattr(config, "trace_file", "log/trace.json")
+TRACE_MAX_BYTES = int(getattr(config, "trace_max_bytes", 50 * 1024 * 1024))
+
+_video_id: contextvars.ContextVar[str | None] = contextvars.ContextVar(
+    "trace_video_id", default=None
+)
+_cycle: contextvars.ContextVar[str | None] = contextvars.ContextVar(
+    "trace_cycle", default=None
+)
+_cycle_numbers = itertools.count(1)
+
+
+def _lane(video_id: str) -> int:
+    """Номер дорожки (tid) для видео: все этапы одного видео — на одной линии."""
+    digest = hashlib.blake2b(video_id.encode("utf-8"), digest_size=4).digest()
+    return int.from_bytes(digest, "big") & 0x7FFFFFFF
+
+
+class TraceWriter:
+    """Дописывает события в файл из фонового потока, не блокируя event loop."""
+
+    BATCH = 256
+
+    def __init__(self, path: str = TRACE_FILE, max_bytes: int = TRACE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread: threading.Thread | None = None
+        self._start_lock = threading.Lock()
+        self._named_lanes: set = set()
+
+    def emit(self, event: Dict):
+        if self._thread is None:
+            self._start()
+        video_id = event["args"].get("video_id")
+        if video_id and event["tid"] not in self._named_lanes:
+            self._named_lanes.add(event["tid"])
+            self._queue.put({
+                "ph": "M", "name": "thread_name", "pid": event["pid"],
+                "tid": event["tid"], "args": {"name": f"video {video_id}"},
+            })
+        self._queue.put(event)
+
+    def _start(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="trace-writer", daemon=True
+                )
+                self._thread.start()
+                atexit.register(self.close)
+
+    def _run(self):
+        while True:
+            event = self._queue.get()
+            if event is None:
+                return
+            batch = [event]
+            while len(batch) < self.BATCH:
+                try:
+                    event = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if event is None:
+                    self._write(batch)
+                    return
+                batch.append(event)
+            self._write(batch)
+
+    def _write(self, events: List[Dict]):
+        lines = "".join(
+            json.dumps(event, ensure_ascii=False, default=str) + ",\n" for event in events
+        )
+        try:
+            with file_lock(self.path):
+                size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+                if size and size >= self.max_bytes:
+                    os.replace(self.path, f"{self.path}.1")
+                    size = 0
+                with open(self.path, "a", encoding="utf-8") as f:
+                    if not size:
+                        f.write("[\n")
+                    f.write(lines)
+        except OSError as e:
+            logger.warning("Не удалось записать трассу в %s: %s", self.path, e)
+
+    def close(self):
+        """Дописывает накопленные события (при завершении процесса)."""
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join(timeout=5)
+
+
+writer = TraceWriter()
+
+
+def _event(ph: str, name: str, ts: float, args: Dict) -> Dict:
+    video_id = args.get("video_id")
+    return {
+        "ph": ph,
+        "name": name,
+        "cat": name.split(".", 1)[0],
+        "ts": round(ts * 1_000_000),
+        "pid": os.getpid(),
+        "tid": _lane(video_id) if video_id else threading.get_ident() & 0x7FFFFFFF,
+        "args": args,
+    }
+
+
+def _context_args(video_id: str | None, args: Dict) -> Dict:
+    video_id = video_id or _video_id.get()
+    if video_id:
+        args["video_id"] = video_id
+    cycle = _cycle.get()
+    if cycle:
+        args["cycle"] = cycle
+    return args
+
+
+@contextmanager
+def span(name: str, video_id: str | None = None, **args):
+    """
+    Замеряет этап. Внутри блока можно дополнить аргументы события:
+
+        with span("generate.regenerate", video_id=vid) as attrs:
+            attrs["ok"] = result is not None
+    """
+    if not TRACING_ENABLED:
+        yield args
+        return
+    token = _video_id.set(video_id) if video_id else None
+    started = time.time()
+    perf_started = time.perf_counter()
+    try:
+        yield args
+    except BaseException as e:
+        args["error"] = type(e).__name__
+        raise
+    finally:
+        duration = time.perf_counter() - perf_started
+        if token is not None:
+            _video_id.reset(token)
+        event = _event("X", name, started, _context_args(video_id, args))
+        event["dur"] = round(duration * 1_000_000)
+        writer.emit(event)
+
+
+def mark(name: str, video_id: str | None = None, **args):
+    """Мгновенное событие (например, «видео найдено»)."""
+    if TRACING_ENABLED:
+        event = _event("i", name, time.time(), _context_args(video_id, args))
+        event["s"] = "t"
+        writer.emit(event)
+
+
+@contextmanager
+def trace_cycle(kind: str):
+    """Цикл (проверка каналов, разбор очереди): этапы внутри группируются по нему."""
+    cycle_id = f"{kind}-{os.getpid()}-{next(_cycle_numbers)}"
+    token = _cycle.set(cycle_id)
+    try:
+        with span(f"cycle.{kind}") as attrs:
+            yield attrs
+    finally:
+        _cycle.reset(token)
+
+
+# ----------- Отчёт -----------
+
+
+def load_events(path: str = TRACE_FILE) -> List[Dict]:
+    """Читает трассу (в том числе недописанную: без закрывающей скобки)."""
+    events = []
+    for file in (f"{path}.1", path):
+        if not os.path.exists(file):
+            continue
+        with open(file, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip().rstrip(",")
+                if not line or line in ("[", "]"):
+                    continue
+                try:
+                    events.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue  # строка, которую процесс не успел дописать
+    return events
+
+
+def _fmt_ts(ts_us: float) -> str:
+    return datetime.fromtimestamp(ts_us / 1_000_000).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def report_cycles(events: List[Dict], cycles: int = 5, top: int = 5) -> str:
+    spans = [e for e in events if e.get("ph") == "X"]
+    by_cycle: Dict[str, List[Dict]] = defaultdict(list)
+    for event in spans:
+        cycle = event["args"].get("cycle")
+        if cycle:
+            by_cycle[cycle].append(event)
+
+    roots = sorted(
+        (e for e in spans if e["name"].startswith("cycle.") and e["args"].get("cycle")),
+        key=lambda e: e["ts"],
+    )[-cycles:]
+    if not roots:
+        return "Циклов в трассе нет"
+
+    lines = []
+    for root in roots:
+        cycle = root["args"]["cycle"]
+        lines.append(
+            f"{_fmt_ts(root['ts'])}  {cycle}  {root['dur'] / 1e6:.1f} с"
+            + (f"  ⚠️ {root['args']['error']}" if root["args"].get("error") else "")
+        )
+        stages: Dict[str, List[float]] = defaultdict(list)
+        for event in by_cycle[cycle]:
+            if event is not root:
+                stages[event["name"]].append(event["dur"] / 1e6)
+        ranked = sorted(stages.items(), key=lambda item: sum(item[1]), reverse=True)
+        for name, durations in ranked[:top]:
+            lines.append(
+                f"    {name:<32} всего {sum(durations):8.2f} с  "
+                f"x{len(durations):<4} макс {max(durations):.2f} с"
+            )
+        slowest = sorted(
+            (e for e in by_cycle[cycle] if e["args"].get("video_id") and e is not root),
+            key=lambda e: e["dur"],
+            reverse=True,
+        )[:top]
+        if slowest:
+            lines.append("    самые долгие по видео:")
+            for event in slowest:
+                lines.append(
+                    f"      {event['args']['video_id']}  {event['name']:<28} "
+                    f"{event['dur'] / 1e6:.2f} с"
+                )
+    return "\n".join(lines)
+
+
+def report_video(events: List[Dict], video_id: str) -> str:
+    own = sorted(
+        (e for e in events if e.get("args", {}).get("video_id") == video_id),
+        key=lambda e: e["ts"],
+    )
+    if not own:
+        return f"Видео {video_id} в трассе не найдено"
+
+    lines = []
+    published_at = next(
+        (e["args"]["published_at"] for e in own if e["args"].get("published_at")), None
+    )
+    if published_at:
+        uploaded = datetime.fromisoformat(published_at.replace("Z", "+00:00"))
+        first = datetime.fromtimestamp(own[0]["ts"] / 1_000_000, tz=timezone.utc)
+        lines.append(
+            f"Загружено на YouTube: {published_at}; найдено через "
+            f"{(first - uploaded).total_seconds() / 60:.1f} мин"
+        )
+    start = own[0]["ts"]
+    for event in own:
+        offset = (event["ts"] - start) / 1e6
+        duration = f"{event['dur'] / 1e6:8.2f} с" if "dur" in event else "       —  "
+        extra = {
+            k: v for k, v in event["args"].items() if k not in ("video_id", "cycle")
+        }
+        lines.append(
+            f"+{offset:9.1f} с  {duration}  {event['name']:<28} {extra or ''}"
+        )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Отчёт по трассе конвейера")
+    parser.add_argument("--file", default=TRACE_FILE, help="файл трассы")
+    parser.add_argument("--cycles", type=int, default=5, help="сколько последних циклов")
+    parser.add_argument("--top", type=int, default=5, help="сколько этапов на цикл")
+    parser.add_argument("--video", help="показать путь одного видео")
+    args = parser.parse_args()
+
+    events = load_events(args.file)
+    if args.video:
+        print(report_video(events, args.video))
+    else:
+        print(report_cycles(events, args.cycles, args.top))
+
+
+if __name__ == "__main__":
+    main()
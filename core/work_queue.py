@@ -0,0 +1,198 @@
+# core/work_queue.py
+"""
+Надёжная очередь генерации постов (SQLite) между поиском видео и LLM.
+
+- постановка идемпотентна: один video_id попадает в очередь один раз;
+- обработка "как минимум один раз": задача берётся в работу с арендой (lease),
+  и если процесс упал, аренда истекает и задача снова становится доступной;
+- выполненные задачи остаются в таблице со статусом done и больше не выдаются;
+- после WORK_QUEUE_MAX_ATTEMPTS неудач задача уходит в dead-letter и
+  повторяется по расписанию раз в WORK_QUEUE_DEAD_RETRY_HOURS.
+"""
+import time
+from typing import Dict, List
+
+from core.logger import logger
+from core.records import Video, decode_video, encode_video
+from core.sqlite_utils import init_db, sqlite_transaction
+from core.settings import get_config
+
+config = get_config()
+WORK_QUEUE_DB = getattr(config, "work_queue_db", "data/work_queue.sqlite3")
+WORK_QUEUE_MAX_ATTEMPTS = int(getattr(config, "work_queue_max_attempts", 5))
+WORK_QUEUE_RETRY_MINUTES = float(getattr(config, "work_queue_retry_minutes", 10))
+WORK_QUEUE_DEAD_RETRY_HOURS = float(getattr(config, "work_queue_dead_retry_hours", 24))
+WORK_QUEUE_MAX_DEAD_RETRIES = int(getattr(config, "work_queue_max_dead_retries", 3))
+WORK_QUEUE_LEASE_MINUTES = float(getattr(config, "work_queue_lease_minutes", 30))
+
+PENDING = "pending"
+IN_PROGRESS = "in_progress"
+DONE = "done"
+DEAD = "dead"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    video_id        TEXT PRIMARY KEY,
+    payload         TEXT NOT NULL,
+    status          TEXT NOT NULL,
+    attempts        INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL DEFAULT 0,
+    lease_until     REAL,
+    last_error      TEXT,
+    created_at      REAL NOT NULL,
+    updated_at      REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, next_attempt_at);
+"""
+
+
+class GenerationQueue:
+    """Очередь видео на генерацию постов, хранящаяся в SQLite."""
+
+    def __init__(
+        self,
+        path: str = WORK_QUEUE_DB,
+        max_attempts: int = WORK_QUEUE_MAX_ATTEMPTS,
+        lease_seconds: float = WORK_QUEUE_LEASE_MINUTES * 60,
+    ):
+        self.path = path
+        self.max_attempts = max(1, max_attempts)
+        self.lease_seconds = lease_seconds
+
+        init_db(self.path, _SCHEMA)
+
+    def _transaction(self):
+        return sqlite_transaction(self.path)
+
+    # ----------- Producer -----------
+
+    def enqueue_many(self, videos: List[Video]) -> List[Video]:
+        """Ставит видео в очередь; уже известные video_id пропускаются. Возвращает новые."""
+        now = time.time()
+        added = []
+        with self._transaction() as db:
+            for video in videos:
+                cursor = db.execute(
+                    "INSERT OR IGNORE INTO jobs "
+                    "(video_id, payload, status, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (
+                        video.video_id,
+                        encode_video(video),
+                        PENDING,
+                        now,
+                        now,
+                    ),
+                )
+                if cursor.rowcount:
+                    added.append(video)
+        return added
+
+    def enqueue(self, video: Video) -> bool:
+        return bool(self.enqueue_many([video]))
+
+    # ----------- Consumer -----------
+
+    def claim(self, limit: int = 1) -> List[Video]:
+        """
+        Берёт в работу до limit готовых задач: новые, с наступившим временем
+        повтора (включая dead-letter) и с истёкшей арендой.
+        """
+        now = time.time()
+        with self._transaction() as db:
+            rows = db.execute(
+                "SELECT video_id, payload FROM jobs "
+                "WHERE (status IN (?, ?) AND next_attempt_at <= ?) "
+                "   OR (status = ? AND lease_until <= ?) "
+                "ORDER BY next_attempt_at, created_at LIMIT ?",
+                (PENDING, DEAD, now, IN_PROGRESS, now, limit),
+            ).fetchall()
+            for video_id, _ in rows:
+                db.execute(
+                    "UPDATE jobs SET status = ?, lease_until = ?, updated_at = ? "
+                    "WHERE video_id = ?",
+                    (IN_PROGRESS, now + self.lease_seconds, now, video_id),
+                )
+
+        videos = []
+        for video_id, payload in rows:
+            try:
+                videos.append(decode_video(payload))
+            except (ValueError, KeyError) as e:
+                # Битый payload или версия новее нашей (поставил более новый код):
+                # не роняем всю пачку, а отдаём задачу обычным повторам — её
+                # заберёт обновлённый процесс или она уйдёт в dead-letter
+                logger.warning("Не удалось прочитать задачу %s: %s", video_id, e)
+                self.fail(video_id, f"decode: {e}")
+        return videos
+
+    def complete(self, video_id: str):
+        """Отмечает задачу выполненной — повторно она не выдаётся."""
+        now = time.time()
+        with self._transaction() as db:
+            db.execute(
+                "UPDATE jobs SET status = ?, lease_until = NULL, last_error = NULL, "
+                "updated_at = ? WHERE video_id = ?",
+                (DONE, now, video_id),
+            )
+
+    def fail(self, video_id: str, error: str = ""):
+        """
+        Неудачная попытка: повтор с экспоненциальной задержкой, после
+        max_attempts — dead-letter с редкими повторами по расписанию.
+        """
+        now = time.time()
+        with self._transaction() as db:
+            row = db.execute(
+                "SELECT attempts FROM jobs WHERE video_id = ?", (video_id,)
+            ).fetchone()
+            if row is None:
+                return
+            attempts = row[0] + 1
+
+            if attempts < self.max_attempts:
+                status = PENDING
+                delay = WORK_QUEUE_RETRY_MINUTES * 60 * 2 ** (attempts - 1)
+                next_attempt_at = now + delay
+            elif attempts < self.max_attempts + WORK_QUEUE_MAX_DEAD_RETRIES:
+                status = DEAD
+                next_attempt_at = now + WORK_QUEUE_DEAD_RETRY_HOURS * 3600
+            else:
+                # Повторы исчерпаны — остаётся в dead-letter до ручного requeue_dead()
+                status = DEAD
+                next_attempt_at = float("inf")
+
+            db.execute(
+                "UPDATE jobs SET status = ?, attempts = ?, next_attempt_at = ?, "
+                "lease_until = NULL, last_error = ?, updated_at = ? WHERE video_id = ?",
+                (status, attempts, next_attempt_at, error[:1000], now, video_id),
+            )
+
+        if status == DEAD:
+            logger.warning(
+                "Видео %s перемещено в dead-letter после %s попыток: %s",
+                video_id,
+                attempts,
+                error,
+            )
+
+    # ----------- Maintenance -----------
+
+    def requeue_dead(self) -> int:
+        """Возвращает все задачи из dead-letter в очередь с обнулёнными попытками."""
+        now = time.time()
+        with self._transaction() as db:
+            cursor = db.execute(
+                "UPDATE jobs SET status = ?, attempts = 0, next_attempt_at = ?, "
+                "updated_at = ? WHERE status = ?",
+                (PENDING, now, now, DEAD),
+            )
+            return cursor.rowcount
+
+    def stats(self) -> Dict[str, int]:
+        """Количество задач по статусам."""
+        with self._transaction() as db:
+            rows = db.execute(
+                "SELECT status, COUNT(*) FROM jobs GROUP BY status"
+            ).fetchall()
+        return {status: count for status, count in rows}
@@ -0,0 +1,386 @@
+# core/yt_parser/credentials.py
+"""
+Пул учётных данных YouTube Data API: несколько API-ключей и OAuth-токенов.
+
+- у каждого свой дневной бюджет квоты (YOUTUBE_DAILY_QUOTA единиц), расход
+  учитывается по стоимости запросов и сохраняется между запусками;
+- запросы уходят на учётку с наибольшим остатком квоты;
+- quotaExceeded выключает учётку до сброса квоты (полночь по Тихоокеанскому
+  времени), rateLimit/5xx/401 — на CREDENTIAL_COOLDOWN_MINUTES; запрос
+  сразу повторяется на следующей учётке;
+- OAuth-токены обновляются заранее фоновой задачей, а не посреди проверки.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import pickle
+import threading
+import time
+from datetime import datetime
+from typing import TYPE_CHECKING, Callable, Dict, List
+from zoneinfo import ZoneInfo
+
+from core.logger import logger
+from core.metrics import YOUTUBE_API_SECONDS
+from core.tracing import span
+from core.yt_parser.video_storage import load_json, update_json
+from core.settings import get_config
+
+# Библиотеки Google импортируются при первом обращении к API (быстрый старт)
+if TYPE_CHECKING:
+    from googleapiclient.errors import HttpError
+
+config = get_config()
+
+
+def _as_list(value) -> List[str]:
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.split(",")
+    return [item.strip() for item in value if item and item.strip()]
+
+
+# Без явных списков — прежнее поведение: один OAuth-токен или один API-ключ
+YOUTUBE_API_KEYS = _as_list(getattr(config, "youtube_api_keys", "")) or (
+    [] if config.use_oauth else _as_list(config.youtube_api_key)
+)
+YOUTUBE_TOKEN_FILES = _as_list(getattr(config, "youtube_token_files", "")) or (
+    [config.token_file] if config.use_oauth else []
+)
+YOUR_CLIENT_SECRET_FILE = config.youtube_secret_file
+YOUTUBE_DAILY_QUOTA = int(getattr(config, "youtube_daily_quota", 10000))
+CREDENTIAL_STATE_JSON = getattr(
+    config, "credential_state_json", "data/credential_quota.json"
+)
+CREDENTIAL_COOLDOWN_MINUTES = float(getattr(config, "credential_cooldown_minutes", 15))
+OAUTH_REFRESH_MARGIN_MINUTES = float(getattr(config, "oauth_refresh_margin_minutes", 10))
+# Другой адрес API (например, локальная заглушка из simulation/); пусто — googleapis.com
+YOUTUBE_API_ENDPOINT = getattr(config, "youtube_api_endpoint", "")
+
+SCOPES = ["https://www.googleapis.com/auth/youtube.readonly"]
+# Квота YouTube Data API сбрасывается в полночь по Тихоокеанскому времени
+QUOTA_TZ = ZoneInfo("America/Los_Angeles")
+
+QUOTA_REASONS = {"quotaExceeded", "dailyLimitExceeded"}
+RATE_REASONS = {"rateLimitExceeded", "userRateLimitExceeded"}
+
+
+class QuotaExhaustedError(RuntimeError):
+    """Ни у одной учётки не осталось доступной квоты."""
+
+
+def quota_day() -> str:
+    return datetime.now(QUOTA_TZ).date().isoformat()
+
+
+def seconds_until_quota_reset() -> float:
+    now = datetime.now(QUOTA_TZ)
+    midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    return 86400 - (now - midnight).total_seconds()
+
+
+def _error_reason(error: "HttpError") -> str:
+    try:
+        return json.loads(error.content)["error"]["errors"][0]["reason"]
+    except Exception:
+        return ""
+
+
+class Credential:
+    """Одна учётка: API-ключ или OAuth-токен, с учётом квоты и ошибок."""
+
+    def __init__(self, name: str, api_key: str = "", token_file: str = ""):
+        self.name = name  # для логов и трассы; может совпасть у разных учёток
+        self.api_key = api_key
+        self.token_file = token_file
+        # Уникальный ключ учётки (выбор в execute, файл квоты): хэш всего ключа
+        # или полный путь к токену — не последние символы, как в name
+        if token_file:
+            self.id = f"oauth:{os.path.abspath(token_file)}"
+        else:
+            self.id = f"key:{hashlib.sha256(api_key.encode()).hexdigest()[:16]}"
+        self.quota = YOUTUBE_DAILY_QUOTA
+        self.day = quota_day()
+        self.used = 0
+        self.unsaved = 0  # расход, ещё не записанный в CREDENTIAL_STATE_JSON
+        self.disabled_until = 0.0
+        self.errors = 0
+        self._creds = None
+        self._service = None
+        # HTTP-транспорт на поток: httplib2 клиента не потокобезопасен, а запросы
+        # идут и из event loop (проверка каналов), и из потоков (liveness)
+        self._local = threading.local()
+
+    @property
+    def is_oauth(self) -> bool:
+        return bool(self.token_file)
+
+    def roll_day(self):
+        """Обнуляет расход, если наступил новый день квоты."""
+        if self.day != quota_day():
+            self.day, self.used, self.unsaved = quota_day(), 0, 0
+
+    @property
+    def remaining(self) -> int:
+        self.roll_day()
+        return self.quota - self.used
+
+    def available(self, cost: int = 1) -> bool:
+        return time.time() >= self.disabled_until and self.remaining >= cost
+
+    def charge(self, cost: int):
+        self.roll_day()
+        self.used += cost
+        self.unsaved += cost
+
+    def disable(self, seconds: float, reason: str):
+        self.disabled_until = time.time() + seconds
+        logger.warning(
+            "🔑 Учётка YouTube %s отключена на %.0f мин: %s",
+            self.name,
+            seconds / 60,
+            reason,
+        )
+
+    # ----------- Client -----------
+
+    @property
+    def service(self):
+        if self._service is None:
+            self.connect()
+        return self._service
+
+    def connect(self):
+        """
+        Создаёт клиент API (для OAuth — с входом/обновлением токена).
+        Discovery-документ берётся из копии внутри google-api-python-client,
+        без сетевого запроса и без файлового кэша.
+        """
+        from googleapiclient.discovery import build
+
+        if self.is_oauth:
+            auth = {"credentials": self._load_oauth()}
+        else:
+            auth = {"developerKey": self.api_key}
+        if YOUTUBE_API_ENDPOINT:
+            auth["client_options"] = {"api_endpoint": YOUTUBE_API_ENDPOINT}
+        self._service = build(
+            "youtube", "v3", static_discovery=True, cache_discovery=False, **auth
+        )
+
+    def http(self):
+        """Транспорт текущего потока (для OAuth — с авторизацией)."""
+        http = getattr(self._local, "http", None)
+        if http is None:
+            from googleapiclient.http import build_http
+
+            http = build_http()
+            if self.is_oauth:
+                from google_auth_httplib2 import AuthorizedHttp
+
+                http = AuthorizedHttp(self._creds or self._load_oauth(), http=http)
+            self._local.http = http
+        return http
+
+    def _load_oauth(self):
+        from google.auth.transport.requests import Request
+        from google_auth_oauthlib.flow import InstalledAppFlow
+
+        creds = None
+        if os.path.exists(self.token_file):
+            with open(self.token_file, "rb") as token:
+                creds = pickle.load(token)
+
+        if not creds or not creds.valid:
+            if creds and creds.expired and creds.refresh_token:
+                try:
+                    creds.refresh(Request())
+                except Exception:
+                    creds = None
+
+            if not creds:
+                # Интерактивный вход возможен только при старте, не в фоне
+                flow = InstalledAppFlow.from_client_secrets_file(
+                    YOUR_CLIENT_SECRET_FILE, SCOPES
+                )
+                creds = flow.run_local_server(port=0)
+            self._save_oauth(creds)
+
+        self._creds = creds
+        return creds
+
+    def _save_oauth(self, creds):
+        with open(self.token_file, "wb") as token:
+            pickle.dump(creds, token)
+
+    def refresh_if_expiring(self, margin_seconds: float) -> bool:
+        """Обновляет OAuth-токен, если он истекает в ближайшие margin_seconds."""
+        creds = self._creds
+        if not self.is_oauth or creds is None or not creds.refresh_token:
+            return False
+        expiry = creds.expiry  # naive UTC
+        if expiry and (expiry - datetime.utcnow()).total_seconds() > margin_seconds:
+            return False
+        from google.auth.transport.requests import Request
+
+        creds.refresh(Request())
+        self._save_oauth(creds)
+        logger.info("🔑 OAuth-токен %s обновлён заранее", self.name)
+        return True
+
+
+class CredentialPool:
+    """Распределяет запросы YouTube Data API по учёткам с учётом квоты."""
+
+    def __init__(
+        self,
+        api_keys: List[str] = None,
+        token_files: List[str] = None,
+        state_path: str = CREDENTIAL_STATE_JSON,
+    ):
+        api_keys = YOUTUBE_API_KEYS if api_keys is None else api_keys
+        token_files = YOUTUBE_TOKEN_FILES if token_files is None else token_files
+        self.state_path = state_path
+        # Повторы в списках не дают лишних учёток: квота у них общая
+        self.credentials: List[Credential] = [
+            Credential(f"oauth:{os.path.basename(path)}", token_file=path)
+            for path in dict.fromkeys(token_files)
+        ] + [Credential(f"key:…{key[-4:]}", api_key=key) for key in dict.fromkeys(api_keys)]
+        if not self.credentials:
+            raise ValueError("Не задано ни одного API-ключа или OAuth-токена YouTube")
+
+        self._load_state()
+        # OAuth-вход (возможно, интерактивный) — сразу при запуске, а не посреди проверки
+        for credential in self.credentials:
+            if credential.is_oauth:
+                credential.connect()
+        logger.info(
+            "🔑 Пул учёток YouTube: %s (остаток квоты: %s)",
+            len(self.credentials),
+            self.remaining(),
+        )
+
+    # ----------- Requests -----------
+
+    def remaining(self) -> int:
+        return sum(max(0, c.remaining) for c in self.credentials)
+
+    def _pick(self, cost: int, tried: set) -> Credential | None:
+        candidates = [
+            c for c in self.credentials if c.id not in tried and c.available(cost)
+        ]
+        return max(candidates, key=lambda c: c.remaining, default=None)
+
+    def execute(self, make_request: Callable, cost: int = 1):
+        """
+        Выполняет make_request(service).execute() на учётке с наибольшим
+        остатком квоты; при исчерпании квоты или ошибке учётки — на следующей.
+        """
+        from googleapiclient.errors import HttpError
+
+        tried = set()
+        while True:
+            credential = self._pick(cost, tried)
+            if credential is None:
+                self.save_state()
+                raise QuotaExhaustedError(
+                    f"Квота YouTube исчерпана на всех учётках ({len(self.credentials)})"
+                )
+            tried.add(credential.id)
+            request = make_request(credential.service)
+            # methodId уже с префиксом API: "youtube.playlistItems.list" — это и имя
+            # этапа в трассе, и метка method в метриках
+            method = getattr(request, "methodId", "youtube.unknown")
+            started = time.perf_counter()
+            try:
+                with span(method, credential=credential.name):
+                    response = request.execute(http=credential.http())
+            except HttpError as e:
+                YOUTUBE_API_SECONDS.observe(
+                    time.perf_counter() - started, method=method, outcome=f"http_{e.resp.status}"
+                )
+                credential.charge(cost)  # неудачные запросы тоже расходуют квоту
+                if not self._handle_error(credential, e):
+                    raise
+                continue
+            YOUTUBE_API_SECONDS.observe(
+                time.perf_counter() - started, method=method, outcome="ok"
+            )
+            credential.charge(cost)
+            credential.errors = 0
+            return response
+
+    def _handle_error(self, credential: Credential, error: "HttpError") -> bool:
+        """Отключает учётку по ошибке. True — запрос можно повторить на другой."""
+        status = error.resp.status
+        reason = _error_reason(error)
+        if reason in QUOTA_REASONS:
+            credential.used = credential.quota
+            credential.disable(seconds_until_quota_reset(), reason)
+            self.save_state()
+            return True
+        if reason in RATE_REASONS or status in (401, 429) or status >= 500:
+            credential.errors += 1
+            credential.disable(
+                CREDENTIAL_COOLDOWN_MINUTES * 60 * min(credential.errors, 4),
+                reason or f"HTTP {status}",
+            )
+            return True
+        return False
+
+    # ----------- OAuth -----------
+
+    def refresh_expiring(self, margin_seconds: float = OAUTH_REFRESH_MARGIN_MINUTES * 60):
+        for credential in self.credentials:
+            try:
+                credential.refresh_if_expiring(margin_seconds)
+            except Exception as e:
+                credential.disable(CREDENTIAL_COOLDOWN_MINUTES * 60, f"refresh: {e}")
+
+    async def run_refresher(self, interval: float = OAUTH_REFRESH_MARGIN_MINUTES * 30):
+        """Фоновое обновление OAuth-токенов до истечения (раз в половину запаса)."""
+        if not any(c.is_oauth for c in self.credentials):
+            return
+        while True:
+            await asyncio.to_thread(self.refresh_expiring)
+            await asyncio.sleep(interval)
+
+    # ----------- State -----------
+
+    def _load_state(self):
+        data = load_json(self.state_path)
+        if not isinstance(data, dict):
+            return
+        names = [c.name for c in self.credentials]
+        for credential in self.credentials:
+            state = data.get(credential.id)
+            if state is None and names.count(credential.name) == 1:
+                # Файл прежней версии (ключ — name), пока имя однозначно
+                state = data.get(credential.name)
+            if isinstance(state, dict) and state.get("day") == credential.day:
+                credential.used = int(state.get("used", 0))
+                credential.disabled_until = float(state.get("disabled_until", 0))
+
+    def save_state(self):
+        """
+        Дописывает расход квоты в общий файл. Складываются только
+        несохранённые единицы, поэтому несколько процессов не затирают друг друга.
+        """
+
+        def merge(data: Dict):
+            for credential in self.credentials:
+                credential.roll_day()
+                state = data.get(credential.id)
+                if not isinstance(state, dict) or state.get("day") != credential.day:
+                    state = {"day": credential.day, "used": 0, "disabled_until": 0}
+                state["used"] = state.get("used", 0) + credential.unsaved
+                state["disabled_until"] = max(
+                    state.get("disabled_until", 0), credential.disabled_until
+                )
+                credential.used = max(credential.used, state["used"])
+                credential.unsaved = 0
+                data[credential.id] = state
+
+        update_json(self.state_path, merge)
@@ -0,0 +1,171 @@
+# core/yt_parser/dedup.py
+"""
+Поиск почти-дубликатов видео до генерации постов.
+
+Один и тот же трейлер часто выкладывают несколько каналов из channels.json.
+Для каждого видео строится 64-битный SimHash по словам названия и описания,
+а недавние отпечатки хранятся в скользящем индексе (JSON-файл).
+Видео, отпечаток которого отличается от уже известного не более чем на
+DEDUP_MAX_DISTANCE бит, считается дубликатом.
+"""
+import hashlib
+import re
+from datetime import datetime, timezone, timedelta
+from typing import Dict, List, Optional
+
+from core.logger import logger
+from core.records import Post, Video
+from core.yt_parser.video_storage import load_json, update_json
+from core.settings import get_config
+
+config = get_config()
+DEDUP_INDEX_JSON = getattr(config, "dedup_index_json", "data/dedup_index.json")
+DEDUP_WINDOW_HOURS = float(getattr(config, "dedup_window_hours", 72))
+DEDUP_MAX_DISTANCE = int(getattr(config, "dedup_max_distance", 8))
+
+FINGERPRINT_BITS = 64
+TITLE_WEIGHT = 3  # название важнее описания: описания у каналов сильно отличаются
+DESCRIPTION_WORDS = 200  # хвост описания обычно состоит из ссылок и рекламы
+
+_URL_RE = re.compile(r"(?:https?://|www\.)\S+", re.IGNORECASE)
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _words(text: str) -> List[str]:
+    text = _URL_RE.sub(" ", text or "").lower()
+    return [w for w in _WORD_RE.findall(text) if len(w) > 1 or w.isdigit()]
+
+
+def _features(title: str, description: str) -> Dict[str, int]:
+    """Слова и биграммы с весами."""
+    features: Dict[str, int] = {}
+
+    def add(words: List[str], weight: int):
+        for i, word in enumerate(words):
+            features[word] = features.get(word, 0) + weight
+            if i:
+                bigram = f"{words[i - 1]} {word}"
+                features[bigram] = features.get(bigram, 0) + weight
+
+    add(_words(title), TITLE_WEIGHT)
+    add(_words(description)[:DESCRIPTION_WORDS], 1)
+    return features
+
+
+def fingerprint(title: str, description: str) -> int:
+    """Возвращает 64-битный SimHash видео."""
+    vector = [0] * FINGERPRINT_BITS
+    for feature, weight in _features(title, description).items():
+        digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+        h = int.from_bytes(digest, "big")
+        for bit in range(FINGERPRINT_BITS):
+            vector[bit] += weight if h >> bit & 1 else -weight
+
+    result = 0
+    for bit, value in enumerate(vector):
+        if value > 0:
+            result |= 1 << bit
+    return result
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+class DuplicateIndex:
+    """
+    Скользящий индекс отпечатков недавних видео.
+
+    Запись: {"fp": "<hex>", "video_id": ..., "channel_id": ..., "added_at": ISO}.
+    Записи старше window_hours отбрасываются при загрузке и сохранении.
+    """
+
+    def __init__(
+        self,
+        path: str = DEDUP_INDEX_JSON,
+        window_hours: float = DEDUP_WINDOW_HOURS,
+        max_distance: int = DEDUP_MAX_DISTANCE,
+    ):
+        self.path = path
+        self.window = timedelta(hours=window_hours)
+        self.max_distance = max_distance
+        self.entries: List[Dict] = []
+        self.load()
+
+    def load(self):
+        data = load_json(self.path)
+        entries = data.get("entries", []) if isinstance(data, dict) else []
+        self.entries = [e for e in entries if isinstance(e, dict) and "fp" in e]
+        self.prune()
+
+    def save(self):
+        # Объединяем с записями других процессов-генераторов, а не затираем их
+        def merge(data):
+            known = {e.get("video_id") for e in self.entries}
+            for entry in data.get("entries", []):
+                if not isinstance(entry, dict) or "fp" not in entry:
+                    continue
+                if entry.get("video_id") not in known:
+                    self.entries.append(entry)
+            self.prune()
+            data["entries"] = self.entries
+
+        update_json(self.path, merge)
+
+    def prune(self):
+        border = datetime.now(timezone.utc) - self.window
+        kept = []
+        for entry in self.entries:
+            try:
+                added_at = datetime.fromisoformat(entry["added_at"])
+            except Exception:
+                continue
+            if added_at >= border:
+                kept.append(entry)
+        self.entries = kept
+
+    def find(self, fp: int, exclude_video_id: str | None = None) -> Optional[Dict]:
+        """Ближайшая запись в пределах max_distance или None."""
+        best, best_distance = None, self.max_distance + 1
+        for entry in self.entries:
+            if entry.get("video_id") == exclude_video_id:
+                continue
+            distance = hamming_distance(fp, int(entry["fp"], 16))
+            if distance < best_distance:
+                best, best_distance = entry, distance
+        if best is not None:
+            logger.debug(
+                "Найден дубликат %s (расстояние %s бит)", best["video_id"], best_distance
+            )
+        return best
+
+    def add(self, fp: int, video_id: str, channel_id: str = ""):
+        self.entries.append(
+            {
+                "fp": f"{fp:016x}",
+                "video_id": video_id,
+                "channel_id": channel_id,
+                "added_at": datetime.now(timezone.utc).isoformat(),
+            }
+        )
+
+
+def add_alt_source(post: Post, video: Video) -> bool:
+    """
+    Добавляет видео-дубликат в список альтернативных источников поста.
+    Возвращает False, если источник уже был добавлен.
+    """
+    if post.alt_sources is None:
+        post.alt_sources = []
+    if video.video_id == post.video_id or any(
+        s.get("videoId") == video.video_id for s in post.alt_sources
+    ):
+        return False
+    post.alt_sources.append(
+        {
+            "videoId": video.video_id,
+            "channel_name": video.channel_name,
+            "url": video.url,
+        }
+    )
+    return True
@@ -0,0 +1,210 @@
+# core/yt_parser/liveness.py
+"""
+Фоновая проверка, что видео постов на модерации ещё доступны на YouTube.
+
+Пост может неделями лежать в pending_posts.json, а видео за это время —
+стать приватным или удалиться. Вскоре после старта и затем раз в
+LIVENESS_SWEEP_HOURS ID постов в статусе pending проверяются пачками по 50
+(videos.list, 1 единица квоты на пачку) — не больше LIVENESS_QUOTA_BUDGET
+единиц за проход. Время проверки хранится в посте (checked_at), поэтому
+переживает перезапуск: первыми проверяются давно не проверявшиеся посты,
+а проверенные меньше периода назад пропускаются. При маленьком бюджете все
+посты всё равно обходятся за несколько проходов.
+
+Проход выполняет один процесс: при DETECTOR_SHARDING — детектор, который
+держит аренду ведущего шарда (см. ShardCoordinator.is_leader).
+
+Недоступные посты помечаются статусом unavailable (LIVENESS_ACTION=mark:
+/moderate их не показывает, одобрить их нельзя) или удаляются (remove).
+"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List
+
+from core.logger import logger
+from core.metrics import LIVENESS_CHECKS_TOTAL
+from core.records import STATUS_PENDING, STATUS_UNAVAILABLE, Post
+from core.thumbnails import thumbnail_cache
+from core.tracing import span
+from core.yt_parser.credentials import CredentialPool, QuotaExhaustedError
+from core.yt_parser.video_storage import load_posts, update_posts
+from core.settings import LIVENESS_ACTIONS, get_config
+
+config = get_config()
+PENDING_POSTS_JSON = config.pending_posts_json
+# Период проверки (ч); 0 — проверка выключена
+LIVENESS_SWEEP_HOURS = float(getattr(config, "liveness_sweep_hours", 6))
+# Сколько единиц квоты (запросов videos.list) можно потратить за один проход
+LIVENESS_QUOTA_BUDGET = int(getattr(config, "liveness_quota_budget", 20))
+# mark — пометить пост недоступным, remove — удалить его из очереди модерации
+LIVENESS_ACTION = getattr(config, "liveness_action", "mark")
+
+# Максимум ID в одном запросе videos.list
+BATCH_SIZE = 50
+# Первый проход — вскоре после старта, а не через целый период
+FIRST_SWEEP_DELAY_SECONDS = 60
+# uploadStatus, при которых видео уже не посмотреть
+GONE_UPLOAD_STATUSES = frozenset({"deleted", "failed", "rejected"})
+
+
+def unavailable_reason(status: Dict | None) -> str | None:
+    """Причина недоступности по части status из videos.list; None — видео доступно."""
+    if status is None:
+        return "deleted"  # API не вернул видео: удалено или скрыто владельцем
+    if status.get("privacyStatus") == "private":
+        return "private"
+    upload_status = status.get("uploadStatus")
+    if upload_status in GONE_UPLOAD_STATUSES:
+        return upload_status
+    return None
+
+
+class LivenessSweeper:
+    """Периодически сверяет посты на модерации с YouTube."""
+
+    def __init__(
+        self,
+        credentials: CredentialPool,
+        path: str = PENDING_POSTS_JSON,
+        should_run: Callable[[], bool] | None = None,
+    ):
+        if LIVENESS_ACTION not in LIVENESS_ACTIONS:
+            raise ValueError(
+                f"LIVENESS_ACTION должен быть одним из {LIVENESS_ACTIONS}, а не {LIVENESS_ACTION!r}"
+            )
+        self.credentials = credentials
+        self.path = path
+        # Несколько детекторов: проход выполняет только тот, для кого это True
+        self.should_run = should_run
+
+    @staticmethod
+    def _candidates(posts: List[Post], checked_before: str = "") -> List[str]:
+        """
+        ID постов в статусе pending, проверенных раньше checked_before:
+        сначала непроверенные, затем самые давние.
+        """
+        pending = sorted(
+            (p for p in posts if p.status == STATUS_PENDING and p.video_id),
+            key=lambda p: p.checked_at,
+        )
+        return list(
+            dict.fromkeys(
+                p.video_id for p in pending if not checked_before or p.checked_at < checked_before
+            )
+        )
+
+    def _check_batch(self, video_ids: List[str]) -> Dict[str, str]:
+        """Один запрос videos.list; возвращает {videoId: причина} для недоступных."""
+        response = self.credentials.execute(
+            lambda youtube: youtube.videos().list(
+                part="status", id=",".join(video_ids), maxResults=len(video_ids)
+            )
+        )
+        statuses = {item["id"]: item.get("status", {}) for item in response.get("items", [])}
+        gone = {}
+        for video_id in video_ids:
+            reason = unavailable_reason(statuses.get(video_id))
+            if reason:
+                gone[video_id] = reason
+        return gone
+
+    async def sweep(
+        self, budget: int = LIVENESS_QUOTA_BUDGET, min_age_hours: float = 0
+    ) -> Dict[str, str]:
+        """
+        Один проход в пределах budget единиц квоты; посты, проверенные меньше
+        min_age_hours назад, пропускаются. Возвращает {videoId: причина}.
+        """
+        checked_before = ""
+        if min_age_hours > 0:
+            checked_before = (datetime.now(timezone.utc) - timedelta(hours=min_age_hours)).isoformat()
+        with span("liveness.sweep") as attrs:
+            posts = await asyncio.to_thread(load_posts, self.path)
+            video_ids = self._candidates(posts, checked_before)
+            gone: Dict[str, str] = {}
+            checked_ids: List[str] = []
+            for start in range(0, min(len(video_ids), budget * BATCH_SIZE), BATCH_SIZE):
+                batch = video_ids[start:start + BATCH_SIZE]
+                try:
+                    # Запрос блокирующий — в потоке; транспорт у каждого потока
+                    # свой (Credential.http), так что с проверкой каналов не конфликтует
+                    gone.update(await asyncio.to_thread(self._check_batch, batch))
+                except QuotaExhaustedError as e:
+                    logger.warning("Проверка доступности видео прервана: %s", e)
+                    break
+                except Exception as e:
+                    logger.error("Ошибка проверки доступности видео: %s", e)
+                    break
+                checked_ids.extend(batch)
+
+            checked = len(checked_ids)
+            LIVENESS_CHECKS_TOTAL.inc(checked - len(gone), result="available")
+            for reason in gone.values():
+                LIVENESS_CHECKS_TOTAL.inc(result=reason)
+            attrs.update(checked=checked, unavailable=len(gone))
+
+            if checked_ids:
+                checked_at = datetime.now(timezone.utc).isoformat()
+                await asyncio.to_thread(
+                    update_posts,
+                    lambda posts: self._apply(posts, gone, set(checked_ids), checked_at),
+                    self.path,
+                )
+            # Недоступные посты уже не опубликуют — их превью не нужны
+            await thumbnail_cache.forget(*gone)
+            logger.info(
+                "🩺 Проверено видео на модерации: %s из %s, недоступно: %s",
+                checked,
+                len(video_ids),
+                len(gone),
+            )
+            return gone
+
+    @staticmethod
+    def _apply(posts: List[Post], gone: Dict[str, str], checked: set, checked_at: str):
+        """
+        Запоминает время проверки и помечает или удаляет недоступные посты
+        (под блокировкой файла).
+        """
+        kept = []
+        for post in posts:
+            # Пост могли одобрить, пока шла проверка, — его не трогаем
+            if post.status != STATUS_PENDING:
+                kept.append(post)
+                continue
+            if post.video_id in checked:
+                post.checked_at = checked_at
+            reason = gone.get(post.video_id)
+            if reason is None:
+                kept.append(post)
+                continue
+            logger.info(
+                "🚫 Видео '%s' недоступно на YouTube (%s): пост %s",
+                post.title,
+                reason,
+                "удалён" if LIVENESS_ACTION == "remove" else "помечен",
+                extra={"video_id": post.video_id},
+            )
+            if LIVENESS_ACTION != "remove":
+                post.status = STATUS_UNAVAILABLE
+                kept.append(post)
+        posts[:] = kept
+
+    async def run(self):
+        """
+        Фоновый цикл: первый проход через FIRST_SWEEP_DELAY_SECONDS после
+        старта, затем раз в LIVENESS_SWEEP_HOURS. Посты, проверенные меньше
+        периода назад (например, до перезапуска), пропускаются.
+        """
+        if LIVENESS_SWEEP_HOURS <= 0:
+            return
+        delay = FIRST_SWEEP_DELAY_SECONDS
+        while True:
+            await asyncio.sleep(delay)
+            delay = LIVENESS_SWEEP_HOURS * 3600
+            if self.should_run and not self.should_run():
+                continue
+            try:
+                await self.sweep(min_age_hours=LIVENESS_SWEEP_HOURS)
+            except Exception as e:
+                logger.error("Ошибка проверки доступности видео: %s", e, exc_info=True)
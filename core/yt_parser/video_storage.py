@@ -1,26 +1,117 @@
 import json
-from config import Config
+import os
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, List
+
+from core.settings import get_config
 from core.logger import logger
+from core.records import Post, decode_posts, encode_posts
+
+try:  # межпроцессная блокировка (Unix)
+    import fcntl
+except ImportError:  # Windows: только блокировка внутри процесса
+    fcntl = None
 
 
-config = Config()
+config = get_config()
 LAST_VIDEO_JSON = config.last_video_json
 PENDING_POSTS_JSON = config.pending_posts_json
 
+_thread_lock = threading.RLock()
+
+
+@contextmanager
+def file_lock(path):
+    """
+    Эксклюзивная блокировка JSON-файла на время чтения-изменения-записи.
+    Нужна, когда бот, детектор и генератор работают разными процессами.
+    """
+    with _thread_lock:
+        if fcntl is None:
+            yield
+            return
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(f"{path}.lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
 def load_json(path):
     try:
         with open(path, "r", encoding="utf-8") as f:
             return json.load(f)
     except FileNotFoundError:
-        logger.info(f"{path} не найден, создаю новый.")
+        logger.info("%s не найден, создаю новый.", path)
         return {}
     except Exception as e:
-        logger.error(f"Ошибка загрузки {path}: {e}")
+        logger.error("Ошибка загрузки %s: %s", path, e)
         return {}
 
+def _write_atomic(path, text: str):
+    # Пишем во временный файл и подменяем: другой процесс не увидит файл наполовину
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
 def save_json(path, data):
     try:
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        _write_atomic(path, json.dumps(data, ensure_ascii=False, indent=2))
     except Exception as e:
-        logger.error(f"Ошибка сохранения {path}: {e}")
+        logger.error("Ошибка сохранения %s: %s", path, e)
+
+def update_json(path, mutate: Callable[[Any], Any], default_factory=dict):
+    """
+    Атомарно (под file_lock) читает JSON, применяет mutate(data) и сохраняет.
+    mutate меняет data на месте; его результат возвращается вызывающему.
+    Если в файле данные не того типа, вместо них берётся default_factory().
+    """
+    with file_lock(path):
+        data = load_json(path)
+        if not isinstance(data, type(default_factory())):
+            data = default_factory()
+        result = mutate(data)
+        save_json(path, data)
+        return result
+
+
+# ----------- Посты (pending_posts.json) -----------
+
+def load_posts(path=PENDING_POSTS_JSON) -> List[Post]:
+    """Посты на модерации; при ошибке чтения — пустой список (с записью в лог)."""
+    try:
+        return decode_posts(load_json(path))
+    except ValueError as e:
+        logger.error("Ошибка разбора %s: %s", path, e)
+        return []
+
+def save_posts(posts: List[Post], path=PENDING_POSTS_JSON):
+    """Ошибка записи уходит вызывающему: он не должен считать пост сохранённым."""
+    _write_atomic(path, encode_posts(posts))
+
+def _load_posts_for_update(path) -> List[Post]:
+    # В отличие от load_json, битый файл — ошибка, а не пустой список:
+    # иначе следующая запись затёрла бы всю очередь модерации
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return []
+    return decode_posts(data)
+
+def update_posts(mutate: Callable[[List[Post]], Any], path=PENDING_POSTS_JSON):
+    """
+    Как update_json, но над списком Post. Файл, который не удалось прочитать
+    (битый JSON или более новая версия схемы), не перезаписывается: ошибка
+    (OSError / ValueError) уходит вызывающему, как и ошибка записи.
+    """
+    with file_lock(path):
+        posts = _load_posts_for_update(path)
+        result = mutate(posts)
+        save_posts(posts, path)
+        return result
@@ -1,131 +1,428 @@
 # core/yt_parser/youtube_checker.py
 import asyncio
 from datetime import datetime, timezone
+from typing import Callable, List
 
 from core.logger import logger
+from core.metrics import CYCLE_SECONDS, register_readiness_check, registry
 from core.yt_parser.ytube_parser import YouTubeParser
 from core.llm.prompts import generate_post_prompt, generate_genre_prompt
 from core.llm.chatgpt import generate_post, generate_genre
-from core.yt_parser.video_storage import load_json, save_json
+from core.llm.retry import REGEN_POLICY, call_with_retry, llm_deadline
+from core.yt_parser.video_storage import load_posts, update_posts
+from core.records import Post, Video
+from core.yt_parser.liveness import LivenessSweeper
+from core.yt_parser.dedup import DuplicateIndex, fingerprint, add_alt_source
 from core.tag_validator import is_only_allowed_tags, clean_html_for_telegram
-from config import Config
+from core.work_queue import GenerationQueue
+from core.thumbnails import thumbnail_cache
+from core.tracing import mark, span, trace_cycle
+from core.sharding import DETECTOR_SHARDING, ShardCoordinator
+from core.settings import config_watcher, get_config
 
-config = Config()
-CHECK_INTERVAL_HOURS = config.check_interval_hours
+config = get_config()
 PENDING_POSTS_JSON = config.pending_posts_json
+GENERATION_BATCH_SIZE = int(getattr(config, "generation_batch_size", 5))
+# Как часто отдельный процесс-генератор проверяет очередь (сек)
+GENERATOR_POLL_SECONDS = float(getattr(config, "generator_poll_seconds", 30))
+# После стольких неудачных проверок подряд /readyz отвечает 503
+MAX_DETECT_FAILURES = 3
 
 
 class YouTubeChecker:
     """Полный цикл проверки YouTube → генерация постов → очередь модерации → публикация"""
 
     def __init__(self):
-        self.parser = YouTubeParser()
+        self._parser = None
+        self.dedup_index = DuplicateIndex()
+        self.queue = GenerationQueue()
+        # Несколько детекторов делят каналы по шардам (см. core/sharding.py)
+        self.shards = ShardCoordinator() if DETECTOR_SHARDING else None
+        # Новые каналы из channels.json, ещё не проверенные (см. _on_channels_change)
+        self._new_channel_ids: set = set()
+        self._wakeup = asyncio.Event()
+        self._detect_failures = 0  # неудачных проверок каналов подряд
+        # Подписчики на появление поста в очереди модерации: callback(post)
+        self._post_callbacks: List[Callable] = []
+        config_watcher.subscribe_config(self._on_config_change)
+        config_watcher.subscribe_channels(self._on_channels_change)
+        self._register_metrics()
+
+    def subscribe_posts(self, callback: Callable):
+        """callback(post) вызывается, когда пост дописан в pending_posts.json."""
+        self._post_callbacks.append(callback)
+
+    @property
+    def parser(self) -> YouTubeParser:
+        """Клиент YouTube создаётся при первой проверке: генератору он не нужен."""
+        if self._parser is None:
+            self._parser = YouTubeParser()
+        return self._parser
 
     async def check_and_generate_posts(self):
         """Проверка каналов YouTube и генерация постов"""
-        posts_added_count = 0
+        with CYCLE_SECONDS.time(stage="full"):
+            await self.detect_new_videos()
+            await self.process_queue()
+
+    async def detect_new_videos(self, channel_ids: set | None = None) -> int:
+        """
+        Находит новые видео и надёжно ставит их в очередь генерации.
+        channel_ids ограничивает проверку этими каналами (например, только что добавленными).
+        """
+        with trace_cycle("detect") as cycle:
+            cycle["added"] = added = await self._detect_and_enqueue(channel_ids)
+        return added
 
+    async def _detect_and_enqueue(self, channel_ids: set | None) -> int:
+        """Один проход поиска; возвращает число новых задач в очереди."""
         try:
-            new_videos = self.parser.check_for_new_videos()
+            with CYCLE_SECONDS.time(stage="detect"):
+                if self.shards:
+                    await asyncio.to_thread(self.shards.refresh)
+                new_videos = self.parser.check_for_new_videos(
+                    self._channel_filter(channel_ids)
+                )
         except Exception as e:
-            logger.error(f"Ошибка при проверке новых видео: {e}", exc_info=True)
-            return
+            self._detect_failures += 1
+            logger.error("Ошибка при проверке новых видео: %s", e, exc_info=True)
+            return 0
+        self._detect_failures = 0
 
         if not new_videos:
             logger.info("Новых видео не найдено.")
+            return 0
+
+        added = await asyncio.to_thread(self.queue.enqueue_many, new_videos)
+        for video in new_videos:
+            mark("queue.enqueued", video.video_id)
+        # Прогресс по каналам сохраняем только после того, как видео уже в очереди
+        await asyncio.to_thread(self.parser.save_last_videos)
+        # Превью качаем параллельно с генерацией текста — только для новых задач:
+        # у уже обработанных видео превью забыто после публикации или удаления
+        thumbnail_cache.schedule_prefetch(added)
+        logger.info("📥 В очередь генерации добавлено новых видео: %s", len(added))
+        return len(added)
+
+    async def process_queue(self):
+        """Генерирует посты для всех готовых задач очереди."""
+        jobs = await asyncio.to_thread(self.queue.claim, GENERATION_BATCH_SIZE)
+        # Генератор в отдельном процессе опрашивает очередь часто — не шумим в лог
+        if not jobs:
             return
 
-        pending_posts = await asyncio.to_thread(load_json, PENDING_POSTS_JSON)
-        if not isinstance(pending_posts, list):
-            pending_posts = []
+        posts_added_count = 0
+        claimed_count = 0
+        started = asyncio.get_running_loop().time()
+        with trace_cycle("generate") as cycle:
+            while jobs:
+                claimed_count += len(jobs)
+                for video in jobs:
+                    if await self._process_video(video):
+                        posts_added_count += 1
+                jobs = await asyncio.to_thread(self.queue.claim, GENERATION_BATCH_SIZE)
+            cycle.update(claimed=claimed_count, added=posts_added_count)
 
-        for video in new_videos:
+        CYCLE_SECONDS.observe(asyncio.get_running_loop().time() - started, stage="generate")
+        await asyncio.to_thread(self.dedup_index.save)
+        stats = await asyncio.to_thread(self.queue.stats)
+        logger.info("✅ Всего новых постов на модерацию: %s. Очередь: %s", posts_added_count, stats)
+
+    async def _process_video(self, video: Video) -> bool:
+        """
+        Обрабатывает одну задачу очереди. Пост сохраняется в pending_posts.json
+        до отметки задачи выполненной, поэтому после падения задача
+        повторится, но пост не задублируется.
+        Возвращает True, если добавлен новый пост.
+        """
+        video_id = video.video_id
+        log_extra = {"video_id": video_id, "channel_id": video.channel_id}
+        with span("generate.video", video_id=video_id, channel_id=video.channel_id):
             try:
-                posts_added_count += 1
+                # Читаем очередь модерации заново: модератор мог изменить её
+                pending_posts = await self._load_pending_posts()
+
+                # Пост уже сохранён (процесс упал до отметки задачи) — просто закрываем
+                if any(p.video_id == video_id for p in pending_posts):
+                    await asyncio.to_thread(self.queue.complete, video_id)
+                    return False
+
+                # Дубликаты (тот же трейлер с другого канала) не отправляем в LLM
+                fp = fingerprint(video.title, video.description)
+                collapsed = await asyncio.to_thread(
+                    update_posts,
+                    lambda posts: self._collapse_duplicate(video, fp, posts),
+                    PENDING_POSTS_JSON,
+                )
+                if collapsed:
+                    await asyncio.to_thread(self.queue.complete, video_id)
+                    return False
 
                 # Генерация текста поста
-                post_prompt = generate_post_prompt(video["title"], video["description"])
+                post_prompt = generate_post_prompt(video.title, video.description)
                 genre_prompt = generate_genre_prompt(
-                    video["title"],
-                    video["description", f"https://youtu.be/{video['videoId']}"],
+                    video.title,
+                    video.description,
+                    f"https://youtu.be/{video_id}",
                 )
 
-                generated_post = await self._regenerate_until_valid(
-                    generate_post, post_prompt, 5
-                )
+                # Общий дедлайн на все LLM-вызовы по этому видео
+                with llm_deadline():
+                    generated_post = await self._regenerate_until_valid(
+                        generate_post, post_prompt
+                    )
+
+                    if generated_post is None:
+                        logger.error(
+                            "Не удалось сгенерировать пост без запрещённых тегов для видео '%s'. Повторю позже.",
+                            video.title,
+                            extra=log_extra,
+                        )
+                        await asyncio.to_thread(
+                            self.queue.fail, video_id, "generation failed"
+                        )
+                        return False
 
-                if generated_post is None:
+                    generated_post = clean_html_for_telegram(generated_post)
+
+                    genre = await self._regenerate_until_valid(
+                        generate_genre, genre_prompt
+                    )
+                if genre is None:
+                    # Задача повторится по расписанию очереди (и уйдёт в dead-letter)
                     logger.error(
-                        f"Не удалось сгенерировать пост без запрещённых тегов для видео '{video['title']}'. Пропускаю это видео."
+                        "Не удалось определить жанр для видео '%s'. Повторю позже.",
+                        video.title,
+                        extra=log_extra,
                     )
-                    continue
-
-                generated_post = clean_html_for_telegram(generated_post)
+                    await asyncio.to_thread(self.queue.fail, video_id, "genre generation failed")
+                    return False
+                genre = clean_html_for_telegram(genre)
 
-                genre = await self._regenerate_until_valid(
-                    generate_genre, genre_prompt, 5
+                post = Post(
+                    video_id=video_id,
+                    channel_name=video.channel_name,
+                    title=video.title,
+                    description=video.description,
+                    thumbnail_url=video.thumbnail,
+                    generated_post=generated_post,
+                    genre=genre,
+                    created_at=datetime.now(timezone.utc).isoformat(),
                 )
-                # Проверка на разрешённые теги generated_post
-                if genre is not None:
-                    genre = clean_html_for_telegram(genre)
-                else:
-                    genre = ""
-
-                pending_posts.append(
-                    {
-                        "videoId": video["video_id"],
-                        "channel_name": video["channel_name"],
-                        "title": video["title"],
-                        "description": video["description"],
-                        "thumbnail_url": video["thumbnail"],
-                        "generated_post": generated_post,
-                        "genre": genre,
-                        "status": "pending",
-                        "created_at": datetime.now(timezone.utc).isoformat(),
-                    }
+                # Бот может менять файл в другом процессе — дописываем под блокировкой
+                await asyncio.to_thread(
+                    update_posts, lambda posts: posts.append(post), PENDING_POSTS_JSON
                 )
+                await asyncio.to_thread(self.queue.complete, video_id)
+                mark("post.ready", video_id)
+                self._notify_post(post)
+
+                self.dedup_index.add(fp, video_id, video.channel_id)
 
                 logger.info(
-                    f"💾 Пост для видео '{video['title']}' добавлен на модерацию"
+                    "💾 Пост для видео '%s' добавлен на модерацию", video.title, extra=log_extra
                 )
+                return True
 
             except Exception as llm_error:
                 logger.error(
-                    f"Ошибка генерации поста для {video['title']}: {llm_error}",
+                    "Ошибка генерации поста для %s: %s",
+                    video.title,
+                    llm_error,
                     exc_info=True,
+                    extra=log_extra,
                 )
+                await asyncio.to_thread(self.queue.fail, video_id, str(llm_error))
+                return False
+
+    def _notify_post(self, post: Post):
+        for callback in self._post_callbacks:
+            try:
+                callback(post)
+            except Exception as e:
+                logger.error("Ошибка в подписчике на новые посты: %s", e, exc_info=True)
+
+    @staticmethod
+    async def _load_pending_posts() -> List[Post]:
+        return await asyncio.to_thread(load_posts, PENDING_POSTS_JSON)
+
+    def _collapse_duplicate(self, video: Video, fp: int, pending_posts: List[Post]) -> bool:
+        """
+        Если видео — почти-дубликат недавнего, добавляет его как альтернативный
+        источник к существующему посту. Возвращает True, если видео обработано.
+        """
+        original = self.dedup_index.find(fp, exclude_video_id=video.video_id)
+        if original is None:
+            return False
+
+        for post in pending_posts:
+            if post.video_id == original["video_id"]:
+                if add_alt_source(post, video):
+                    logger.info(
+                        "🔁 Видео '%s' (%s) — дубликат %s, добавлено как альтернативный источник",
+                        video.title,
+                        video.channel_name,
+                        original["video_id"],
+                        extra={"video_id": video.video_id, "channel_id": video.channel_id},
+                    )
+                return True
+
+        # Оригинал уже прошёл модерацию — повторно не генерируем
+        logger.info(
+            "🔁 Видео '%s' — дубликат уже обработанного %s, пропускаю",
+            video.title,
+            original["video_id"],
+            extra={"video_id": video.video_id, "channel_id": video.channel_id},
+        )
+        return True
+
+    # ----------- Метрики -----------
+
+    def _register_metrics(self):
+        """Глубина очередей считается при каждом запросе /metrics."""
+        registry.gauge(
+            "generation_queue_jobs",
+            "Задачи очереди генерации по статусам",
+            labels=("status",),
+            collect=lambda: {(status,): count for status, count in self.queue.stats().items()},
+        )
+        registry.gauge(
+            "pending_posts",
+            "Посты, ожидающие модерации",
+            collect=lambda: {(): len(load_posts(PENDING_POSTS_JSON))},
+        )
+        register_readiness_check(
+            "generation_queue", lambda: self.queue.stats() is not None
+        )
+
+    def _detector_ready(self) -> bool:
+        return self._detect_failures < MAX_DETECT_FAILURES
+
+    def _channel_filter(self, channel_ids: set | None):
+        if channel_ids is None:
+            return self.shards.holds if self.shards else None
+        shards = self.shards
+
+        def holds(channel_id):
+            return channel_id in channel_ids and (not shards or shards.holds(channel_id))
+
+        return holds
+
+    # ----------- Горячая перезагрузка настроек -----------
+
+    def _on_config_change(self, old, new):
+        if old.check_interval_hours != new.check_interval_hours:
+            logger.info(
+                "⏳ Интервал проверки изменён: %s → %s ч",
+                old.check_interval_hours,
+                new.check_interval_hours,
+            )
+            self._wakeup.set()
+
+    def _on_channels_change(self, channels, added, removed):
+        if self._parser is not None:
+            self.parser.apply_channels(channels, added, removed)
+        removed_ids = {c["id"] for c in removed}
+        self._new_channel_ids -= removed_ids
+        if added:
+            # Новые каналы проверяем сразу, не дожидаясь следующего цикла
+            self._new_channel_ids.update(c["id"] for c in added)
+            self._wakeup.set()
+
+    async def _run_schedule(self, cycle, process_queue: bool):
+        """
+        Цикл по расписанию: полный проход раз в CHECK_INTERVAL_HOURS (значение
+        читается заново, поэтому его можно менять на лету), а добавленные в
+        channels.json каналы проверяются сразу.
+        """
+        last_run = None
+        while True:
+            self._wakeup.clear()
+            interval = float(get_config().check_interval_hours) * 3600
+            now = asyncio.get_running_loop().time()
+
+            if last_run is None or now - last_run >= interval:
+                self._new_channel_ids.clear()
+                await cycle()
+                last_run = asyncio.get_running_loop().time()
+                hours = get_config().check_interval_hours
+                logger.info("⏳ Следующая проверка через %s часа(ов)...", hours)
+            elif self._new_channel_ids:
+                channel_ids, self._new_channel_ids = self._new_channel_ids, set()
+                logger.info("🆕 Проверка новых каналов: %s", len(channel_ids))
+                await self.detect_new_videos(channel_ids)
+                if process_queue:
+                    await self.process_queue()
                 continue
 
-        await asyncio.to_thread(save_json, PENDING_POSTS_JSON, pending_posts)
-        logger.info(f"✅ Всего новых постов на модерацию: {posts_added_count}")
+            delay = max(0.0, last_run + interval - asyncio.get_running_loop().time())
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def _liveness_sweeper(self) -> LivenessSweeper:
+        """Проверка доступности видео: при шардировании — только у ведущего детектора."""
+        return LivenessSweeper(
+            self.parser.credentials,
+            should_run=self.shards.is_leader if self.shards else None,
+        )
 
     async def start_periodic_check(self):
         """Фоновый цикл периодической проверки"""
-        while True:
-            await self.check_and_generate_posts()
-            logger.info(
-                f"⏳ Следующая проверка через {CHECK_INTERVAL_HOURS} часа(ов)..."
-            )
-            await asyncio.sleep(CHECK_INTERVAL_HOURS * 3600)
+        register_readiness_check("youtube_detector", self._detector_ready)
+        refresher = asyncio.create_task(self.parser.credentials.run_refresher())
+        liveness = asyncio.create_task(self._liveness_sweeper().run())
+        try:
+            await self._run_schedule(self.check_and_generate_posts, process_queue=True)
+        finally:
+            refresher.cancel()
+            liveness.cancel()
 
-    async def _regenerate_until_valid(self, prompt_func, prompt, attempts=5):
-        """Пытается сгенерировать контент до attempts раз, пока не пройдут проверку тегов."""
+    async def start_detector_loop(self):
+        """Отдельный процесс-детектор: только ищет новые видео и ставит их в очередь."""
+        register_readiness_check("youtube_detector", self._detector_ready)
+        heartbeat = asyncio.create_task(self._shard_heartbeat()) if self.shards else None
+        refresher = asyncio.create_task(self.parser.credentials.run_refresher())
+        liveness = asyncio.create_task(self._liveness_sweeper().run())
+        try:
+            await self._run_schedule(self.detect_new_videos, process_queue=False)
+        finally:
+            refresher.cancel()
+            liveness.cancel()
+            if heartbeat:
+                heartbeat.cancel()
+                await asyncio.to_thread(self.shards.leave)
 
-        # Первая попытка (внешняя)
-        content = await prompt_func(prompt)
-        if is_only_allowed_tags(content):
-            return content
+    async def _shard_heartbeat(self):
+        """Продлевает аренду шардов между проверками и подхватывает ребалансировку."""
+        while True:
+            try:
+                await asyncio.to_thread(self.shards.refresh)
+            except Exception as e:
+                logger.error("Ошибка обновления аренды шардов: %s", e)
+            await asyncio.sleep(self.shards.lease_seconds / 3)
 
-        # Цикл регенерации
-        for i in range(attempts):
+    async def start_generator_loop(self):
+        """Отдельный процесс-генератор: разбирает очередь, которую наполняет детектор."""
+        while True:
             try:
-                content = await prompt_func(prompt)
-                if is_only_allowed_tags(content):
-                    return content
+                await self.process_queue()
             except Exception as e:
-                logger.warning(f"Ошибка LLM при регенерации ({i+1}/{attempts}): {e}")
-                await asyncio.sleep(1)
+                logger.error("Ошибка обработки очереди генерации: %s", e, exc_info=True)
+            await asyncio.sleep(GENERATOR_POLL_SECONDS)
 
-        # Если все попытки провалены, возвращаем None
-        logger.error(f"Провал генерации контента после {attempts + 1} попыток.")
-        return None
+    async def _regenerate_until_valid(self, prompt_func, prompt, policy=REGEN_POLICY):
+        """Генерирует контент, пока он не пройдёт проверку тегов (по политике повторов)."""
+        with span("generate.regenerate", step=prompt_func.__name__) as attrs:
+            content = await call_with_retry(
+                lambda: prompt_func(prompt),
+                policy=policy,
+                # Пустой ответ (None — провайдер не ответил) тоже повод повторить
+                is_valid=lambda text: bool(text) and is_only_allowed_tags(text),
+                description="Регенерация контента",
+            )
+            attrs["ok"] = content is not None
+        if content is None:
+            logger.error("Провал генерации контента после %s попыток.", policy.max_attempts)
+        return content
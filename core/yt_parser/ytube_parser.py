@@ -4,27 +4,20 @@ import json
 from datetime import datetime, timezone, timedelta
 from typing import List, Dict
 
-from googleapiclient.discovery import build
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-import pickle
-
 from core.logger import logger
-from core.yt_parser.video_storage import load_json, save_json
-from config import Config
-
-config = Config()
+from core.yt_parser.video_storage import load_json, save_json, update_json
+from core.thumbnails import pick_best_thumbnail
+from core.records import Video
+from core.yt_parser.credentials import CredentialPool, QuotaExhaustedError
+from core.tracing import mark, span
+from core.settings import config_watcher, get_config
 
-YOUTUBE_API_KEY = config.youtube_api_key
-YOUR_CLIENT_SECRET_FILE = config.youtube_secret_file
-TOKEN_FILE = config.token_file
-USE_OAUTH = config.use_oauth
+config = get_config()
 
 START_DATE = datetime.fromisoformat(config.start_date).replace(tzinfo=timezone.utc)
 START_DAY_BEGIN = START_DATE.replace(hour=0, minute=0, second=0, microsecond=0)
 START_DAY_END = START_DATE.replace(hour=23, minute=59, second=59, microsecond=999999)
 
-CHANNELS_JSON = config.channels_json
 LAST_VIDEO_JSON = config.last_video_json
 DELETED_VIDS_JSON = getattr(config, "deleted_videos_json", "deleted_videos.json")
 
@@ -48,7 +41,7 @@ def parse_yt_datetime(dt: str) -> datetime:
         # Пытаемся распарсить дату
         return datetime.fromisoformat(dt.replace("Z", "+00:00"))
     except Exception as e:
-        logger.error(f"Ошибка обработки YouTube datetime string '{dt}': {e}")
+        logger.error("Ошибка обработки YouTube datetime string '%s': %s", dt, e)
 
         # Возвращаем "безопасное" значение, которое гарантированно будет отфильтровано
         # (дата за 5 дней до начала целевого дня)
@@ -62,55 +55,26 @@ class YouTubeParser:
     def __init__(self):
         os.makedirs("data", exist_ok=True)
 
-        self.youtube = self._get_youtube_service()
-        self.channels = self._load_channels()
+        self.credentials = CredentialPool()
+        self.channels = config_watcher.load_channels()
+        # channel_id -> uploads playlist id (never changes for a channel)
+        self._uploads_playlists: Dict[str, str] = {}
         self.last_videos = self._load_last_videos()
+        # Progress found by the last check, not yet persisted
+        self._progress: Dict[str, str] = {}
         self.deleted_videos = load_deleted_list()
 
-    # ----------- API Init -----------
-
-    def _get_youtube_service(self):
-        if USE_OAUTH:
-            logger.info("Using OAuth YouTube authentication...")
-            return self._get_youtube_service_oauth()
-        else:
-            logger.info("Using API Key YouTube authentication...")
-            return build("youtube", "v3", developerKey=YOUTUBE_API_KEY)
-
-    def _get_youtube_service_oauth(self):
-        scopes = ["https://www.googleapis.com/auth/youtube.readonly"]
-        creds = None
-
-        if os.path.exists(TOKEN_FILE):
-            with open(TOKEN_FILE, "rb") as token:
-                creds = pickle.load(token)
-
-        if not creds or not creds.valid:
-            if creds and creds.expired and creds.refresh_token:
-                try:
-                    creds.refresh(Request())
-                except Exception:
-                    creds = None
-
-            if not creds:
-                flow = InstalledAppFlow.from_client_secrets_file(
-                    YOUR_CLIENT_SECRET_FILE, scopes
-                )
-                creds = flow.run_local_server(port=0)
-
-            with open(TOKEN_FILE, "wb") as token:
-                pickle.dump(creds, token)
-
-        return build("youtube", "v3", credentials=creds)
-
     # ----------- Loaders -----------
 
-    def _load_channels(self) -> List[Dict]:
-        if not os.path.exists(CHANNELS_JSON):
-            logger.error(f"Channels JSON not found: {CHANNELS_JSON}")
-            return []
-        with open(CHANNELS_JSON, "r", encoding="utf-8") as f:
-            return json.load(f)
+    def apply_channels(self, channels: List[Dict], added: List[Dict], removed: List[Dict]):
+        """
+        Swap in a new (already validated) channel list without restart.
+        Cached data of removed channels is dropped; their progress is kept
+        in last_video_ids.json in case they come back.
+        """
+        self.channels = channels
+        for channel in removed:
+            self._uploads_playlists.pop(channel["id"], None)
 
     def _load_last_videos(self) -> Dict[str, str]:
         if os.path.exists(LAST_VIDEO_JSON):
@@ -118,18 +82,35 @@ class YouTubeParser:
                 return json.load(f)
         return {}
 
-    def _save_last_videos(self):
-        save_json(LAST_VIDEO_JSON, self.last_videos)
+    def save_last_videos(self):
+        """
+        Persist per-channel progress. Call only after the found videos are safely queued.
+        Only channels checked by this process are written, so detectors
+        sharing the file do not overwrite each other's progress.
+        """
+        progress, self._progress = self._progress, {}
+        update_json(LAST_VIDEO_JSON, lambda data: data.update(progress))
 
     # ----------- API Requests -----------
 
     def _get_uploads_playlist_id(self, channel_id: str) -> str | None:
+        cached = self._uploads_playlists.get(channel_id)
+        if cached:
+            return cached
         try:
-            request = self.youtube.channels().list(part="contentDetails", id=channel_id)
-            response = request.execute()
-            return response["items"][0]["contentDetails"]["relatedPlaylists"]["uploads"]
+            response = self.credentials.execute(
+                lambda youtube: youtube.channels().list(part="contentDetails", id=channel_id)
+            )
+            playlist_id = response["items"][0]["contentDetails"]["relatedPlaylists"]["uploads"]
+            self._uploads_playlists[channel_id] = playlist_id
+            return playlist_id
+        except QuotaExhaustedError:
+            raise
         except Exception as e:
-            logger.error(f"Ошибка получения плейлиста загрузок для {channel_id}: {e}")
+            logger.error(
+                "Ошибка получения плейлиста загрузок для %s: %s", channel_id, e,
+                extra={"channel_id": channel_id},
+            )
             return None
 
     def _get_channel_videos_paged(self, channel_id: str) -> List[Dict]:
@@ -142,13 +123,14 @@ class YouTubeParser:
 
         while True:
             try:
-                request = self.youtube.playlistItems().list(
-                    part="snippet",
-                    playlistId=playlist_id,
-                    maxResults=50,
-                    pageToken=next_page_token,
+                response = self.credentials.execute(
+                    lambda youtube: youtube.playlistItems().list(
+                        part="snippet",
+                        playlistId=playlist_id,
+                        maxResults=50,
+                        pageToken=next_page_token,
+                    )
                 )
-                response = request.execute()
 
                 # --- Логика остановки ---
                 for item in response.get("items", []):
@@ -158,7 +140,10 @@ class YouTubeParser:
                     # видео нам тоже не нужны. Завершаем цикл.
                     if pub_date < START_DAY_BEGIN:
                         logger.info(
-                            f"Остановка: достигнуто видео от {pub_date.date()}, более старое, чем {START_DAY_BEGIN.date()}"
+                            "Остановка: достигнуто видео от %s, более старое, чем %s",
+                            pub_date.date(),
+                            START_DAY_BEGIN.date(),
+                            extra={"channel_id": channel_id},
                         )
                         return all_raw_videos
 
@@ -169,9 +154,15 @@ class YouTubeParser:
                 if not next_page_token:
                     break
 
+            except QuotaExhaustedError:
+                raise
             except Exception as e:
                 logger.error(
-                    f"Ошибка загрузки видео из плейлиста {playlist_id} канала {channel_id}: {e}"
+                    "Ошибка загрузки видео из плейлиста %s канала %s: %s",
+                    playlist_id,
+                    channel_id,
+                    e,
+                    extra={"channel_id": channel_id},
                 )
                 break
 
@@ -179,65 +170,92 @@ class YouTubeParser:
 
     # ----------- Main Logic -----------
 
-    def check_for_new_videos(self) -> List[Dict]:
+    def check_for_new_videos(self, holds_channel=None) -> List[Video]:
         """
         Returns ONLY videos published on START_DATE between 00:00–23:59:59 UTC,
         excluding deleted ones and previously processed ones.
-        """
-        logger.info(
-            f"🔍 Checking for videos published on {START_DATE.date()} "
-            f"from {START_DAY_BEGIN} to {START_DAY_END}"
-        )
-
-        new_videos = []
-
-        for channel in self.channels:
-            channel_id = channel["id"]
-            channel_name = channel["name"]
-            logger.info(f"Checking channel: {channel_id} ({channel_name})")
+        Progress is updated in memory only; persist it with save_last_videos().
 
-            videos = self._get_channel_videos_paged(channel_id)
-
-            # Сортируем (если API не гарантирует порядок)
-            videos.sort(key=lambda x: x["snippet"]["publishedAt"], reverse=True)
-            found_videos_for_channel = []
-
-            for video in videos:
-                vid = video["snippet"]["resourceId"]["videoId"]
-
-                # Skip deleted
-                if vid in self.deleted_videos:
-                    continue
-
-                # Skip already processed
-                if vid == self.last_videos.get(channel_id):
+        holds_channel(channel_id) -> bool limits the check to channels owned by
+        this worker (see core.sharding); by default every channel is checked.
+        """
+        with span("detect.check_for_new_videos") as attrs:
+            # Another detector may have advanced progress for channels we just took over
+            self.last_videos = self._load_last_videos()
+            logger.info(
+                "🔍 Checking for videos published on %s from %s to %s",
+                START_DATE.date(),
+                START_DAY_BEGIN,
+                START_DAY_END,
+            )
+
+            new_videos = []
+
+            for channel in self.channels:
+                channel_id = channel["id"]
+                channel_name = channel["name"]
+                if holds_channel is not None and not holds_channel(channel_id):
                     continue
+                logger.info(
+                    "Checking channel: %s (%s)", channel_id, channel_name,
+                    extra={"channel_id": channel_id},
+                )
 
-                snippet = video["snippet"]
-                pub = parse_yt_datetime(snippet["publishedAt"])
-
-                if not (START_DAY_BEGIN <= pub <= START_DAY_END):
-                    continue
+                try:
+                    with span("detect.channel", channel_id=channel_id) as channel_attrs:
+                        videos = self._get_channel_videos_paged(channel_id)
+                        channel_attrs["videos"] = len(videos)
+                except QuotaExhaustedError as e:
+                    # Progress of unchecked channels is untouched: they are retried next cycle
+                    logger.warning("Stopping the check early: %s", e)
+                    break
 
-                video_data = {
-                    "channel_id": channel_id,
-                    "channel_name": channel_name,
-                    "video_id": vid,
-                    "title": snippet["title"],
-                    "description": snippet.get("description", ""),
-                    "thumbnail": snippet["thumbnails"]["high"]["url"],
-                    "published_at": snippet["publishedAt"],
-                    "url": f"https://www.youtube.com/watch?v={vid}",
-                }
-
-                new_videos.append(video_data)
-                found_videos_for_channel.append(video_data)
-
-            if found_videos_for_channel:
-                # Так как список отсортирован по дате (newest-first), элемент [0] — это самый новый
-                self.last_videos[channel_id] = found_videos_for_channel[0]["video_id"]
-
-        self._save_last_videos()
-        logger.info(f"✅ Found {len(new_videos)} videos matching date filter.")
+                # Сортируем (если API не гарантирует порядок)
+                videos.sort(key=lambda x: x["snippet"]["publishedAt"], reverse=True)
+                found_videos_for_channel = []
+
+                for video in videos:
+                    vid = video["snippet"]["resourceId"]["videoId"]
+
+                    # Skip deleted
+                    if vid in self.deleted_videos:
+                        continue
+
+                    # Skip already processed
+                    if vid == self.last_videos.get(channel_id):
+                        continue
+
+                    snippet = video["snippet"]
+                    pub = parse_yt_datetime(snippet["publishedAt"])
+
+                    if not (START_DAY_BEGIN <= pub <= START_DAY_END):
+                        continue
+
+                    video_data = Video(
+                        video_id=vid,
+                        channel_id=channel_id,
+                        channel_name=channel_name,
+                        title=snippet["title"],
+                        description=snippet.get("description", ""),
+                        thumbnail=pick_best_thumbnail(snippet.get("thumbnails", {})),
+                        published_at=snippet["publishedAt"],
+                    )
+
+                    new_videos.append(video_data)
+                    mark("detect.found", vid, published_at=snippet["publishedAt"])
+                    found_videos_for_channel.append(video_data)
+
+                if found_videos_for_channel:
+                    # Так как список отсортирован по дате (newest-first), элемент [0] — это самый новый
+                    self.last_videos[channel_id] = found_videos_for_channel[0].video_id
+                    self._progress[channel_id] = self.last_videos[channel_id]
+
+            self.credentials.save_state()
+            logger.info(
+                "✅ Found %s videos matching date filter. YouTube quota left: %s",
+                len(new_videos),
+                self.credentials.remaining(),
+            )
+            attrs["found"] = len(new_videos)
 
         return new_videos
@@ -0,0 +1,183 @@
+# fuzz/__main__.py
+"""
+Проверка свойств очистки HTML для Telegram на корпусе и случайных входах.
+
+    python -m fuzz                      # корпус + 5000 случайных текстов
+    python -m fuzz --iterations 200000 --seed 7
+    python -m fuzz --captions 2000      # ещё и подписи build_post_caption (нужен aiogram)
+
+Свойства:
+- sanitize_caption(text, limit) всегда проходит is_valid_telegram_html(…, limit);
+- clean_html_for_telegram(text) — корректная разметка без ограничения длины;
+- build_post_caption(post) всегда укладывается в CAPTION_LIMIT, не
+  прибегая к запасной подписи (метрика tag_validation_failures_total{check="caption"}).
+
+Корпус (fuzz/corpus.json) — известные трудные случаи: незакрытые теги,
+одиночные '&'/'<', комментарии, сущности, эмодзи из суррогатных пар на
+границе обрезки. Случайные тексты собираются из тех же фрагментов и
+обрезков корпуса. Код выхода 1, если хотя бы одно свойство нарушено.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+from typing import Callable, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus.json")
+
+# Фрагменты случайных текстов
+FRAGMENTS = (
+    "<b>", "</b>", "<i>", "</i>", "<strong>", "</strong>", "<em>", "</em>",
+    "<a href='https://x'>", "</a>", "<p>", "</p>", "<br>", "<br/>", "<B>", "</ b>",
+    "<b class=x>", "<!--", "-->", "<!-- c -->", "<script>", "</script>",
+    "&amp;", "&lt;", "&gt;", "&quot;", "&nbsp;", "&#128512;", "&#x1F600;", "&#0;",
+    "&bogus;", "&#;", "&", "<", ">", "<3", "</>", "<>",
+    "😀", "🇷🇺", "👨‍👩‍👧", "е́", "ё", "é", "中",
+    " ", "  ", "\n", " \n ", "\t", "слово", "word", ".",
+)
+MAX_FRAGMENTS = 200
+
+
+def load_corpus() -> List[str]:
+    with open(CORPUS, "r", encoding="utf-8") as f:
+        return [item["text"] for item in json.load(f)]
+
+
+def random_text(rng: random.Random, corpus: List[str]) -> str:
+    parts = []
+    for _ in range(rng.randint(0, MAX_FRAGMENTS)):
+        if rng.random() < 0.1:
+            # Обрезок случайного места корпуса: режет теги и сущности посередине
+            source = rng.choice(corpus)
+            start = rng.randint(0, len(source))
+            parts.append(source[start:start + rng.randint(0, 40)])
+        else:
+            parts.append(rng.choice(FRAGMENTS))
+    return "".join(parts)
+
+
+def limits_for(text: str, rng: random.Random) -> List[int]:
+    """Лимиты: крайние, CAPTION_LIMIT, случайные и вокруг видимой длины (точка обрезки)."""
+    from core.tag_validator import CAPTION_LIMIT, visible_length
+
+    length = visible_length(text)
+    limits = {1, 2, 3, CAPTION_LIMIT, rng.randint(1, 80)}
+    limits.update(n for n in range(length - 3, length + 2) if n >= 1)
+    return sorted(limits)
+
+
+class Checker:
+    def __init__(self):
+        self.checks = 0
+        self.failures = []
+
+    def expect(self, ok: bool, prop: str, text: str, detail: str = ""):
+        self.checks += 1
+        if not ok:
+            self.failures.append((prop, text, detail))
+
+    def run_safely(self, prop: str, text: str, check: Callable[[], None]):
+        try:
+            check()
+        except Exception as e:
+            self.checks += 1
+            self.failures.append((prop, text, f"{type(e).__name__}: {e}"))
+
+
+def check_text(checker: Checker, text: str, rng: random.Random):
+    from core.tag_validator import clean_html_for_telegram, is_valid_telegram_html, sanitize_caption
+
+    def run():
+        cleaned = clean_html_for_telegram(text)
+        checker.expect(is_valid_telegram_html(cleaned), "clean_html", text, cleaned)
+        for limit in limits_for(text, rng):
+            result = sanitize_caption(text, limit)
+            checker.expect(
+                is_valid_telegram_html(result, limit), f"sanitize_caption[{limit}]", text, result
+            )
+
+    checker.run_safely("sanitize", text, run)
+
+
+def check_captions(checker: Checker, rng: random.Random, corpus: List[str], count: int):
+    from bot.handlers import build_post_caption
+    from core.metrics import TAG_VALIDATION_FAILURES
+    from core.records import STATUS_PENDING, STATUS_UNAVAILABLE, Post
+    from core.tag_validator import CAPTION_LIMIT, CAPTION_TAGS, is_valid_telegram_html
+
+    def field(limit: int) -> str:
+        text = random_text(rng, corpus) if rng.random() < 0.5 else rng.choice(corpus)
+        return text * rng.randint(1, limit)
+
+    for _ in range(count):
+        post = Post(
+            video_id=rng.choice(("abc123", "a'b<c>&", "")),
+            channel_name=field(5),
+            title=field(2),
+            generated_post=field(10),
+            genre=field(5),
+            status=rng.choice((STATUS_PENDING, STATUS_UNAVAILABLE)),
+            alt_sources=[
+                {"videoId": f"v{i}'\"", "channel_name": field(2)}
+                for i in range(rng.choice((0, 1, 5, 40)))
+            ]
+            or None,
+        )
+        for with_sources in (False, True):
+            prop = f"build_post_caption[with_sources={with_sources}]"
+
+            def run():
+                fallbacks = TAG_VALIDATION_FAILURES.value(check="caption")
+                caption = build_post_caption(post, with_sources=with_sources)
+                checker.expect(
+                    is_valid_telegram_html(caption, CAPTION_LIMIT, CAPTION_TAGS), prop, repr(post), caption
+                )
+                checker.expect(
+                    TAG_VALIDATION_FAILURES.value(check="caption") == fallbacks,
+                    f"{prop}: запасная подпись",
+                    repr(post),
+                    caption,
+                )
+
+            checker.run_safely(prop, repr(post), run)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Фаззинг очистки HTML для Telegram")
+    parser.add_argument("--iterations", type=int, default=5000, help="случайных текстов")
+    parser.add_argument("--captions", type=int, default=0, help="случайных подписей build_post_caption")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    sys.path.insert(0, ROOT)
+    import core.tracing
+
+    core.tracing.TRACING_ENABLED = False
+
+    rng = random.Random(args.seed)
+    corpus = load_corpus()
+    checker = Checker()
+    for text in corpus:
+        check_text(checker, text, rng)
+    for _ in range(args.iterations):
+        check_text(checker, random_text(rng, corpus), rng)
+    if args.captions:
+        try:
+            check_captions(checker, rng, corpus, args.captions)
+        except ImportError as e:
+            print(f"Подписи пропущены: {e}")
+
+    print(f"Корпус: {len(corpus)}, случайных текстов: {args.iterations}, проверок: {checker.checks}")
+    if not checker.failures:
+        print("✅ Все свойства выполняются")
+        return
+    print(f"❌ Нарушений: {len(checker.failures)}")
+    for prop, text, detail in checker.failures[:10]:
+        print(f"\n  {prop}\n    вход:      {text[:300]!r}\n    результат: {detail[:300]!r}")
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,40 @@
 # main.py
+import argparse
 import asyncio
+import secrets
 import sys
 import signal
-from bot.bot_main import dp, bot
-from core.logger import logger
-from config import Config
+from core.logger import Logger, logger
+from core.metrics import metrics_port_for, metrics_server, register_readiness_check
+from core.loop_watchdog import loop_watchdog
+from core.settings import config_watcher, get_config
 from core.yt_parser.youtube_checker import YouTubeChecker
+from core.thumbnails import thumbnail_cache
+
+# aiogram и модули бота импортируются только в процессах с ботом (см. ReleaseTrackerApp)
 
 # Параметры из конфигурации
-config = Config()
-CHECK_INTERVAL_HOURS = config.check_interval_hours
+config = get_config()
+
+# Webhook (по умолчанию — polling)
+USE_WEBHOOK = getattr(config, "use_webhook", False)
+WEBHOOK_BASE_URL = getattr(config, "webhook_base_url", "")
+WEBHOOK_PATH = getattr(config, "webhook_path", "/telegram/webhook")
+WEBHOOK_SECRET = getattr(config, "webhook_secret", "")
+WEBHOOK_HOST = getattr(config, "webhook_host", "0.0.0.0")
+WEBHOOK_PORT = int(getattr(config, "webhook_port", 8080))
+# Сколько одновременных соединений Telegram открывает к webhook (1–100)
+WEBHOOK_MAX_CONNECTIONS = int(getattr(config, "webhook_max_connections", 40))
+
+# Роли процесса: все компоненты вместе (по умолчанию) или по отдельности.
+# Детектор и генератор общаются через очередь генерации в SQLite (WORK_QUEUE_DB),
+# генератор и бот — через pending_posts.json с файловой блокировкой.
+ROLE_ALL = "all"
+ROLE_BOT = "bot"
+ROLE_DETECTOR = "detector"
+ROLE_GENERATOR = "generator"
+ROLES = (ROLE_ALL, ROLE_BOT, ROLE_DETECTOR, ROLE_GENERATOR)
+APP_ROLE = getattr(config, "app_role", ROLE_ALL)
 
 
 class ReleaseTrackerApp:
@@ -19,28 +44,108 @@ class ReleaseTrackerApp:
     Обеспечивает устойчивость и корректное завершение.
     """
 
-    def __init__(self):
-        self.bot = bot
-        self.dp = dp
+    def __init__(self, role: str = ROLE_ALL):
+        if role not in ROLES:
+            raise ValueError(f"Неизвестная роль '{role}', ожидается одна из {ROLES}")
+        self.role = role
+        # У каждой роли свой файл лога: ротация общего файла теряет чужие записи
+        Logger().set_role(role)
+        self.bot = None
+        self.dp = None
+        if self.runs_bot:
+            from bot.bot_main import dp, bot
+
+            self.bot = bot
+            self.dp = dp
+            dp.startup.register(self._on_bot_started)
+            dp.shutdown.register(self._on_bot_stopped)
         self._stopping = False
-        self._periodic_task = None  # фоновая проверка каналов
-        self.checker = YouTubeChecker()
+        self._bot_running = False  # dispatcher принимает обновления (для /readyz)
+        self._periodic_task = None  # фоновая проверка каналов / генерация
+        self._send_task = None  # очередь исходящих сообщений
+        self._watch_task = None  # горячая перезагрузка .env и channels.json
+        self._webhook_runner = None  # aiohttp-сервер в режиме webhook
+        self._webhook_stopped = asyncio.Event()
+        # Процессу только с ботом клиент YouTube не нужен
+        self.checker = YouTubeChecker() if role != ROLE_BOT else None
+
+    @property
+    def runs_bot(self) -> bool:
+        return self.role in (ROLE_ALL, ROLE_BOT)
+
+    async def _on_bot_started(self, *_, **__):
+        self._bot_running = True
+
+    async def _on_bot_stopped(self, *_, **__):
+        self._bot_running = False
+
+    def _register_readiness(self):
+        if self.checker:
+            register_readiness_check(
+                "background",
+                lambda: self._periodic_task is not None and not self._periodic_task.done(),
+            )
+        if self.runs_bot:
+            register_readiness_check("telegram_bot", lambda: self._bot_running)
+            register_readiness_check(
+                "send_queue", lambda: self._send_task is not None and not self._send_task.done()
+            )
+
+    def _background_loop(self):
+        if self.role == ROLE_DETECTOR:
+            return self.checker.start_detector_loop()
+        if self.role == ROLE_GENERATOR:
+            return self.checker.start_generator_loop()
+        return self.checker.start_periodic_check()
 
     async def start(self):
-        """Запуск бота и фонового парсера"""
-        logger.info("🚀 Запуск Release Tracker...")
+        """Запуск бота и фонового парсера (в зависимости от роли)"""
+        logger.info("🚀 Запуск Release Tracker (роль: %s)...", self.role)
 
-        # Запуск фоновой проверки каналов
-        if not self._periodic_task:
+        if not self._watch_task:
+            self._watch_task = asyncio.create_task(config_watcher.run())
+
+        # /metrics, /healthz, /readyz
+        self._register_readiness()
+        metrics_server.port = metrics_port_for(self.role)
+        await metrics_server.start()
+        # Задержка event loop и стеки блокирующих вызовов
+        loop_watchdog.start()
+
+        # Запуск фоновой проверки каналов / генерации
+        if self.checker and not self._periodic_task:
             logger.info("🔎 Запуск фоновой проверки каналов...")
-            self._periodic_task = asyncio.create_task(
-                self.checker.start_periodic_check()
-            )
+            self._periodic_task = asyncio.create_task(self._background_loop())
+
+        if not self.runs_bot:
+            try:
+                await self._periodic_task
+            except asyncio.CancelledError:
+                pass
+            return
+
+        from bot.send_queue import send_queue
+
+        # Запуск очереди исходящих сообщений
+        if not self._send_task:
+            self._send_task = asyncio.create_task(send_queue.run(self.bot))
 
         # Запуск Telegram-бота
         await self.run_bot()
 
     async def run_bot(self):
+        """Запуск Telegram-бота: webhook, если он включён, иначе polling"""
+        if USE_WEBHOOK:
+            try:
+                await self.run_webhook()
+                return
+            except Exception as e:
+                logger.error("Не удалось запустить webhook: %s", e, exc_info=True)
+                await self._stop_webhook()
+                logger.info("Переход на polling...")
+        await self.run_polling()
+
+    async def run_polling(self):
         """Запуск Telegram-бота с авто-перезапуском"""
         while not self._stopping:
             try:
@@ -52,16 +157,71 @@ class ReleaseTrackerApp:
                     allowed_updates=self.dp.resolve_used_update_types(),
                 )
             except Exception as e:
-                logger.error(f"Ошибка в Telegram-боте: {e}", exc_info=True)
+                logger.error("Ошибка в Telegram-боте: %s", e, exc_info=True)
                 logger.info("Перезапуск бота через 5 секунд...")
                 await asyncio.sleep(5)
 
+    async def run_webhook(self):
+        """
+        Приём обновлений через webhook (aiohttp-сервер).
+        Запросы без правильного X-Telegram-Bot-Api-Secret-Token отклоняются.
+        """
+        from aiohttp import web
+        from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+        if not WEBHOOK_BASE_URL:
+            raise ValueError("WEBHOOK_BASE_URL не задан")
+        secret_token = WEBHOOK_SECRET or secrets.token_urlsafe(32)
+
+        app = web.Application()
+        SimpleRequestHandler(
+            dispatcher=self.dp,
+            bot=self.bot,
+            secret_token=secret_token,
+            handle_in_background=True,
+        ).register(app, path=WEBHOOK_PATH)
+        setup_application(app, self.dp, bot=self.bot)
+
+        self._webhook_runner = web.AppRunner(app)
+        await self._webhook_runner.setup()
+        await web.TCPSite(self._webhook_runner, WEBHOOK_HOST, WEBHOOK_PORT).start()
+        logger.info("🌐 Webhook-сервер слушает %s:%s%s", WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PATH)
+
+        await self.bot.set_webhook(
+            url=f"{WEBHOOK_BASE_URL.rstrip('/')}{WEBHOOK_PATH}",
+            secret_token=secret_token,
+            allowed_updates=self.dp.resolve_used_update_types(),
+            drop_pending_updates=True,
+            max_connections=WEBHOOK_MAX_CONNECTIONS,
+        )
+        logger.info("🤖 Telegram-бот запущен в режиме webhook")
+
+        await self._webhook_stopped.wait()
+
+    async def _stop_webhook(self):
+        """Снимает webhook и останавливает aiohttp-сервер"""
+        if not self._webhook_runner:
+            return
+        try:
+            await self.bot.delete_webhook()
+        except Exception as e:
+            logger.warning("Не удалось снять webhook: %s", e)
+        await self._webhook_runner.cleanup()
+        self._webhook_runner = None
+        self._webhook_stopped.set()
+
     async def stop(self, *_):
         """Корректное завершение работы приложения"""
         self._stopping = True
         logger.info("🛑 Остановка Release Tracker...")
 
-        await self.dp.stop()
+        if self._webhook_runner:
+            await self._stop_webhook()
+        elif self.runs_bot and self._bot_running:
+            await self.dp.stop_polling()
+
+        if self._watch_task:
+            self._watch_task.cancel()
 
         # Отмена фонового таска
         if self._periodic_task:
@@ -71,16 +231,50 @@ class ReleaseTrackerApp:
             except asyncio.CancelledError:
                 logger.info("Фоновая проверка каналов остановлена.")
 
-        # Закрытие сессий и хранилищ бота
-        await self.bot.session.close()
-        await self.dp.storage.close()
+        if self._send_task:
+            from bot.send_queue import send_queue
+
+            self._send_task.cancel()
+            try:
+                await self._send_task
+            except asyncio.CancelledError:
+                logger.info(
+                    "Очередь отправки остановлена (не отправлено: %s).",
+                    send_queue.depth(),
+                )
+
+        thumbnail_cache.close()
+        loop_watchdog.stop()
+        await metrics_server.stop()
+
+        if self.runs_bot:
+            from bot.jobs import job_runner
+
+            # Незавершённые фоновые задачи модерации
+            await job_runner.shutdown()
+
+            # Закрытие сессий и хранилищ бота
+            await self.bot.session.close()
+            await self.dp.storage.close()
         logger.info("✅ Завершение работы.")
         sys.exit(0)
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Release Tracker")
+    parser.add_argument(
+        "--role",
+        choices=ROLES,
+        default=APP_ROLE,
+        help="какие компоненты запускать в этом процессе (по умолчанию все)",
+    )
+    return parser.parse_args()
+
+
 async def main():
     """Точка входа"""
-    app = ReleaseTrackerApp()
+    args = parse_args()
+    app = ReleaseTrackerApp(role=args.role)
 
     # Обработка сигналов остановки (только Unix)
     loop = asyncio.get_running_loop()
@@ -0,0 +1,132 @@
+# simulation/__main__.py
+"""
+Сквозная нагрузочная симуляция на локальных заглушках.
+
+    python -m simulation --channels 2000 --videos 500 --duration 600
+    python -m simulation --llm-failure-rate 0.3 --youtube-quota-error-rate 0.05
+    python -m simulation --set llm_rate_per_minute=120 --json report.json
+
+Приложение запускается целиком (детектор, генерация, бот, очередь
+отправки); реальные YouTube, LLM и Telegram не используются. В отчёте —
+пропускная способность, p50/p99 задержки от загрузки видео до модерации и
+публикации, число вызовов API на видео.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _range(value: str) -> tuple:
+    """"0.5-2" -> (0.5, 2.0); одно число — фиксированная задержка."""
+    low, _, high = value.partition("-")
+    return float(low), float(high or low)
+
+
+def _override(value: str) -> tuple:
+    key, sep, setting = value.partition("=")
+    if not sep:
+        raise argparse.ArgumentTypeError("ожидается KEY=VALUE")
+    return key.strip().lower(), setting
+
+
+def _seconds(value) -> str:
+    return "—" if value is None else f"{value:.1f} с"
+
+
+def print_report(report: dict):
+    print(f"\nСимуляция: {report['channels']} каналов, {report['elapsed_s']} с")
+    print(
+        f"  загружено {report['uploaded']}, готово к модерации "
+        f"{report['ready_for_moderation']}, опубликовано {report['published']}"
+    )
+    throughput = report["throughput_per_min"]
+    print(f"  пропускная способность: {throughput['ready']} готовых / {throughput['published']} опубликованных в минуту")
+    print("\nЗадержка от загрузки видео:")
+    for name, title in (
+        ("upload_to_moderation", "до очереди модерации"),
+        ("upload_to_shown", "до показа модератору"),
+        ("upload_to_published", "до публикации"),
+    ):
+        stats = report["latency"][name]
+        print(
+            f"  {title:<24} p50 {_seconds(stats['p50_s']):>9}  p99 {_seconds(stats['p99_s']):>9}  "
+            f"max {_seconds(stats['max_s']):>9}  (n={stats['count']})"
+        )
+    per = report["calls_per_video"]
+    print("\nВызовов на видео:")
+    print(f"  YouTube API {per['youtube']} (единиц квоты {per['youtube_quota_units']})")
+    print(f"  LLM         {per['llm']}")
+    print(f"  Telegram    {per['telegram']}")
+    print(f"\nYouTube: {report['youtube']}")
+    print(f"LLM: {report['llm']}")
+    print(f"Telegram: {report['telegram']}")
+    print(f"Рабочий каталог (логи, трасса): {report['workdir']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сквозная нагрузочная симуляция")
+    parser.add_argument("--channels", type=int, default=2000, help="число каналов YouTube")
+    parser.add_argument("--videos", type=int, default=500, help="сколько видео загрузится за окно")
+    parser.add_argument("--duration", type=float, default=600, help="окно загрузок, с")
+    parser.add_argument("--drain", type=float, default=300, help="ожидание обработки после окна, с")
+    parser.add_argument("--check-interval", type=float, default=60, help="интервал проверки каналов, с")
+    parser.add_argument("--api-keys", type=int, default=3, help="число ключей YouTube API")
+    parser.add_argument("--youtube-latency", type=_range, default=(0.02, 0.08), help="задержка, с (мин-макс)")
+    parser.add_argument("--youtube-quota-error-rate", type=float, default=0.0, help="доля ответов 403 quotaExceeded")
+    parser.add_argument("--youtube-server-error-rate", type=float, default=0.0, help="доля ответов 503")
+    parser.add_argument("--youtube-quota-per-key", type=int, default=0, help="квота на ключ, единиц (0 — без ограничения)")
+    parser.add_argument("--llm-latency", type=_range, default=(0.5, 2.0), help="задержка LLM, с (мин-макс)")
+    parser.add_argument("--llm-failure-rate", type=float, default=0.05, help="доля ошибок провайдера")
+    parser.add_argument("--llm-cjk-rate", type=float, default=0.05, help="доля ответов с иероглифами")
+    parser.add_argument("--llm-forbidden-tag-rate", type=float, default=0.05, help="доля ответов с запрещёнными тегами")
+    parser.add_argument("--telegram-latency", type=_range, default=(0.01, 0.05), help="задержка Bot API, с (мин-макс)")
+    parser.add_argument("--telegram-flood-rate", type=float, default=0.0, help="доля ответов 429 на отправку")
+    parser.add_argument("--moderator-delay", type=float, default=1.0, help="время модератора на один пост, с")
+    parser.add_argument("--moderator-poll", type=float, default=10.0, help="пауза перед повторным /moderate, с")
+    parser.add_argument("--set", dest="overrides", type=_override, action="append", default=[], metavar="KEY=VALUE", help="переопределить настройку приложения")
+    parser.add_argument("--workdir", default="", help="каталог для данных и логов (по умолчанию временный)")
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", dest="json_path", default="", help="сохранить отчёт в JSON")
+    args = parser.parse_args()
+
+    sys.path.insert(0, ROOT)
+    from simulation.harness import Simulation, SimulationOptions
+
+    options = SimulationOptions(
+        channels=args.channels,
+        videos=args.videos,
+        duration=args.duration,
+        drain=args.drain,
+        check_interval=args.check_interval,
+        youtube_latency=args.youtube_latency,
+        youtube_quota_error_rate=args.youtube_quota_error_rate,
+        youtube_server_error_rate=args.youtube_server_error_rate,
+        youtube_quota_per_key=args.youtube_quota_per_key,
+        api_keys=args.api_keys,
+        llm_latency=args.llm_latency,
+        llm_failure_rate=args.llm_failure_rate,
+        llm_cjk_rate=args.llm_cjk_rate,
+        llm_forbidden_tag_rate=args.llm_forbidden_tag_rate,
+        telegram_latency=args.telegram_latency,
+        telegram_flood_rate=args.telegram_flood_rate,
+        moderator_delay=args.moderator_delay,
+        moderator_poll=args.moderator_poll,
+        workdir=args.workdir,
+        log_level=args.log_level,
+        overrides=dict(args.overrides),
+        seed=args.seed,
+    )
+    report = asyncio.run(Simulation(options).run())
+    print_report(report)
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
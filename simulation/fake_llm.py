@@ -0,0 +1,86 @@
+# simulation/fake_llm.py
+"""
+Заглушка LLM-провайдера для core.llm.chatgpt.set_llm_backend().
+
+Вызывается в рабочем потоке, как и синхронный поток g4f: спит задержку,
+с заданной вероятностью падает, добавляет иероглифы (ответ отбраковывает
+is_russian_text) или запрещённый тег (срабатывает валидатор тегов и
+перегенерация), затем отдаёт ответ фрагментами.
+"""
+import random
+import threading
+import time
+from collections import Counter
+from typing import Dict, Iterator, Tuple
+
+GENRES = ["Фантастика", "Ужасы", "Драма", "Экшн", "Комедия", "Триллер"]
+CHUNK_CHARS = 40
+
+
+class FakeLLMError(Exception):
+    pass
+
+
+class FakeLLM:
+    # Имя провайдера в логах, метриках и лимитере (core.llm.chatgpt._provider_name)
+    __name__ = "FakeLLM"
+
+    def __init__(
+        self,
+        latency: Tuple[float, float] = (0.5, 2.0),
+        failure_rate: float = 0.05,
+        cjk_rate: float = 0.05,
+        forbidden_tag_rate: float = 0.05,
+        seed: int = 2,
+    ):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.cjk_rate = cjk_rate
+        self.forbidden_tag_rate = forbidden_tag_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls: Counter = Counter()
+
+    def _roll(self) -> float:
+        with self._lock:
+            return self._rng.random()
+
+    def _count(self, outcome: str):
+        with self._lock:
+            self.calls[outcome] += 1
+
+    def _answer(self, prompt: str) -> str:
+        if "Определи жанр" in prompt:
+            return GENRES[int(self._roll() * len(GENRES))]
+        title = "Фильм"
+        for line in prompt.splitlines():
+            if line.startswith("Название:"):
+                title = line.split(":", 1)[1].strip().rstrip(",")
+                break
+        body = (
+            f"🎬 <b>{title}</b> — новый трейлер уже здесь! "
+            "<i>Напряжение растёт с каждой минутой</i>, а герои оказываются перед "
+            "выбором, который изменит всё. Премьера совсем скоро.\n\n"
+            "Ждёте этот фильм?"
+        )
+        if self._roll() < self.forbidden_tag_rate:
+            self._count("forbidden_tag")
+            body = f"<p>{body}</p><ul><li>Смотреть</li></ul>"
+        if self._roll() < self.cjk_rate:
+            self._count("cjk")
+            body += " 这是预告片"
+        return body
+
+    def __call__(self, prompt: str) -> Iterator[str]:
+        time.sleep(self._rng.uniform(*self.latency))
+        if self._roll() < self.failure_rate:
+            self._count("error")
+            raise FakeLLMError("simulated provider failure")
+        self._count("ok")
+        answer = self._answer(prompt)
+        for start in range(0, len(answer), CHUNK_CHARS):
+            yield answer[start : start + CHUNK_CHARS]
+
+    def report(self) -> Dict:
+        with self._lock:
+            return dict(self.calls)
@@ -0,0 +1,236 @@
+# simulation/fake_telegram.py
+"""
+Заглушка Telegram Bot API (/bot<token>/<method>) с симуляцией модератора.
+
+Модератор периодически отправляет боту /moderate и на каждом показанном
+посте нажимает «Одобрить» (или «Следующий», если этот пост уже одобрял).
+Публикации в канал (chat_id == channel_id) записываются по videoId из
+ссылки youtu.be в подписи — по ним считается задержка до публикации.
+"""
+import asyncio
+import json
+import random
+import re
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+from aiohttp import web
+
+VIDEO_ID_RE = re.compile(r"youtu\.be/([\w-]+)")
+
+
+class FakeTelegram:
+    def __init__(
+        self,
+        moderator_id: int,
+        channel_id: str,
+        latency: tuple = (0.01, 0.05),
+        flood_rate: float = 0.0,
+        moderator_delay: float = 1.0,
+        moderator_poll: float = 10.0,
+        seed: int = 3,
+    ):
+        self.moderator_id = moderator_id
+        self.channel_id = str(channel_id)
+        self.latency = latency
+        self.flood_rate = flood_rate
+        self.moderator_delay = moderator_delay
+        self.moderator_poll = moderator_poll
+        self._rng = random.Random(seed)
+        self.calls: Counter = Counter()
+        self.shown: Dict[str, float] = {}  # videoId -> первый показ модератору
+        self.published: Dict[str, float] = {}  # videoId -> публикация в канал
+
+        self._updates: List[Dict] = []
+        self._update_id = 0
+        self._message_id = 0
+        self._new_update: Optional[asyncio.Event] = None
+        self._approved: set = set()
+        self._pending_callbacks: Dict[str, str] = {}  # callback_query_id -> videoId
+        self._keyboard: Optional[Dict] = None  # сообщение с кнопками, ждущее нажатия
+        self._last_activity = 0.0
+        self._moderator_task: Optional[asyncio.Task] = None
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self._handle)
+        app.on_startup.append(self._on_startup)
+        app.on_cleanup.append(self._on_cleanup)
+        return app
+
+    async def _on_startup(self, _app):
+        self._new_update = asyncio.Event()
+        self._moderator_task = asyncio.create_task(self._moderator())
+
+    async def _on_cleanup(self, _app):
+        self._moderator_task.cancel()
+
+    # ----------- Bot API -----------
+
+    async def _handle(self, request: web.Request):
+        method = request.match_info["method"]
+        params = dict(await request.post()) if request.can_read_body else {}
+        self.calls[method] += 1
+        if method == "getUpdates":
+            return self._ok(await self._get_updates(params))
+
+        await asyncio.sleep(self._rng.uniform(*self.latency))
+        if method.startswith("send") and self._rng.random() < self.flood_rate:
+            self.calls["429"] += 1
+            return web.json_response(
+                {
+                    "ok": False,
+                    "error_code": 429,
+                    "description": "Too Many Requests: retry after 1",
+                    "parameters": {"retry_after": 1},
+                },
+                status=429,
+            )
+        if method == "getMe":
+            return self._ok(
+                {"id": 1, "is_bot": True, "first_name": "Sim", "username": "sim_bot"}
+            )
+        if method in ("sendPhoto", "sendMessage", "sendDocument"):
+            return self._ok(self._on_send(method, params))
+        if method.startswith("editMessage"):
+            return self._ok(self._message(params.get("chat_id"), params))
+        if method == "answerCallbackQuery":
+            self._on_answer(params)
+        return self._ok(True)
+
+    @staticmethod
+    def _ok(result):
+        return web.json_response({"ok": True, "result": result})
+
+    def _message(self, chat_id, params: Dict) -> Dict:
+        self._message_id += 1
+        chat_id = int(chat_id or 0)
+        message = {
+            "message_id": self._message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private" if chat_id > 0 else "channel"},
+        }
+        for key in ("text", "caption"):
+            if params.get(key):
+                message[key] = params[key]
+        if params.get("reply_markup"):
+            message["reply_markup"] = json.loads(params["reply_markup"])
+        return message
+
+    def _on_send(self, method: str, params: Dict) -> Dict:
+        message = self._message(params.get("chat_id"), params)
+        match = VIDEO_ID_RE.search(params.get("caption") or params.get("text") or "")
+        video_id = match.group(1) if match else ""
+        if method == "sendPhoto":
+            message["photo"] = [
+                {
+                    "file_id": f"file-{video_id or self._message_id}",
+                    "file_unique_id": f"u{self._message_id}",
+                    "width": 1280,
+                    "height": 720,
+                }
+            ]
+        now = time.time()
+        if str(params.get("chat_id")) == self.channel_id:
+            if video_id:
+                self.published.setdefault(video_id, now)
+        elif int(params.get("chat_id") or 0) == self.moderator_id:
+            if video_id:
+                self.shown.setdefault(video_id, now)
+            self._last_activity = now
+            buttons = _buttons(message)
+            self._keyboard = {"message": message, "video_id": video_id, "buttons": buttons} if buttons else None
+        return message
+
+    def _on_answer(self, params: Dict):
+        video_id = self._pending_callbacks.pop(params.get("callback_query_id", ""), None)
+        # show_alert — бот занят или пост не найден: одобрение не принято
+        if video_id and params.get("show_alert") in ("true", "True", "1"):
+            self._approved.discard(video_id)
+            self._last_activity = 0.0
+
+    async def _get_updates(self, params: Dict) -> List[Dict]:
+        offset = int(params.get("offset") or 0)
+        self._updates = [u for u in self._updates if u["update_id"] >= offset]
+        if not self._updates:
+            self._new_update.clear()
+            try:
+                await asyncio.wait_for(
+                    self._new_update.wait(), timeout=float(params.get("timeout") or 0)
+                )
+            except asyncio.TimeoutError:
+                pass
+        return list(self._updates)
+
+    def _push(self, update: Dict):
+        self._update_id += 1
+        update["update_id"] = self._update_id
+        self._updates.append(update)
+        self._new_update.set()
+
+    # ----------- Модератор -----------
+
+    def _user(self) -> Dict:
+        return {"id": self.moderator_id, "is_bot": False, "first_name": "Moderator"}
+
+    def _command(self, text: str):
+        self._message_id += 1
+        self._push(
+            {
+                "message": {
+                    "message_id": self._message_id,
+                    "date": int(time.time()),
+                    "chat": {"id": self.moderator_id, "type": "private"},
+                    "from": self._user(),
+                    "text": text,
+                    "entities": [{"type": "bot_command", "offset": 0, "length": len(text)}],
+                }
+            }
+        )
+
+    def _press(self, message: Dict, data: str, video_id: str):
+        query_id = f"cb{self._update_id + 1}"
+        self._pending_callbacks[query_id] = video_id
+        self._push(
+            {
+                "callback_query": {
+                    "id": query_id,
+                    "from": self._user(),
+                    "chat_instance": "sim",
+                    "message": message,
+                    "data": data,
+                }
+            }
+        )
+
+    async def _moderator(self):
+        while True:
+            await asyncio.sleep(self.moderator_delay)
+            keyboard, self._keyboard = self._keyboard, None
+            if keyboard is None:
+                # Модерация закончилась (или ответ потерялся) — через паузу начинаем заново
+                if time.time() - self._last_activity >= self.moderator_poll:
+                    self._last_activity = time.time()
+                    self._command("/moderate")
+                continue
+            video_id, buttons = keyboard["video_id"], keyboard["buttons"]
+            if video_id not in self._approved and "approve" in buttons:
+                self._approved.add(video_id)
+                self._press(keyboard["message"], buttons["approve"], video_id)
+            elif "next" in buttons:
+                self._press(keyboard["message"], buttons["next"], video_id)
+
+    def report(self) -> Dict:
+        return {"calls": dict(self.calls)}
+
+
+def _buttons(message: Dict) -> Dict[str, str]:
+    """Кнопки модерации сообщения: действие -> callback_data."""
+    buttons = {}
+    for row in (message.get("reply_markup") or {}).get("inline_keyboard", []):
+        for button in row:
+            data = button.get("callback_data", "")
+            if data.startswith("mod:"):
+                buttons[data.split(":")[1]] = data
+    return buttons
@@ -0,0 +1,219 @@
+# simulation/fake_youtube.py
+"""
+Заглушка YouTube Data API v3 (channels.list, playlistItems.list, videos.list).
+
+Видео «загружаются» по расписанию: upload_count видео случайно
+распределяются по каналам и по окну duration секунд от старта. У каждого
+канала есть одно старое видео (три дня назад), на котором парсер
+останавливает пагинацию. Задержка ответа, доля ошибок квоты и 5xx, а также
+дневная квота на ключ настраиваются.
+"""
+import asyncio
+import bisect
+import io
+import random
+import string
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, List, Tuple
+
+from aiohttp import web
+
+COSTS = {"channels.list": 1, "playlistItems.list": 1, "videos.list": 1, "search.list": 100}
+
+
+def _iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _word(rng: random.Random) -> str:
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 9)))
+
+
+def _thumbnail_bytes() -> bytes:
+    try:
+        from PIL import Image
+    except ImportError:
+        return b""
+    buffer = io.BytesIO()
+    Image.new("RGB", (1280, 720), (40, 40, 60)).save(buffer, "JPEG", quality=60)
+    return buffer.getvalue()
+
+
+class FakeYouTube:
+    def __init__(
+        self,
+        channels: int,
+        upload_count: int,
+        duration: float,
+        latency: Tuple[float, float] = (0.02, 0.08),
+        quota_error_rate: float = 0.0,
+        server_error_rate: float = 0.0,
+        quota_per_key: int = 0,
+        seed: int = 1,
+    ):
+        self.latency = latency
+        self.quota_error_rate = quota_error_rate
+        self.server_error_rate = server_error_rate
+        self.quota_per_key = quota_per_key
+        self.base_url = ""  # заполняется после запуска сервера
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls: Counter = Counter()
+        self.errors: Counter = Counter()
+        self.units_by_key: Counter = Counter()
+        self.started_at = time.time()
+
+        self.channel_ids = [f"UCsim{i:017d}" for i in range(channels)]
+        self._playlist_to_channel = {f"UU{cid[2:]}": cid for cid in self.channel_ids}
+        # По каналу: времена загрузки (по возрастанию) и id видео
+        self._offsets: Dict[str, List[float]] = {cid: [] for cid in self.channel_ids}
+        self._videos: Dict[str, List[str]] = {cid: [] for cid in self.channel_ids}
+        self.videos: Dict[str, Dict] = {}
+        schedule = sorted(
+            (self._rng.uniform(0, duration), self._rng.choice(self.channel_ids))
+            for _ in range(upload_count)
+        )
+        for n, (offset, channel_id) in enumerate(schedule):
+            video_id = f"sim{n:08d}"
+            self._offsets[channel_id].append(offset)
+            self._videos[channel_id].append(video_id)
+            self.videos[video_id] = self._make_video(video_id, channel_id, offset)
+        self._history = {
+            cid: self._make_video(f"old{i:08d}", cid, -3 * 86400)
+            for i, cid in enumerate(self.channel_ids)
+        }
+        self._thumbnail = _thumbnail_bytes()
+
+    def _make_video(self, video_id: str, channel_id: str, offset: float) -> Dict:
+        rng = self._rng
+        title = " ".join(_word(rng).capitalize() for _ in range(3))
+        return {
+            "video_id": video_id,
+            "channel_id": channel_id,
+            "offset": offset,
+            "title": f"{title} — Official Trailer",
+            "description": " ".join(_word(rng) for _ in range(40)),
+        }
+
+    def upload_time(self, video_id: str) -> float:
+        return self.started_at + self.videos[video_id]["offset"]
+
+    def uploaded(self) -> List[str]:
+        """Видео, уже «загруженные» к текущему моменту."""
+        now = time.time() - self.started_at
+        return [vid for vid, v in self.videos.items() if v["offset"] <= now]
+
+    # ----------- HTTP -----------
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/youtube/v3/channels", self._channels)
+        app.router.add_get("/youtube/v3/playlistItems", self._playlist_items)
+        app.router.add_get("/youtube/v3/videos", self._videos_list)
+        app.router.add_get("/vi/{video_id}/{name}", self._thumbnail_file)
+        return app
+
+    async def _call(self, request: web.Request, method: str):
+        """Задержка, учёт квоты и ошибки. Возвращает готовый ответ-ошибку или None."""
+        await asyncio.sleep(self._rng.uniform(*self.latency))
+        key = request.query.get("key", "oauth")
+        with self._lock:
+            self.calls[method] += 1
+            self.units_by_key[key] += COSTS[method]
+            over_quota = self.quota_per_key and self.units_by_key[key] > self.quota_per_key
+        roll = self._rng.random()
+        if over_quota or roll < self.quota_error_rate:
+            self.errors["quotaExceeded"] += 1
+            return self._error(403, "quotaExceeded")
+        if roll < self.quota_error_rate + self.server_error_rate:
+            self.errors["backendError"] += 1
+            return self._error(503, "backendError")
+        return None
+
+    @staticmethod
+    def _error(status: int, reason: str) -> web.Response:
+        return web.json_response(
+            {"error": {"code": status, "message": reason, "errors": [{"reason": reason}]}},
+            status=status,
+        )
+
+    def _snippet(self, video: Dict) -> Dict:
+        video_id = video["video_id"]
+        thumb = f"{self.base_url}vi/{video_id}"
+        return {
+            "publishedAt": _iso(self.started_at + video["offset"]),
+            "channelId": video["channel_id"],
+            "title": video["title"],
+            "description": video["description"],
+            "thumbnails": {
+                "high": {"url": f"{thumb}/hqdefault.jpg", "width": 480, "height": 360},
+                "maxres": {"url": f"{thumb}/maxresdefault.jpg", "width": 1280, "height": 720},
+            },
+            "resourceId": {"kind": "youtube#video", "videoId": video_id},
+        }
+
+    async def _channels(self, request: web.Request):
+        error = await self._call(request, "channels.list")
+        if error:
+            return error
+        ids = [i for i in request.query.get("id", "").split(",") if i in self._offsets]
+        items = [
+            {
+                "id": cid,
+                "snippet": {"title": f"Channel {cid[-6:]}"},
+                "contentDetails": {"relatedPlaylists": {"uploads": f"UU{cid[2:]}"}},
+                "statistics": {"subscriberCount": str(len(self._videos[cid]) * 1000)},
+            }
+            for cid in ids
+        ]
+        return web.json_response({"items": items})
+
+    async def _playlist_items(self, request: web.Request):
+        error = await self._call(request, "playlistItems.list")
+        if error:
+            return error
+        channel_id = self._playlist_to_channel.get(request.query.get("playlistId", ""))
+        if channel_id is None:
+            return self._error(404, "playlistNotFound")
+        now = time.time() - self.started_at
+        visible = bisect.bisect_right(self._offsets[channel_id], now)
+        newest_first = [self.videos[v] for v in reversed(self._videos[channel_id][:visible])]
+        newest_first.append(self._history[channel_id])
+
+        start = int(request.query.get("pageToken") or 0)
+        size = int(request.query.get("maxResults", 5))
+        page = newest_first[start : start + size]
+        body = {"items": [{"snippet": self._snippet(v)} for v in page]}
+        if start + size < len(newest_first):
+            body["nextPageToken"] = str(start + size)
+        return web.json_response(body)
+
+    async def _videos_list(self, request: web.Request):
+        error = await self._call(request, "videos.list")
+        if error:
+            return error
+        items = [
+            {
+                "id": vid,
+                "snippet": self._snippet(self.videos[vid]),
+                "status": {"privacyStatus": "public", "uploadStatus": "processed"},
+            }
+            for vid in request.query.get("id", "").split(",")
+            if vid in self.videos
+        ]
+        return web.json_response({"items": items})
+
+    async def _thumbnail_file(self, request: web.Request):
+        if not self._thumbnail:
+            raise web.HTTPNotFound()
+        return web.Response(body=self._thumbnail, content_type="image/jpeg")
+
+    def report(self) -> Dict:
+        return {
+            "calls": dict(self.calls),
+            "errors": dict(self.errors),
+            "quota_units": sum(self.units_by_key.values()),
+        }
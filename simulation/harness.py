@@ -0,0 +1,288 @@
+# simulation/harness.py
+"""
+Нагрузочная симуляция всего конвейера: ReleaseTrackerApp (роль "all")
+работает против локальных заглушек YouTube, LLM и Telegram.
+
+Заглушки HTTP живут в отдельном потоке со своим event loop: клиент
+googleapiclient блокирует loop приложения, и сервер в том же loop не смог
+бы ему ответить. Настройки приложения подменяются до импорта его модулей
+(пути — во временный каталог, адреса API — на заглушки).
+"""
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Dict, List
+
+from aiohttp import web
+
+from simulation.fake_llm import FakeLLM
+from simulation.fake_telegram import FakeTelegram
+from simulation.fake_youtube import FakeYouTube
+
+MODERATOR_ID = 777
+CHANNEL_ID = "-100777"
+POLL_SECONDS = 0.2  # проверка «всё опубликовано» и дедлайна
+
+
+@dataclass
+class SimulationOptions:
+    channels: int = 2000
+    videos: int = 500
+    duration: float = 600.0  # окно, в котором «загружаются» видео
+    drain: float = 300.0  # сколько ждать обработки после окна
+    check_interval: float = 60.0  # CHECK_INTERVAL_HOURS в секундах
+    youtube_latency: tuple = (0.02, 0.08)
+    youtube_quota_error_rate: float = 0.0
+    youtube_server_error_rate: float = 0.0
+    youtube_quota_per_key: int = 0
+    api_keys: int = 3
+    llm_latency: tuple = (0.5, 2.0)
+    llm_failure_rate: float = 0.05
+    llm_cjk_rate: float = 0.05
+    llm_forbidden_tag_rate: float = 0.05
+    telegram_latency: tuple = (0.01, 0.05)
+    telegram_flood_rate: float = 0.0
+    moderator_delay: float = 1.0
+    moderator_poll: float = 10.0
+    workdir: str = ""
+    log_level: str = "WARNING"
+    overrides: Dict[str, str] = field(default_factory=dict)  # --set KEY=VALUE
+    seed: int = 1
+
+
+class ServiceThread:
+    """aiohttp-приложения заглушек в фоновом потоке на свободных портах."""
+
+    def __init__(self, apps: Dict[str, web.Application]):
+        self.apps = apps
+        self.urls: Dict[str, str] = {}
+        self._loop = asyncio.new_event_loop()
+        self._runners: List[web.AppRunner] = []
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sim-services", daemon=True)
+
+    def start(self) -> Dict[str, str]:
+        self._thread.start()
+        self._ready.wait()
+        return self.urls
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_until_complete(self._serve())
+        self._ready.set()
+        self._loop.run_forever()
+
+    async def _serve(self):
+        for name, app in self.apps.items():
+            runner = web.AppRunner(app, access_log=None)
+            await runner.setup()
+            await web.TCPSite(runner, "127.0.0.1", 0).start()
+            host, port = runner.addresses[0][:2]
+            self.urls[name] = f"http://{host}:{port}"
+            self._runners.append(runner)
+
+    def stop(self):
+        async def cleanup():
+            for runner in self._runners:
+                await runner.cleanup()
+
+        asyncio.run_coroutine_threadsafe(cleanup(), self._loop).result(timeout=10)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=10)
+
+
+def percentile(values: List[float], q: float) -> float | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def _configure(options: SimulationOptions, urls: Dict[str, str], youtube: FakeYouTube):
+    """Подменяет настройки до импорта модулей приложения."""
+    from core.settings import get_config
+
+    workdir = options.workdir
+    for sub in ("data", "log"):
+        os.makedirs(os.path.join(workdir, sub), exist_ok=True)
+
+    def path(*parts):
+        return os.path.join(workdir, *parts)
+
+    channels_json = path("channels.json")
+    with open(channels_json, "w", encoding="utf-8") as f:
+        json.dump(
+            [{"id": cid, "name": f"Sim {i}"} for i, cid in enumerate(youtube.channel_ids)], f
+        )
+
+    values = {
+        "pending_posts_json": path("pending_posts.json"),
+        "last_video_json": path("last_video.json"),
+        "channels_json": channels_json,
+        "deleted_videos_json": path("deleted_videos.json"),
+        "dedup_index_json": path("data", "dedup_index.json"),
+        "work_queue_db": path("data", "work_queue.sqlite3"),
+        "send_queue_db": path("data", "send_queue.sqlite3"),
+        "shard_db": path("data", "shards.sqlite3"),
+        "credential_state_json": path("data", "credential_state.json"),
+        "thumbnails_dir": path("data", "thumbnails"),
+        "thumbnail_file_ids_json": path("data", "thumbnail_file_ids.json"),
+        "trace_file": path("log", "trace.json"),
+        "log_file": path("log", "release_tracker.log"),
+        "log_level": options.log_level,
+        "start_date": datetime.now(timezone.utc).strftime("%Y-%m-%d"),
+        "check_interval_hours": options.check_interval / 3600,
+        "use_oauth": False,
+        "youtube_api_keys": ",".join(f"sim-key-{i}" for i in range(options.api_keys)),
+        "youtube_api_endpoint": f"{urls['youtube']}/",
+        "telegram_api_url": urls["telegram"],
+        "bot_token": "123456:sim",
+        "moderator_chat_id": str(MODERATOR_ID),
+        "channel_id": CHANNEL_ID,
+        "use_webhook": False,
+        "metrics_port": 0,
+        "detector_sharding": False,
+    }
+    values.update(options.overrides)
+    config = get_config()
+    for key, value in values.items():
+        setattr(config, key, value)
+    return config
+
+
+class Simulation:
+    def __init__(self, options: SimulationOptions):
+        self.options = options
+        if not options.workdir:
+            options.workdir = tempfile.mkdtemp(prefix="release_tracker_sim_")
+        self.youtube = FakeYouTube(
+            options.channels,
+            options.videos,
+            options.duration,
+            latency=options.youtube_latency,
+            quota_error_rate=options.youtube_quota_error_rate,
+            server_error_rate=options.youtube_server_error_rate,
+            quota_per_key=options.youtube_quota_per_key,
+            seed=options.seed,
+        )
+        self.llm = FakeLLM(
+            latency=options.llm_latency,
+            failure_rate=options.llm_failure_rate,
+            cjk_rate=options.llm_cjk_rate,
+            forbidden_tag_rate=options.llm_forbidden_tag_rate,
+            seed=options.seed + 1,
+        )
+        self.telegram = FakeTelegram(
+            MODERATOR_ID,
+            CHANNEL_ID,
+            latency=options.telegram_latency,
+            flood_rate=options.telegram_flood_rate,
+            moderator_delay=options.moderator_delay,
+            moderator_poll=options.moderator_poll,
+            seed=options.seed + 2,
+        )
+        self.ready: Dict[str, float] = {}  # videoId -> пост дописан в pending_posts.json
+        self.started_at = 0.0
+        self.finished_at = 0.0
+
+    async def run(self) -> Dict:
+        services = ServiceThread({"youtube": self.youtube.app(), "telegram": self.telegram.app()})
+        urls = services.start()
+        self.youtube.base_url = f"{urls['youtube']}/"
+        _configure(self.options, urls, self.youtube)
+
+        from core.llm.chatgpt import set_llm_backend
+        from main import ReleaseTrackerApp
+
+        set_llm_backend(self.llm)
+        app = ReleaseTrackerApp(role="all")
+        # Готовность фиксируется в момент записи поста, а не опросом файла
+        app.checker.subscribe_posts(self._on_post_ready)
+        # Расписание загрузок отсчитывается от старта приложения
+        self.youtube.started_at = self.started_at = time.time()
+        app_task = asyncio.create_task(app.start())
+        try:
+            deadline = self.started_at + self.options.duration + self.options.drain
+            while time.time() < deadline and not app_task.done():
+                await asyncio.sleep(POLL_SECONDS)
+                if self._all_published():
+                    break
+        finally:
+            self.finished_at = time.time()
+            try:
+                await app.stop()
+            except SystemExit:
+                pass
+            app_task.cancel()
+            await asyncio.gather(app_task, return_exceptions=True)
+            set_llm_backend(None)
+            services.stop()
+        return self.report()
+
+    def _on_post_ready(self, post):
+        if post.video_id in self.youtube.videos:
+            self.ready.setdefault(post.video_id, time.time())
+
+    def _all_published(self) -> bool:
+        return (
+            time.time() >= self.started_at + self.options.duration
+            and len(self.telegram.published) >= len(self.youtube.videos)
+        )
+
+    def _latencies(self, seen: Dict[str, float]) -> Dict:
+        values = [t - self.youtube.upload_time(v) for v, t in seen.items() if v in self.youtube.videos]
+        return {
+            "count": len(values),
+            "p50_s": percentile(values, 0.5),
+            "p99_s": percentile(values, 0.99),
+            "max_s": max(values) if values else None,
+        }
+
+    def report(self) -> Dict:
+        elapsed = self.finished_at - self.started_at
+        ready = len(self.ready)
+        published = len(self.telegram.published)
+        youtube = self.youtube.report()
+        youtube_calls = sum(youtube["calls"].values())
+        llm = self.llm.report()
+        llm_calls = llm.get("ok", 0) + llm.get("error", 0)
+        telegram = self.telegram.report()
+        telegram_calls = sum(
+            n for method, n in telegram["calls"].items() if method not in ("getUpdates", "429")
+        )
+
+        def per(total, count):
+            return round(total / count, 2) if count else None
+
+        return {
+            "elapsed_s": round(elapsed, 1),
+            "channels": self.options.channels,
+            "uploaded": len(self.youtube.uploaded()),
+            "ready_for_moderation": ready,
+            "published": published,
+            "throughput_per_min": {
+                "ready": round(ready / elapsed * 60, 2) if elapsed else None,
+                "published": round(published / elapsed * 60, 2) if elapsed else None,
+            },
+            "latency": {
+                "upload_to_moderation": self._latencies(self.ready),
+                "upload_to_shown": self._latencies(self.telegram.shown),
+                "upload_to_published": self._latencies(self.telegram.published),
+            },
+            "calls_per_video": {
+                "youtube": per(youtube_calls, ready),
+                "youtube_quota_units": per(youtube["quota_units"], ready),
+                "llm": per(llm_calls, ready),
+                "telegram": per(telegram_calls, published),
+            },
+            "youtube": youtube,
+            "llm": llm,
+            "telegram": telegram,
+            "workdir": self.options.workdir,
+        }
@@ -0,0 +1,83 @@
+# tools/import_profile.py
+"""
+Отчёт о стоимости импорта при старте (на основе `python -X importtime`).
+
+    python tools/import_profile.py                # профиль `import main`
+    python tools/import_profile.py core.yt_parser.youtube_checker --top 30
+
+Показывает общее время импорта, самые дорогие пакеты (сумма собственного
+времени их модулей) и модули с наибольшим собственным временем.
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_LINE_RE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def collect(module: str) -> List[Tuple[str, int, int, int]]:
+    """(модуль, собственное время мкс, суммарное время мкс, глубина вложенности)."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        # Профиль до места ошибки всё равно полезен — показываем и его
+        tail = result.stderr.strip().splitlines()[-1:] or ["?"]
+        print(f"⚠️ import {module} завершился с ошибкой: {tail[0]}", file=sys.stderr)
+
+    rows = []
+    for line in result.stderr.splitlines():
+        match = _LINE_RE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            rows.append((name, int(self_us), int(cumulative_us), len(indent) // 2))
+    return rows
+
+
+def summarize(rows: List[Tuple[str, int, int, int]]) -> Dict[str, int]:
+    """
+    Собственное время всех модулей, сгруппированное по пакету верхнего уровня:
+    aiogram, g4f, googleapiclient... учитываются отдельно, даже если их
+    импортирует код проекта.
+    """
+    packages: Dict[str, int] = defaultdict(int)
+    for name, self_us, _, _ in rows:
+        packages[name.split(".")[0]] += self_us
+    return packages
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Профиль времени импорта")
+    parser.add_argument("module", nargs="?", default="main")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    rows = collect(args.module)
+    if not rows:
+        print("Нет данных importtime.")
+        return
+
+    total = sum(cumulative for _, _, cumulative, depth in rows if depth == 0)
+    print(f"import {args.module}: {total / 1000:.1f} мс, модулей: {len(rows)}\n")
+
+    print("Пакеты:")
+    packages = sorted(summarize(rows).items(), key=lambda item: item[1], reverse=True)
+    for name, cumulative_us in packages[: args.top]:
+        share = cumulative_us / total * 100 if total else 0
+        print(f"  {cumulative_us / 1000:9.1f} мс  {share:5.1f}%  {name}")
+
+    print("\nСобственное время модулей:")
+    for name, self_us, _, _ in sorted(rows, key=lambda row: row[1], reverse=True)[: args.top]:
+        print(f"  {self_us / 1000:9.1f} мс  {name}")
+
+
+if __name__ == "__main__":
+    main()